@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark for the generation pipeline
+Times _fallback_categorization, _enhanced_fallback_content, generate_themed_html and full
+generate_website calls against a local stub OpenAI/DALL-E server (stub_openai.py) with configurable
+latency and error rate. Reports throughput, p50/p95/p99 latency, peak RSS and bytes per site, and
+compares them with a stored baseline. Pass --replay to drive it with a JSONL of worker requests.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import threading
+import contextlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline_pipeline.json")
+sys.path.insert(0, REPO_ROOT)
+
+PRODUCTS = [
+    "Smart Coffee Maker", "Organic Yoga Mat", "Luxury Leather Handbag", "Electric Mountain Bike",
+    "Wireless Noise-Canceling Headphones", "Artisan Sourdough Bread", "Ergonomic Office Chair",
+    "Gaming Laptop Pro", "Vitamin C Serum", "Carbon Fiber Tennis Racket", "Bluetooth Car Adapter",
+    "Handmade Ceramic Vase", "AI Fitness Tracker", "Cold Brew Coffee Concentrate", "Project Management SaaS",
+    "Waterproof Hiking Boots", "Smart LED Light Bulbs", "Protein Powder Vanilla", "Silk Evening Dress",
+    "Portable Espresso Machine",
+]
+
+# Lower-is-better metrics are compared as regressions when they grow, the rest when they shrink
+LOWER_IS_BETTER = {"p50_ms", "p95_ms", "p99_ms", "peak_rss_mb", "bytes_per_site"}
+
+
+def read_replay(path):
+    """(product_name, seed) pairs from a JSONL of worker requests, product objects or plain names"""
+    items = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                item = line
+            seed = None
+            if isinstance(item, dict):
+                seed = item.get("seed")
+                item = item.get("product_name") or item.get("name") or ""
+            name = str(item).strip()
+            if name:
+                items.append((name, seed))
+    return items
+
+
+def start_stub(args):
+    """Launch stub_openai.py and return (process, base_url)"""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, "stub_openai.py"), "--latency-ms", str(args.latency_ms),
+         "--jitter-ms", str(args.jitter_ms), "--chunk-delay-ms", str(args.chunk_delay_ms),
+         "--error-rate", str(args.error_rate), "--error-status", str(args.error_status)],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    for line in process.stdout:
+        if line.startswith("LISTENING "):
+            return process, f"http://127.0.0.1:{int(line.split()[1])}/v1"
+    raise RuntimeError("stub OpenAI server exited before listening")
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))]
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def summarize(latencies_s, wall_s, extra=None):
+    ordered = sorted(latencies_s)
+    result = {
+        "ops": len(ordered),
+        "throughput_per_s": len(ordered) / wall_s if wall_s else 0.0,
+        "p50_ms": percentile(ordered, 50) * 1000,
+        "p95_ms": percentile(ordered, 95) * 1000,
+        "p99_ms": percentile(ordered, 99) * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    result.update(extra or {})
+    return result
+
+
+def time_calls(calls, concurrency=1, keep_results=True):
+    """Run each zero-argument call, returning (per-call seconds, wall seconds, results)
+    
+    Micro stages pass keep_results=False so holding thousands of pages doesn't inflate peak RSS.
+    """
+    def timed(call):
+        started = time.perf_counter()
+        value = call()
+        return time.perf_counter() - started, value if keep_results else None
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        outcomes = [timed(call) for call in calls]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(timed, calls))
+    wall = time.perf_counter() - started
+    return [seconds for seconds, _ in outcomes], wall, [value for _, value in outcomes]
+
+
+def run_stages(gsg, items, args):
+    """Benchmark every stage and return {stage: metrics}"""
+    names = [name for name, _ in items]
+    generator = gsg.EnhancedGPTSiteGenerator()
+    # Load the shipped categorizer weights up front, as a warm worker would have; it never trains,
+    # so without a model file generate_website measures the keyword-index path
+    gsg.get_local_categorizer()
+    results = {}
+
+    latencies, wall, _ = time_calls([lambda name=name: generator._fallback_categorization(name)
+                                     for name in names for _ in range(args.micro_repeat)],
+                                    keep_results=False)
+    results["categorize"] = summarize(latencies, wall)
+
+    categories = {name: generator._fallback_categorization(name) for name in names}
+    latencies, wall, _ = time_calls([lambda name=name: generator._enhanced_fallback_content(name, categories[name])
+                                     for name in names for _ in range(args.render_repeat)],
+                                    keep_results=False)
+    results["fallback_content"] = summarize(latencies, wall)
+
+    # Templating only: images are stubbed out so no HTTP is timed
+    content_by_name = {name: generator._enhanced_fallback_content(name, categories[name]) for name in names}
+    real_images = gsg.generate_product_images
+    gsg.generate_product_images = lambda prompts, **kwargs: [f"https://images.example.com/{i}.jpg"
+                                                             for i in range(len(prompts))]
+    try:
+        themes = list(generator.themes.values())
+        renders = [lambda name=name, i=i: generator.generate_themed_html(name, content_by_name[name], categories[name],
+                                                                         themes[i % len(themes)])
+                   for i, name in enumerate(names)]
+        # One untimed pass compiles every theme's CSS and template
+        pages = [render() for render in renders]
+        latencies, wall, _ = time_calls(renders * args.render_repeat, keep_results=False)
+    finally:
+        gsg.generate_product_images = real_images
+    results["render"] = summarize(latencies, wall, {
+        "bytes_per_site": sum(len(page.encode("utf-8")) for page in pages) / len(pages)})
+
+    # Full pipeline against the stub server; one generator per thread, as in separate workers
+    local = threading.local()
+
+    def generate(name, seed):
+        if not hasattr(local, "generator"):
+            local.generator = gsg.EnhancedGPTSiteGenerator()
+        try:
+            return os.path.getsize(local.generator.generate_website(name, seed))
+        except Exception as e:
+            print(f"❌ {name}: {e}", file=sys.stderr)
+            return None
+
+    latencies, wall, sizes = time_calls([lambda name=name, seed=seed: generate(name, seed) for name, seed in items],
+                                        concurrency=args.concurrency)
+    written = [size for size in sizes if size is not None]
+    results["generate_website"] = summarize(latencies, wall, {
+        "errors": len(sizes) - len(written),
+        "bytes_per_site": sum(written) / len(written) if written else 0.0})
+    return results
+
+
+def print_results(results, baseline, tolerance):
+    """Print a table of results against the baseline and return the regressed metrics"""
+    regressions = []
+    metrics = ["throughput_per_s", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb", "bytes_per_site"]
+    print(f"{'stage':<18}" + "".join(f" {metric:>16}" for metric in metrics))
+    for stage, current in results.items():
+        print(f"{stage:<18}" + "".join(
+            f" {current[metric]:>16,.2f}" if metric in current else f" {'-':>16}" for metric in metrics))
+        previous = (baseline or {}).get("stages", {}).get(stage)
+        if not previous:
+            continue
+        row = []
+        for metric in metrics:
+            if metric not in current or not previous.get(metric):
+                row.append(f" {'-':>16}")
+                continue
+            change = current[metric] / previous[metric] - 1
+            worse = change > tolerance if metric in LOWER_IS_BETTER else change < -tolerance
+            if worse:
+                regressions.append(f"{stage}.{metric} {change:+.1%}")
+            row.append(f" {change:>+15.1%}{'!' if worse else ' '}")
+        print(f"{'  vs baseline':<18}" + "".join(row))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the site generation pipeline against a stub OpenAI server")
+    parser.add_argument("--sites", type=int, default=40, help="Sites to generate (cycles the built-in product list)")
+    parser.add_argument("--replay", metavar="JSONL", help="Generate these requests instead (product_name, optional seed)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent generate_website calls")
+    parser.add_argument("--micro-repeat", type=int, default=200, help="Categorization calls per product")
+    parser.add_argument("--render-repeat", type=int, default=20, help="Fallback content and render calls per product")
+    parser.add_argument("--latency-ms", type=float, default=300, help="Stub server mean response latency")
+    parser.add_argument("--jitter-ms", type=float, default=100, help="Stub server latency spread")
+    parser.add_argument("--chunk-delay-ms", type=float, default=2, help="Stub server delay between streamed chunks")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Fraction of stub requests that fail")
+    parser.add_argument("--error-status", type=int, default=429, help="HTTP status of injected failures")
+    parser.add_argument("--offline", action="store_true", help="No stub server: generate_website runs in fallback mode")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Write these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.20,
+                        help="Relative change that counts as a regression (sub-millisecond tails are noisy)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit 1 when any metric regresses")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results to PATH")
+    args = parser.parse_args()
+
+    items = read_replay(args.replay) if args.replay else [
+        (PRODUCTS[i % len(PRODUCTS)] + (f" {i // len(PRODUCTS) + 1}" if i >= len(PRODUCTS) else ""), None)
+        for i in range(args.sites)]
+    if not items:
+        parser.error("no products to generate")
+
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    stub = None
+    # Cold caches and no client-side rate limiting, so every run measures the same work
+    os.environ.update(SITE_CACHE_DIR=workdir, CONTENT_CACHE="0", IMAGE_CACHE="0",
+                      OPENAI_CHAT_RPM="0", OPENAI_CHAT_TPM="0", OPENAI_IMAGE_RPM="0")
+    if args.offline:
+        os.environ.pop("OPENAI_API_KEY", None)
+    else:
+        stub, base_url = start_stub(args)
+        os.environ.update(OPENAI_API_KEY="sk-bench-stub", OPENAI_BASE_URL=base_url)
+
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            import gpt_site_generator
+            results = run_stages(gpt_site_generator, items, args)
+    finally:
+        if stub is not None:
+            stub.terminate()
+            stub.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "config": {"sites": len(items), "concurrency": args.concurrency, "latency_ms": args.latency_ms,
+                   "jitter_ms": args.jitter_ms, "error_rate": args.error_rate, "offline": args.offline,
+                   "replay": os.path.basename(args.replay) if args.replay else None},
+        "stages": results,
+    }
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get("config") != report["config"]:
+            print(f"⚠️ Not comparing: baseline was recorded with different settings {baseline.get('config')}")
+            baseline = None
+
+    regressions = print_results(results, baseline, args.tolerance)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Baseline saved to {args.baseline}")
+    elif regressions:
+        print(f"❌ Regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        if args.fail_on_regression:
+            sys.exit(1)
+    elif baseline:
+        print(f"✅ Within {args.tolerance:.0%} of baseline")
+
+
+if __name__ == "__main__":
+    main()
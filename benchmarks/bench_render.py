@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for generate_themed_html
+Measures renders per second with image generation stubbed out, so only templating cost is timed.
+Pass --baseline-rev to render the same content with an older revision and compare.
+"""
+
+import os
+import sys
+import timeit
+import argparse
+import subprocess
+import importlib.util
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# Stay offline: no OpenAI client, no DALL-E calls
+os.environ.pop('OPENAI_API_KEY', None)
+
+import gpt_site_generator
+
+
+def _stub_images(prompts, **kwargs):
+    return [f"https://images.example.com/{i}.jpg" for i in range(len(prompts))]
+
+
+def load_revision(rev):
+    """Import gpt_site_generator.py as it was at a git revision"""
+    source = subprocess.check_output(["git", "show", f"{rev}:gpt_site_generator.py"], cwd=REPO_ROOT)
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_render_"), "gpt_site_generator_baseline.py")
+    with open(path, 'wb') as f:
+        f.write(source)
+    spec = importlib.util.spec_from_file_location("gpt_site_generator_baseline", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def renders_per_second(module, product_name, content, category, theme_key, number, repeat):
+    """Best-of-repeat renders per second for one module and theme"""
+    generator = module.EnhancedGPTSiteGenerator()
+    theme = generator.themes[theme_key]
+    render = lambda: generator.generate_themed_html(product_name, content, category, theme)
+    html = render()
+    best = min(timeit.repeat(render, number=number, repeat=repeat))
+    return number / best, html
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark generate_themed_html renders per second")
+    parser.add_argument("--product", default="Smart Coffee Maker", help="Product name to render")
+    parser.add_argument("--number", type=int, default=2000, help="Renders per timing run")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs per theme (best is reported)")
+    parser.add_argument("--baseline-rev", metavar="REV", help="Also benchmark gpt_site_generator.py at this git revision")
+    args = parser.parse_args()
+
+    modules = [("current", gpt_site_generator)]
+    if args.baseline_rev:
+        modules.insert(0, (args.baseline_rev, load_revision(args.baseline_rev)))
+
+    for _, module in modules:
+        module.generate_product_images = _stub_images
+
+    generator = gpt_site_generator.EnhancedGPTSiteGenerator()
+    category = generator._fallback_categorization(args.product)
+    content = generator._enhanced_fallback_content(args.product, category)
+
+    header = f"{'theme':<18}" + "".join(f" {label + ' renders/s':>22}" for label, _ in modules)
+    if args.baseline_rev:
+        header += f" {'speedup':>8}"
+    print(header)
+
+    totals = [0.0] * len(modules)
+    for theme_key in generator.themes:
+        results = [renders_per_second(module, args.product, content, category, theme_key, args.number, args.repeat)
+                   for _, module in modules]
+        row = f"{theme_key:<18}" + "".join(f" {rate:>22,.0f}" for rate, _ in results)
+        if args.baseline_rev:
+            baseline_html, current_html = results[0][1], results[-1][1]
+            row += f" {results[-1][0] / results[0][0]:>7.2f}x"
+            if baseline_html != current_html:
+                row += "  (output differs)"
+        print(row)
+        totals = [total + rate for total, (rate, _) in zip(totals, results)]
+
+    themes = len(generator.themes)
+    summary = f"{'mean':<18}" + "".join(f" {total / themes:>22,.0f}" for total in totals)
+    if args.baseline_rev:
+        summary += f" {totals[-1] / totals[0]:>7.2f}x"
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
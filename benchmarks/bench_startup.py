@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for gpt_site_generator.py
+Measures how long a fresh process takes to import the module and build a generator, minus the bare
+interpreter start, and fails when the median exceeds the budget. Run it in CI to keep startup fast.
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Fallback path, as in a one-shot run without a key: no OpenAI client
+READY_SCRIPT = "import gpt_site_generator; gpt_site_generator.EnhancedGPTSiteGenerator()"
+
+
+def process_ms(code, runs, env):
+    """Wall-clock milliseconds of `python -c code` for each run"""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], env=env, cwd=REPO_ROOT, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark gpt_site_generator start-up time against a budget")
+    parser.add_argument("--runs", type=int, default=15, help="Fresh processes per measurement")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "60")),
+                        help="Maximum median start-up cost over a bare interpreter")
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    env.pop("OPENAI_API_KEY", None)
+
+    # Warm the OS file cache so the first run isn't an outlier
+    process_ms(READY_SCRIPT, 1, env)
+    bare = statistics.median(process_ms("pass", args.runs, env))
+    ready = statistics.median(process_ms(READY_SCRIPT, args.runs, env))
+    cost = ready - bare
+
+    print(f"{'bare interpreter':<28} {bare:>8.1f} ms")
+    print(f"{'import + generator ready':<28} {ready:>8.1f} ms")
+    print(f"{'start-up cost':<28} {cost:>8.1f} ms  (budget {args.budget_ms:.0f} ms)")
+
+    if cost > args.budget_ms:
+        print("❌ Start-up budget exceeded; run `python3 gpt_site_generator.py --profile-startup` to see why")
+        sys.exit(1)
+    print("✅ Within start-up budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI chat and DALL-E endpoints used by gpt_site_generator.py
+Answers /v1/chat/completions (streamed or not) and /v1/images/generations with realistic payloads
+after a configurable latency, and fails a configurable fraction of requests. Point the generator at
+it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1. Prints "LISTENING <port>" once ready.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import contextlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.environ.pop('OPENAI_API_KEY', None)
+
+import gpt_site_generator
+
+PRODUCT_PATTERNS = [
+    re.compile(r'A user wants to create a website for "(.*?)"\.'),
+    re.compile(r'Product: "(.*?)"'),
+]
+KEYS_PATTERN = re.compile(r'containing ONLY these keys: (.*?)\. Take')
+
+
+class StubConfig:
+    """Latency and failure behaviour shared by all handler threads"""
+
+    def __init__(self, latency_ms, jitter_ms, chunk_delay_ms, error_rate, error_status, seed):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.chunk_delay_ms = chunk_delay_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        with contextlib.redirect_stdout(sys.stderr):
+            self.generator = gpt_site_generator.EnhancedGPTSiteGenerator()
+
+    def delay(self):
+        with self.lock:
+            jitter = self.rng.uniform(-self.jitter_ms, self.jitter_ms)
+        time.sleep(max(0.0, self.latency_ms + jitter) / 1000)
+
+    def should_fail(self):
+        with self.lock:
+            return self.rng.random() < self.error_rate
+
+    def content_json(self, prompt):
+        """The JSON answer a content prompt asks for, built from the offline fallback copy"""
+        product_name = product_from_prompt(prompt)
+        category = gpt_site_generator.keyword_categorization(product_name)[0]
+        with contextlib.redirect_stdout(sys.stderr):
+            content = self.generator._enhanced_fallback_content(product_name, category)
+        keys = KEYS_PATTERN.search(prompt)
+        if keys:
+            wanted = [key.strip() for key in keys.group(1).split(",")]
+            content = {key: content[key] for key in wanted if key in content}
+        if '"category": "ONE of' in prompt:
+            content = dict({"category": category}, **content)
+        return json.dumps(content, ensure_ascii=False)
+
+
+def product_from_prompt(prompt):
+    for pattern in PRODUCT_PATTERNS:
+        match = pattern.search(prompt)
+        if match:
+            return match.group(1)
+    return "Product"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        config = self.config
+        config.delay()
+
+        if config.should_fail():
+            self.send_json(config.error_status, {"error": {
+                "message": "Injected failure from stub server", "type": "stub_error", "code": None}},
+                headers={"Retry-After": "0"} if config.error_status == 429 else None)
+            return
+
+        if self.path.endswith("/chat/completions"):
+            self.chat(body)
+        elif self.path.endswith("/images/generations"):
+            host = self.headers.get("Host", "127.0.0.1")
+            image_id = gpt_site_generator.stable_hash(body.get("prompt", "")) % 10 ** 12
+            self.send_json(200, {"created": int(time.time()),
+                                 "data": [{"url": f"http://{host}/images/{image_id}.png"}]})
+        else:
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+
+    def chat(self, body):
+        prompt = body["messages"][-1]["content"]
+        if "categorize it into ONE of these specific categories" in prompt:
+            answer = gpt_site_generator.keyword_categorization(product_from_prompt(prompt))[0]
+        else:
+            answer = self.config.content_json(prompt)
+        model = body.get("model", "stub")
+
+        if not body.get("stream"):
+            self.send_json(200, {
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(answer) // 4,
+                          "total_tokens": (len(prompt) + len(answer)) // 4}
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for start in range(0, len(answer), 64):
+            self.write_event({
+                "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": {"content": answer[start:start + 64]}, "finish_reason": None}]
+            })
+            if self.config.chunk_delay_ms:
+                time.sleep(self.config.chunk_delay_ms / 1000)
+        if (body.get("stream_options") or {}).get("include_usage"):
+            self.write_event({
+                "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [], "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(answer) // 4,
+                                         "total_tokens": (len(prompt) + len(answer)) // 4}
+            })
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.write_chunk(b"")
+
+    def write_event(self, payload):
+        self.write_chunk(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub OpenAI chat/DALL-E server for benchmarks")
+    parser.add_argument("--port", type=int, default=0, help="Port to listen on (0 picks a free one)")
+    parser.add_argument("--latency-ms", type=float, default=300, help="Mean delay before each response")
+    parser.add_argument("--jitter-ms", type=float, default=100, help="Uniform +/- spread around the mean delay")
+    parser.add_argument("--chunk-delay-ms", type=float, default=2, help="Delay between streamed chunks")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=429, help="HTTP status of injected failures")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for latency jitter and failure injection")
+    args = parser.parse_args()
+
+    StubHandler.config = StubConfig(args.latency_ms, args.jitter_ms, args.chunk_delay_ms,
+                                    args.error_rate, args.error_status, args.seed)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), StubHandler)
+    server.daemon_threads = True
+    print(f"LISTENING {server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
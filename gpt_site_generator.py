@@ -7,52 +7,1151 @@ Uses GPT API and Hugging Face API to generate unique themed ecommerce websites
 import os
 import sys
 import json
-import requests
+import re
 import time
 import random
-import tempfile
-import base64
+import hashlib
+import sqlite3
+import threading
+import math
+import mmap
+import zlib
+import struct
+import contextvars
+from array import array
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, Any, List, Optional
-from io import BytesIO
-# Try to import PIL, fallback if not available
-try:
-    from PIL import Image
-except ImportError:
-    # Fallback for environments without PIL
-    Image = None
-    print("Warning: PIL not available, using fallback image handling")
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+# requests, openai, asyncio, tempfile and base64 are imported where they are used: the
+# fallback path never needs them, and every process start pays for module-level imports
 
 # Hugging Face configuration
 HF_API_URL = "https://api-inference.huggingface.co/models/black-forest-labs/FLUX.1-dev"
 HF_TOKEN = os.getenv('HUGGINGFACE_API_TOKEN', '')
 
-def generate_product_image(prompt: str, retries: int = 3) -> str:
-    """Generate product-specific image using ONLY DALL-E API"""
-    openai_api_key = os.getenv('OPENAI_API_KEY', '')
+# Image generation concurrency: at most IMAGE_CONCURRENCY DALL-E calls in flight
+# per site, and every image of a site must be ready within IMAGE_DEADLINE_SECONDS
+IMAGE_CONCURRENCY = int(os.getenv('IMAGE_CONCURRENCY', '5'))
+IMAGE_DEADLINE_SECONDS = float(os.getenv('IMAGE_DEADLINE_SECONDS', '45'))
+
+# OpenAI rate-limit budgets per minute (0 = unlimited); batch work leaves BATCH_RESERVE_FRACTION
+# of every budget to interactive requests, and rate-limited calls are retried with jittered
+# backoff until OPENAI_RETRY_DEADLINE_SECONDS
+OPENAI_CHAT_RPM = float(os.getenv('OPENAI_CHAT_RPM', '500'))
+OPENAI_CHAT_TPM = float(os.getenv('OPENAI_CHAT_TPM', '200000'))
+OPENAI_IMAGE_RPM = float(os.getenv('OPENAI_IMAGE_RPM', '50'))
+BATCH_RESERVE_FRACTION = float(os.getenv('BATCH_RESERVE_FRACTION', '0.2'))
+OPENAI_RETRY_DEADLINE_SECONDS = float(os.getenv('OPENAI_RETRY_DEADLINE_SECONDS', '60'))
+
+# Shared outbound HTTP: keep-alive pool size and timeouts for OpenAI and image downloads;
+# HTTP/2 is used for OpenAI when the h2 package is installed (HTTP2=0 turns it off)
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '20'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '10'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '120'))
+HTTP2_ENABLED = os.getenv('HTTP2', '1') != '0'
+
+# --serve generates on WORKER_PROCESSES processes (0 = in the serving process), one warm
+# generator each; pool and batch processes are pinned to their own CPU unless PIN_WORKER_CPUS=0
+WORKER_PROCESSES = int(os.getenv('WORKER_PROCESSES', '0'))
+PIN_WORKER_CPUS = os.getenv('PIN_WORKER_CPUS', '1') != '0'
+# Generate and stream requests run concurrently on up to WORKER_THREADS threads of the serving
+# process (generates go to the pool instead when there is one); 0 answers them one at a time
+WORKER_THREADS = int(os.getenv('WORKER_THREADS', '8'))
+
+# Upper bound for one whole generation in the asyncio API
+GENERATION_TIMEOUT_SECONDS = float(os.getenv('GENERATION_TIMEOUT_SECONDS', '180'))
+
+# Per-stage spans: WORKER_METRICS_PORT serves Prometheus metrics from --serve workers, and
+# OTEL_TRACING=1 also exports every generation to OpenTelemetry (when the SDK is installed)
+WORKER_METRICS_PORT = int(os.getenv('WORKER_METRICS_PORT', '0'))
+OTEL_TRACING = os.getenv('OTEL_TRACING', '0') == '1'
+
+# OpenAI chat model; part of every content cache key
+OPENAI_CHAT_MODEL = os.getenv('OPENAI_CHAT_MODEL', 'gpt-3.5-turbo')
+
+# Bump whenever the categorization or content prompts change so stale cache entries are ignored
+PROMPT_VERSION = "2"
+
+# Stream content completions and parse top-level keys as they arrive
+OPENAI_STREAM = os.getenv('OPENAI_STREAM', '1') != '0'
+
+# Ask for the category inside the content call instead of a separate categorization call
+SINGLE_CALL_GENERATION = os.getenv('SINGLE_CALL_GENERATION', '1') != '0'
+
+# Keyword categorization confidence at or above which no model call is spent on the category
+CATEGORY_CONFIDENCE_THRESHOLD = float(os.getenv('CATEGORY_CONFIDENCE_THRESHOLD', '0.75'))
+
+# Every top-level key a content response must have before a site can be rendered
+REQUIRED_CONTENT_KEYS = ('tagline', 'meta_description', 'hero', 'features', 'how_it_works',
+                         'catalog', 'testimonials', 'pricing')
+
+# Persistent content cache in front of the OpenAI categorization and content calls
+CACHE_DIR = os.getenv('SITE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'))
+CONTENT_CACHE_ENABLED = os.getenv('CONTENT_CACHE', '1') != '0'
+CONTENT_CACHE_MAX_ENTRIES = int(os.getenv('CONTENT_CACHE_MAX_ENTRIES', '50000'))
+CONTENT_CACHE_MAX_AGE_SECONDS = float(os.getenv('CONTENT_CACHE_MAX_AGE_SECONDS', str(30 * 24 * 3600)))
+
+# Content-addressed store for rendered sites, swept by age and then least-recently-used
+# down to SITE_STORE_MAX_BYTES; the Go backend serves sites from the same directory
+SITE_STORE_DIR = os.getenv('SITE_STORE_DIR') or os.path.join(CACHE_DIR, 'sites')
+SITE_STORE_MAX_BYTES = int(os.getenv('SITE_STORE_MAX_BYTES', str(1024 ** 3)))
+SITE_STORE_MAX_AGE_SECONDS = float(os.getenv('SITE_STORE_MAX_AGE_SECONDS', str(7 * 24 * 3600)))
+
+# Pre-rendered offline pages (built with --build-fallback-corpus; may ship next to this file)
+# that generations without an OpenAI key are answered from before anything is rendered
+FALLBACK_CORPUS_ENABLED = os.getenv('FALLBACK_CORPUS', '1') != '0'
+FALLBACK_CORPUS_PATH = os.getenv('FALLBACK_CORPUS_PATH') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'fallback_corpus.sqlite3')
+
+# Bump whenever page templates, themes or fallback copy change so a stale corpus is ignored
+FALLBACK_CORPUS_VERSION = "2"
+
+# Offline hashed n-gram categorizer consulted before any model call for the category
+LOCAL_CATEGORIZER_ENABLED = os.getenv('LOCAL_CATEGORIZER', '1') != '0'
+LOCAL_CATEGORIZER_PATH = os.getenv('LOCAL_CATEGORIZER_PATH', os.path.join(CACHE_DIR, 'categorizer.bin'))
+LOCAL_CATEGORIZER_THRESHOLD = float(os.getenv('LOCAL_CATEGORIZER_THRESHOLD', '0.8'))
+GENERATED_SITES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'generated_sites')
+
+def _write_file_atomic(path: str, data: str) -> None:
+    """Write text to path via a temporary file so readers never see partial output"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _write_bytes_atomic(path: str, data: bytes) -> None:
+    """Binary counterpart of _write_file_atomic"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def normalize_product_name(product_name: str) -> str:
+    """Normalize a product name so trivially different spellings share cache entries"""
+    return " ".join(product_name.lower().split())
+
+def stable_hash(text: str) -> int:
+    """64-bit hash of text that, unlike hash(), is the same in every process"""
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+
+def site_seed(product_name: str) -> int:
+    """Default generation seed, so the same product always renders the same page"""
+    return stable_hash(normalize_product_name(product_name))
+
+def seeded_random(seed: int, purpose: str) -> random.Random:
+    """Independent random stream per purpose, unaffected by how much other steps draw"""
+    return random.Random(f"{seed}:{purpose}")
+
+def content_cache_key(kind: str, product_name: str) -> str:
+    """Build a cache key from the normalized product name, model and prompt version"""
+    raw = f"{kind}|{normalize_product_name(product_name)}|{OPENAI_CHAT_MODEL}|{PROMPT_VERSION}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def repair_json_fragment(text: str) -> str:
+    """Fix the usual LLM JSON slips: smart quotes and trailing commas"""
+    text = text.replace('\u201c', '"').replace('\u201d', '"')
+    return re.sub(r',\s*([}\]])', r'\1', text)
+
+class IncrementalJSONParser:
+    """Parse a streamed JSON object and emit each top-level key as soon as its value closes
+    
+    Text before the opening brace (markdown fences, chatter) is skipped, and a
+    member that fails to parse is repaired once and otherwise dropped, so one bad
+    key never costs the keys around it.
+    """
+    
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.member: List[str] = []
+        self.done = False
+        self.failed_members = 0
+    
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Consume more text and return the (key, value) pairs completed by it"""
+        completed = []
+        for char in chunk:
+            if self.done:
+                break
+            if self.depth == 0:
+                if char == '{':
+                    self.depth = 1
+                continue
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                self.depth += 1
+            elif char in '}]':
+                self.depth -= 1
+                if self.depth == 0:
+                    completed.extend(self._close_member())
+                    self.done = True
+                    continue
+            elif char == ',' and self.depth == 1:
+                completed.extend(self._close_member())
+                continue
+            self.member.append(char)
+        return completed
+    
+    def _close_member(self) -> List[Tuple[str, Any]]:
+        text = "".join(self.member).strip()
+        self.member = []
+        if not text:
+            return []
+        for candidate in (text, repair_json_fragment(text)):
+            try:
+                return list(json.loads("{" + candidate + "}").items())
+            except json.JSONDecodeError:
+                continue
+        self.failed_members += 1
+        return []
+
+class SQLiteCache:
+    """Disk-backed JSON cache with size- and age-based eviction, safe to share across threads and processes"""
+    
+    # Run the eviction sweep once every this many writes
+    EVICT_EVERY = 100
+    
+    def __init__(self, path: str, table: str = "cache", max_entries: int = CONTENT_CACHE_MAX_ENTRIES,
+                 max_age: float = CONTENT_CACHE_MAX_AGE_SECONDS):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed_at ON {table} (accessed_at)")
+        self._conn.commit()
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None if it is missing or expired"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age:
+                self.misses += 1
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+    
+    def set(self, key: str, value: Any) -> None:
+        """Store a JSON-serializable value under key"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict(now)
+            self._conn.commit()
+    
+    def _evict(self, now: float) -> None:
+        """Drop expired entries, then the least recently used ones beyond max_entries"""
+        self._conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.max_age,))
+        self._conn.execute(
+            f"DELETE FROM {self.table} WHERE key IN ("
+            f"SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for this process and the number of stored entries"""
+        with self._lock:
+            entries = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": entries
+        }
+
+# DALL-E image cache: generated URLs expire after about an hour, so cached URLs
+# are only reused within IMAGE_CACHE_TTL_SECONDS. With IMAGE_CACHE_STORE_BYTES=1
+# the image bytes are also kept in IMAGE_STORE_DIR, and once the URL has expired pages
+# link the stored file through IMAGE_STORE_BASE_URL. Stored images unused for
+# IMAGE_STORE_MAX_AGE_SECONDS, then the least recently used beyond IMAGE_STORE_MAX_BYTES,
+# are swept.
+IMAGE_CACHE_ENABLED = os.getenv('IMAGE_CACHE', '1') != '0'
+IMAGE_CACHE_TTL_SECONDS = float(os.getenv('IMAGE_CACHE_TTL_SECONDS', '3300'))
+IMAGE_CACHE_STORE_BYTES = os.getenv('IMAGE_CACHE_STORE_BYTES', '0') == '1'
+IMAGE_STORE_DIR = os.getenv('IMAGE_STORE_DIR') or os.path.join(GENERATED_SITES_DIR, '_images')
+IMAGE_STORE_BASE_URL = os.getenv('IMAGE_STORE_BASE_URL', '/generated/_images/')
+IMAGE_STORE_MAX_BYTES = int(os.getenv('IMAGE_STORE_MAX_BYTES', str(512 * 1024 ** 2)))
+IMAGE_STORE_MAX_AGE_SECONDS = float(os.getenv('IMAGE_STORE_MAX_AGE_SECONDS', str(30 * 24 * 3600)))
+DALLE_MODEL = "dall-e-3"
+
+# Optional local image assets (IMAGE_ASSETS=1, needs Pillow): each page image is fetched once,
+# resized to IMAGE_ASSET_WIDTHS and recompressed to IMAGE_ASSET_FORMATS (the last one is the
+# <img> fallback; AVIF needs a Pillow built with it) under content-hashed names in
+# IMAGE_ASSET_DIR, and pages reference those files through IMAGE_ASSET_BASE_URL instead of
+# hot-linking expiring DALL-E and full-size stock URLs
+IMAGE_ASSETS_ENABLED = os.getenv('IMAGE_ASSETS', '0') == '1'
+IMAGE_ASSET_DIRNAME = "_assets"
+IMAGE_ASSET_DIR = os.getenv('IMAGE_ASSET_DIR') or os.path.join(GENERATED_SITES_DIR, IMAGE_ASSET_DIRNAME)
+IMAGE_ASSET_BASE_URL = os.getenv('IMAGE_ASSET_BASE_URL', f"/generated/{IMAGE_ASSET_DIRNAME}/")
+IMAGE_ASSET_WIDTHS = tuple(int(width) for width in os.getenv('IMAGE_ASSET_WIDTHS', '480,800,1200').split(','))
+IMAGE_ASSET_FORMATS = tuple(os.getenv('IMAGE_ASSET_FORMATS', 'avif,webp').split(','))
+IMAGE_ASSET_QUALITY = int(os.getenv('IMAGE_ASSET_QUALITY', '70'))
+
+class SiteStore:
+    """Content-addressed store of rendered pages: <root>/<id[:2]>/<id>.html, id = hash of the HTML
+    
+    Identical pages are stored once. Files are written atomically and their mtime doubles
+    as last access, which the sweeper uses to drop sites past max_age and then the least
+    recently used ones until the store fits in max_bytes. Disk usage is tracked here.
+    """
+    
+    # Run the sweep once every this many stored sites
+    SWEEP_EVERY = 100
+    ID_PATTERN = re.compile(r"^[0-9a-f]{20}$")
+    
+    def __init__(self, root: str = SITE_STORE_DIR, max_bytes: int = SITE_STORE_MAX_BYTES,
+                 max_age: float = SITE_STORE_MAX_AGE_SECONDS):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.sites = 0
+        self.bytes = 0
+        self.deduplicated = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        self.sweep()
+    
+    @staticmethod
+    def site_id(html: str) -> str:
+        return hashlib.sha256(html.encode("utf-8")).hexdigest()[:20]
+    
+    def path(self, site_id: str) -> str:
+        return os.path.join(self.root, site_id[:2], f"{site_id}.html")
+    
+    def put(self, html: str) -> Tuple[str, str]:
+        """Store a page (or reuse the identical stored one) and return (site_id, path)"""
+        site_id = self.site_id(html)
+        path = self.path(site_id)
+        try:
+            os.utime(path)
+            with self._lock:
+                self.deduplicated += 1
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _write_file_atomic(path, html)
+            with self._lock:
+                self.sites += 1
+                self.bytes += os.path.getsize(path)
+        
+        with self._lock:
+            self._puts += 1
+            sweep_due = self._puts % self.SWEEP_EVERY == 0 or self.bytes > self.max_bytes
+        if sweep_due:
+            self.sweep()
+        return site_id, path
+    
+    def get(self, site_id: str) -> Optional[str]:
+        """Path of a stored site, marking it recently used, or None if unknown or swept"""
+        if not self.ID_PATTERN.match(site_id):
+            return None
+        path = self.path(site_id)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+    
+    def sweep(self) -> int:
+        """Drop expired sites, then least recently used ones beyond max_bytes; returns how many went"""
+        now = time.time()
+        files = []
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".html"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for mtime, size, path in files:
+            if now - mtime <= self.max_age and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        
+        with self._lock:
+            self.sites = len(files) - removed
+            self.bytes = total
+        if removed:
+            print(f"🧹 Site store sweep removed {removed} site(s)")
+        return removed
+    
+    def usage(self) -> Dict[str, Any]:
+        """Stored sites and bytes against the configured limits"""
+        with self._lock:
+            return {"sites": self.sites, "bytes": self.bytes, "max_bytes": self.max_bytes,
+                    "deduplicated": self.deduplicated}
+
+_site_store = None
+_site_store_lock = threading.Lock()
+
+def get_site_store() -> SiteStore:
+    """Return the process-wide site store, opening (and sweeping) it on first use"""
+    global _site_store
+    with _site_store_lock:
+        if _site_store is None:
+            _site_store = SiteStore()
+    return _site_store
+
+class FallbackCorpus:
+    """SQLite file of pre-rendered offline pages keyed by corpus version, page variant, seed and product
+    
+    Generation is deterministic, so a corpus page is byte-identical to what offline generation
+    would render for the same key. Serving processes open it read-only.
+    """
+    
+    def __init__(self, path: str = FALLBACK_CORPUS_PATH, writable: bool = False):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if writable:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS corpus ("
+                               "key TEXT PRIMARY KEY, html TEXT NOT NULL, metadata TEXT NOT NULL)")
+        else:
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    
+    @staticmethod
+    def key(product_name: str, seed: int, page_variant: str) -> str:
+        # The exact name, not the normalized one: pages spell the product the way it was asked for
+        return f"{FALLBACK_CORPUS_VERSION}|{page_variant}|{seed}|{product_name}"
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """The stored {"html", "metadata"} for key, or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT html, metadata FROM corpus WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return {"html": row[0], "metadata": json.loads(row[1])}
+    
+    def put(self, key: str, html: str, metadata: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO corpus (key, html, metadata) VALUES (?, ?, ?)",
+                               (key, html, json.dumps(metadata)))
+    
+    def commit(self) -> None:
+        with self._lock:
+            self._conn.commit()
+    
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process and the number of stored pages"""
+        with self._lock:
+            pages = self._conn.execute("SELECT COUNT(*) FROM corpus").fetchone()[0]
+        return {"path": self.path, "hits": self.hits, "misses": self.misses, "pages": pages}
+
+_fallback_corpus = None
+_fallback_corpus_checked = False
+_fallback_corpus_lock = threading.Lock()
+
+def get_fallback_corpus() -> Optional[FallbackCorpus]:
+    """Return the process-wide fallback corpus, or None when disabled or not built"""
+    global _fallback_corpus, _fallback_corpus_checked
+    with _fallback_corpus_lock:
+        if not _fallback_corpus_checked:
+            _fallback_corpus_checked = True
+            if FALLBACK_CORPUS_ENABLED and os.path.exists(FALLBACK_CORPUS_PATH):
+                try:
+                    _fallback_corpus = FallbackCorpus(FALLBACK_CORPUS_PATH)
+                    # A corpus without the table is as good as none
+                    _fallback_corpus.stats()
+                except sqlite3.Error as e:
+                    print(f"⚠️ Fallback corpus unavailable: {e}")
+                    _fallback_corpus = None
+    return _fallback_corpus
+
+class InFlightRequests:
+    """Coalesce concurrent calls with the same key into a single underlying call"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+    
+    def run(self, key: str, fn):
+        """Run fn for key, or wait for the identical call that is already in flight"""
+        from concurrent.futures import Future
+        
+        with self._lock:
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._pending[key] = future
+        
+        if not owner:
+            return future.result()
+        
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+class TokenBucket:
+    """Per-minute budget that refills continuously; a limit of 0 means unlimited"""
+    
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
     
-    if not openai_api_key or openai_api_key == 'your_openai_key_here':
-        print("❌ No valid OpenAI API key - cannot generate images")
-        return get_smart_fallback_image(prompt)
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
     
+    def take(self, amount: float) -> None:
+        if self.capacity:
+            self.level -= amount
+    
+    def wait_time(self, amount: float, reserve: float) -> float:
+        """Seconds until amount can be taken while keeping reserve (a capacity fraction) untouched"""
+        if not self.capacity:
+            return 0.0
+        # A single request larger than the whole budget only has to wait for a full bucket
+        needed = min(amount + reserve * self.capacity, self.capacity)
+        return max(0.0, (needed - self.level) / self.rate)
+
+def _is_retryable_openai_error(e: Exception) -> bool:
+    """Rate limits, timeouts, connection drops and 5xx answers are worth retrying"""
+    if type(e).__name__ in ("RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError"):
+        return True
+    return getattr(e, "status_code", None) in (429, 500, 502, 503, 504)
+
+def _retry_after_seconds(e: Exception) -> Optional[float]:
+    """The server's Retry-After hint from an OpenAI error, if it sent one"""
     try:
-        import openai
+        return float(e.response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+class RateLimitScheduler:
+    """Shared requests- and tokens-per-minute budgets for OpenAI chat and image calls
+    
+    Callers wait for budget instead of firing into a 429. Batch callers may only spend
+    a budget down to BATCH_RESERVE_FRACTION of its capacity, so interactive requests
+    keep headroom and go first under load. A 429 pauses the whole kind, and failed
+    calls are retried with jittered exponential backoff until the caller's deadline.
+    """
+    
+    BACKOFF_BASE_SECONDS = 0.5
+    BACKOFF_MAX_SECONDS = 20.0
+    
+    def __init__(self, limits: Dict[str, Tuple[float, float]], batch_reserve: float = BATCH_RESERVE_FRACTION):
+        self._lock = threading.Lock()
+        self._buckets = {kind: (TokenBucket(rpm), TokenBucket(tpm)) for kind, (rpm, tpm) in limits.items()}
+        self._paused_until = dict.fromkeys(limits, 0.0)
+        self.batch_reserve = batch_reserve
+        self.throttled = 0
+        self.retried = 0
+    
+    def scale(self, fraction: float) -> None:
+        """Shrink every budget to a share, for one of several processes drawing on the same key"""
+        with self._lock:
+            for bucket in (bucket for pair in self._buckets.values() for bucket in pair):
+                bucket.capacity *= fraction
+                bucket.rate *= fraction
+                bucket.level = min(bucket.level, bucket.capacity)
+    
+    def try_acquire(self, kind: str, tokens: float = 0, priority: str = "interactive") -> float:
+        """Take budget for one call and return 0, or return how many seconds to wait first"""
+        reserve = self.batch_reserve if priority == "batch" else 0.0
+        now = time.monotonic()
+        with self._lock:
+            requests_bucket, tokens_bucket = self._buckets[kind]
+            requests_bucket.refill(now)
+            tokens_bucket.refill(now)
+            wait = max(self._paused_until[kind] - now,
+                       requests_bucket.wait_time(1, reserve),
+                       tokens_bucket.wait_time(tokens, reserve))
+            if wait > 0:
+                return wait
+            requests_bucket.take(1)
+            tokens_bucket.take(tokens)
+            return 0.0
+    
+    def settle(self, kind: str, estimated_tokens: float, used_tokens: Optional[float]) -> None:
+        """Correct a token estimate once the real usage is known"""
+        if used_tokens is None:
+            return
+        with self._lock:
+            bucket = self._buckets[kind][1]
+            if bucket.capacity:
+                bucket.level = min(bucket.capacity, bucket.level + estimated_tokens - used_tokens)
+    
+    def pause(self, kind: str, seconds: float) -> None:
+        """Stop handing out budget for kind, after the API told us to slow down"""
+        with self._lock:
+            self._paused_until[kind] = max(self._paused_until[kind], time.monotonic() + seconds)
+    
+    def _backoff(self, kind: str, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential backoff, never shorter than the server's Retry-After"""
+        delay = random.uniform(0, min(self.BACKOFF_MAX_SECONDS, self.BACKOFF_BASE_SECONDS * 2 ** attempt))
+        retry_after = _retry_after_seconds(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError":
+            self.pause(kind, delay)
+        return delay
+    
+    def call(self, kind: str, fn, tokens: float = 0, priority: str = "interactive", retries: int = 3,
+             deadline: Optional[float] = OPENAI_RETRY_DEADLINE_SECONDS):
+        """Run fn() once budget allows, retrying retryable failures until retries or deadline run out"""
+        give_up_at = time.monotonic() + deadline if deadline else None
+        attempt = 0
+        while True:
+            wait = self.try_acquire(kind, tokens, priority)
+            if wait:
+                self.throttled += 1
+                if give_up_at is not None and time.monotonic() + wait > give_up_at:
+                    raise TimeoutError(f"OpenAI {kind} budget exhausted until past the deadline")
+                time.sleep(wait)
+                continue
+            try:
+                return fn()
+            except Exception as e:
+                if attempt >= retries or not _is_retryable_openai_error(e):
+                    raise
+                delay = self._backoff(kind, attempt, e)
+                if give_up_at is not None and time.monotonic() + delay > give_up_at:
+                    raise
+                attempt += 1
+                self.retried += 1
+                print(f"🔁 OpenAI {kind} call failed ({type(e).__name__}), retry {attempt}/{retries} in {delay:.1f}s")
+                time.sleep(delay)
+    
+    async def call_async(self, kind: str, make_coroutine, tokens: float = 0, priority: str = "interactive",
+                         retries: int = 3, deadline: Optional[float] = OPENAI_RETRY_DEADLINE_SECONDS):
+        """asyncio version of call; make_coroutine() is invoked once per attempt"""
+        import asyncio
+        give_up_at = time.monotonic() + deadline if deadline else None
+        attempt = 0
+        while True:
+            wait = self.try_acquire(kind, tokens, priority)
+            if wait:
+                self.throttled += 1
+                if give_up_at is not None and time.monotonic() + wait > give_up_at:
+                    raise TimeoutError(f"OpenAI {kind} budget exhausted until past the deadline")
+                await asyncio.sleep(wait)
+                continue
+            try:
+                return await make_coroutine()
+            except Exception as e:
+                if attempt >= retries or not _is_retryable_openai_error(e):
+                    raise
+                delay = self._backoff(kind, attempt, e)
+                if give_up_at is not None and time.monotonic() + delay > give_up_at:
+                    raise
+                attempt += 1
+                self.retried += 1
+                print(f"🔁 OpenAI {kind} call failed ({type(e).__name__}), retry {attempt}/{retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Throttle and retry counters plus the budget left per kind"""
+        now = time.monotonic()
+        with self._lock:
+            budgets = {}
+            for kind, (requests_bucket, tokens_bucket) in self._buckets.items():
+                requests_bucket.refill(now)
+                tokens_bucket.refill(now)
+                budgets[kind] = {
+                    "requests": round(requests_bucket.level, 1) if requests_bucket.capacity else None,
+                    "tokens": round(tokens_bucket.level) if tokens_bucket.capacity else None
+                }
+        return {"throttled": self.throttled, "retried": self.retried, "budgets": budgets}
+
+def estimate_chat_tokens(prompt: str, max_tokens: int) -> int:
+    """Rough tokens-per-minute cost of a chat call: ~4 characters per prompt token plus the answer budget"""
+    return len(prompt) // 4 + max_tokens
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> RateLimitScheduler:
+    """Return the process-wide OpenAI rate-limit scheduler"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RateLimitScheduler({
+                "chat": (OPENAI_CHAT_RPM, OPENAI_CHAT_TPM),
+                "images": (OPENAI_IMAGE_RPM, 0),
+            })
+    return _scheduler
+
+class Span:
+    """One timed pipeline stage (categorize, content, image, render, write) and its attributes
+    
+    Attributes include cache ("hit"/"miss"), prompt_tokens/completion_tokens and fallback_reason.
+    """
+    
+    def __init__(self, name: str, attributes: Dict[str, Any], trace: Optional["Trace"]):
+        self.name = name
+        self.attributes = attributes
+        self.trace = trace
+        self.started = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms = None
+    
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+    
+    def add_tokens(self, prompt_tokens: int, completion_tokens: int) -> None:
+        self.attributes["prompt_tokens"] = self.attributes.get("prompt_tokens", 0) + prompt_tokens
+        self.attributes["completion_tokens"] = self.attributes.get("completion_tokens", 0) + completion_tokens
+    
+    def finish(self) -> None:
+        """Record the span in its trace and the stage metrics; later calls do nothing"""
+        if self.duration_ms is not None:
+            return
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+        if self.trace is not None:
+            self.trace.add(self)
+        get_stage_metrics().observe(self)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.attributes, name=self.name, start=round(self.started, 6),
+                    duration_ms=round(self.duration_ms or 0.0, 3))
+
+class Trace:
+    """Spans of one site generation, collected across the threads and tasks working on it"""
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.spans = []
+        self.started = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms = None
+        self._lock = threading.Lock()
+    
+    def add(self, span: Span) -> None:
+        with self._lock:
+            # Images that missed the deadline finish after the page has gone out
+            if self.duration_ms is None:
+                self.spans.append(span)
+    
+    def finish(self) -> None:
+        with self._lock:
+            self.duration_ms = (time.perf_counter() - self._started) * 1000
+    
+    def stage_totals(self) -> Dict[str, float]:
+        """Milliseconds per stage name; concurrent image spans overlap, so they can exceed the total"""
+        totals = {}
+        for span in self.spans:
+            totals[span.name] = round(totals.get(span.name, 0.0) + span.duration_ms, 3)
+        return totals
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {"total_ms": round(self.duration_ms or 0.0, 3), "stages": self.stage_totals(),
+                "spans": [span.to_dict() for span in self.spans]}
+
+# Context variables follow asyncio tasks; image threads get a copy of the context explicitly
+_current_trace = contextvars.ContextVar("site_generator_trace", default=None)
+
+@contextmanager
+def collect_trace(name: str = "generate_website") -> Iterator[Trace]:
+    """Collect the spans of every stage run inside the block"""
+    trace = Trace(name)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        trace.finish()
+        if OTEL_TRACING:
+            export_trace_to_otel(trace)
+
+def start_span(name: str, **attributes) -> Span:
+    """Start a stage span in the current trace (if any); the caller must finish() it"""
+    return Span(name, attributes, _current_trace.get())
+
+@contextmanager
+def stage_span(name: str, **attributes) -> Iterator[Span]:
+    """Time the block as one stage span"""
+    span = start_span(name, **attributes)
+    try:
+        yield span
+    except BaseException as e:
+        span.set(error=type(e).__name__)
+        raise
+    finally:
+        span.finish()
+
+def export_trace_to_otel(trace: Trace) -> None:
+    """Replay a finished trace as OpenTelemetry spans under one root span
+    
+    Only the API is used here; the tracer provider and exporter come from the usual
+    OpenTelemetry SDK setup (for example opentelemetry-instrument and OTEL_* settings).
+    """
+    try:
+        from opentelemetry import trace as otel_trace
+    except ImportError:
+        return
+    tracer = otel_trace.get_tracer("gpt_site_generator")
+    root = tracer.start_span(trace.name, start_time=int(trace.started * 1e9))
+    parent = otel_trace.set_span_in_context(root)
+    for span in trace.spans:
+        attributes = {key: value for key, value in span.attributes.items()
+                      if isinstance(value, (str, bool, int, float))}
+        child = tracer.start_span(span.name, context=parent, start_time=int(span.started * 1e9),
+                                  attributes=attributes)
+        child.end(end_time=int((span.started + span.duration_ms / 1000) * 1e9))
+    root.end(end_time=int((trace.started + trace.duration_ms / 1000) * 1e9))
+
+class StageMetrics:
+    """Process-wide per-stage latency histograms and counters, in Prometheus text format"""
+    
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+    PREFIX = "site_generator"
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        # stage -> [count per bucket..., +Inf count, sum of seconds]
+        self._histograms = {}
+        # (metric, ((label, value), ...)) -> count
+        self._counters = {}
+    
+    def _count(self, metric: str, amount: float = 1, **labels) -> None:
+        key = (metric, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0) + amount
+    
+    def observe(self, span: Span) -> None:
+        self._observe(span.name, span.duration_ms, span.attributes)
+    
+    def observe_dict(self, span: Dict[str, Any]) -> None:
+        """Record a span serialized by Span.to_dict, e.g. from another process's trace"""
+        self._observe(span["name"], span["duration_ms"], span)
+    
+    def _observe(self, stage: str, duration_ms: float, attributes: Dict[str, Any]) -> None:
+        seconds = duration_ms / 1000
+        with self._lock:
+            histogram = self._histograms.setdefault(stage, [0] * (len(self.BUCKETS) + 2))
+            for i, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += seconds
+            if attributes.get("cache"):
+                self._count("stage_cache_total", stage=stage, result=attributes["cache"])
+            for kind in ("prompt_tokens", "completion_tokens"):
+                if attributes.get(kind):
+                    self._count("openai_tokens_total", attributes[kind], stage=stage, kind=kind)
+            if attributes.get("fallback_reason"):
+                self._count("stage_fallback_total", stage=stage, reason=attributes["fallback_reason"])
+            if attributes.get("error"):
+                self._count("stage_errors_total", stage=stage)
+    
+    def render(self) -> str:
+        """Metrics in the Prometheus text exposition format"""
+        name = f"{self.PREFIX}_stage_duration_seconds"
+        lines = [f"# HELP {name} Time spent in each generation stage",
+                 f"# TYPE {name} histogram"]
+        with self._lock:
+            for stage, histogram in sorted(self._histograms.items()):
+                for i, bound in enumerate(self.BUCKETS):
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {histogram[i]}')
+                lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram[-2]}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram[-1]:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram[-2]}')
+            counters = sorted(self._counters.items())
+        
+        helps = {
+            "stage_cache_total": "Cache lookups per stage by result",
+            "openai_tokens_total": "OpenAI tokens used per stage",
+            "stage_fallback_total": "Stages that fell back, by reason",
+            "stage_errors_total": "Stages that raised",
+        }
+        for metric, help_text in helps.items():
+            samples = [(labels, value) for (name, labels), value in counters if name == metric]
+            if not samples:
+                continue
+            lines.append(f"# HELP {self.PREFIX}_{metric} {help_text}")
+            lines.append(f"# TYPE {self.PREFIX}_{metric} counter")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{value_}"' for key, value_ in labels)
+                lines.append(f"{self.PREFIX}_{metric}{{{label_text}}} {value}")
+        return "\n".join(lines) + "\n"
+
+_stage_metrics = StageMetrics()
+
+def get_stage_metrics() -> StageMetrics:
+    """Return the process-wide stage metrics"""
+    return _stage_metrics
+
+def _http2_available() -> bool:
+    import importlib.util
+    return HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+
+def _httpx_client_options() -> Dict[str, Any]:
+    """Pool limits and timeouts shared by the sync and async OpenAI HTTP clients"""
+    import httpx
+    return {
+        "limits": httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE),
+        "timeout": httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        "http2": _http2_available(),
+    }
+
+_openai_clients = {}
+_http_session = None
+_http_lock = threading.Lock()
+
+def get_openai_client(api_key: str):
+    """Return the process-wide OpenAI client for api_key, shared by chat and image calls
+    
+    One client means one keep-alive connection pool, so a page's images don't each pay
+    for a new TLS handshake. Retries are left to the rate-limit scheduler.
+    """
+    with _http_lock:
+        client = _openai_clients.get(api_key)
+        if client is None:
+            import openai
+            try:
+                import httpx
+                http_client = httpx.Client(**_httpx_client_options())
+            except ImportError:
+                # openai still pools connections inside its own default client
+                http_client = None
+            client = openai.OpenAI(api_key=api_key, max_retries=0, http_client=http_client,
+                                   timeout=HTTP_READ_TIMEOUT)
+            _openai_clients[api_key] = client
+    return client
+
+def new_async_openai_client(api_key: str):
+    """AsyncOpenAI client with the same pool limits and timeouts; bound to the loop that uses it"""
+    import openai
+    try:
+        import httpx
+        http_client = httpx.AsyncClient(**_httpx_client_options())
+    except ImportError:
+        http_client = None
+    return openai.AsyncOpenAI(api_key=api_key, max_retries=0, http_client=http_client,
+                              timeout=HTTP_READ_TIMEOUT)
+
+def get_http_session() -> "requests.Session":
+    """Return the process-wide keep-alive requests session for image downloads"""
+    global _http_session
+    with _http_lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+    return _http_session
+
+_image_requests = InFlightRequests()
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+def get_image_cache() -> Optional[SQLiteCache]:
+    """Return the process-wide DALL-E image cache, creating it on first use"""
+    global _image_cache
+    if not IMAGE_CACHE_ENABLED:
+        return None
+    with _image_cache_lock:
+        if _image_cache is None:
+            try:
+                _image_cache = SQLiteCache(os.path.join(CACHE_DIR, "images.sqlite3"), table="images",
+                                           max_age=IMAGE_CACHE_TTL_SECONDS)
+            except sqlite3.Error as e:
+                print(f"⚠️ Image cache unavailable: {e}")
+                return None
+    return _image_cache
+
+def image_cache_key(clean_prompt: str) -> str:
+    """Build an image cache key from the cleaned DALL-E prompt and image settings"""
+    raw = f"{DALLE_MODEL}|1024x1024|standard|vivid|{clean_prompt}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _stored_image_path(cache_key: str) -> str:
+    return os.path.join(IMAGE_STORE_DIR, f"{cache_key}.png")
+
+# Sweep the stored images on a process's first store, then once every this many stores
+IMAGE_STORE_SWEEP_EVERY = 50
+_stored_image_writes = 0
+_stored_image_lock = threading.Lock()
+
+def _store_image_bytes(cache_key: str, image_url: str) -> None:
+    """Download a freshly generated image so it can be re-served after its URL expires"""
+    global _stored_image_writes
+    try:
+        response = get_http_session().get(image_url, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+        response.raise_for_status()
+        os.makedirs(IMAGE_STORE_DIR, exist_ok=True)
+        _write_bytes_atomic(_stored_image_path(cache_key), response.content)
+    except Exception as e:
+        print(f"⚠️ Could not store image bytes: {e}")
+        return
+    with _stored_image_lock:
+        sweep_due = _stored_image_writes % IMAGE_STORE_SWEEP_EVERY == 0
+        _stored_image_writes += 1
+    if sweep_due:
+        sweep_stored_images()
+
+def sweep_stored_images(root: str = IMAGE_STORE_DIR, max_bytes: int = IMAGE_STORE_MAX_BYTES,
+                        max_age: float = IMAGE_STORE_MAX_AGE_SECONDS) -> int:
+    """Drop stored images unused for max_age, then least recently used ones beyond max_bytes"""
+    now = time.time()
+    try:
+        files = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                       for entry in os.scandir(root) if entry.name.endswith(".png"))
+    except FileNotFoundError:
+        return 0
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for mtime, size, path in files:
+        if now - mtime <= max_age and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    if removed:
+        print(f"🧹 Image store sweep removed {removed} image(s)")
+    return removed
+
+def _load_stored_image(cache_key: str) -> Optional[str]:
+    """URL of the stored copy of an image, if one was saved for this key (marking it recently used)"""
+    try:
+        os.utime(_stored_image_path(cache_key))
+    except FileNotFoundError:
+        return None
+    return f"{IMAGE_STORE_BASE_URL}{cache_key}.png"
+
+def openai_key_configured() -> bool:
+    """Whether OPENAI_API_KEY holds something other than nothing or the example placeholder"""
+    openai_api_key = os.getenv('OPENAI_API_KEY', '')
+    return bool(openai_api_key) and openai_api_key != 'your_openai_key_here'
+
+def generate_product_image(prompt: str, retries: int = 3, timeout: Optional[float] = None,
+                           priority: str = "interactive") -> str:
+    """Generate product-specific image using ONLY DALL-E API, reusing cached and in-flight results"""
+    with stage_span("image", prompt=prompt) as span:
+        openai_api_key = os.getenv('OPENAI_API_KEY', '')
         
-        # Initialize OpenAI client
-        client = openai.OpenAI(api_key=openai_api_key)
+        if not openai_key_configured():
+            print("❌ No valid OpenAI API key - cannot generate images")
+            span.set(fallback_reason="no_api_key")
+            return get_smart_fallback_image(prompt)
         
         # Clean and optimize prompt for DALL-E
         clean_prompt = clean_dalle_prompt(prompt)
+        cache_key = image_cache_key(clean_prompt)
+        
+        cached = _cached_image(cache_key, clean_prompt)
+        span.set(cache="hit" if cached else "miss")
+        if cached:
+            return cached
+        
+        # Concurrent requests for the same prompt share one DALL-E call
+        image_url = _image_requests.run(
+            cache_key, lambda: _request_dalle_image(openai_api_key, clean_prompt, timeout, retries, priority, span))
+        if not image_url:
+            span.attributes.setdefault("fallback_reason", "openai_failed")
+            return get_smart_fallback_image(prompt)
+        
+        _remember_image(cache_key, image_url)
+        return image_url
+
+def _cached_image(cache_key: str, clean_prompt: str) -> Optional[str]:
+    """Image URL (or stored data URI) already generated for this prompt, if any"""
+    cache = get_image_cache()
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached:
+            print(f"⚡ Image cache hit for: {clean_prompt}")
+            return cached["url"]
+    
+    if IMAGE_CACHE_STORE_BYTES:
+        stored = _load_stored_image(cache_key)
+        if stored:
+            print(f"⚡ Re-serving stored image for: {clean_prompt}")
+            return stored
+    return None
+
+def _remember_image(cache_key: str, image_url: str) -> None:
+    """Cache a freshly generated image URL, and its bytes when enabled"""
+    cache = get_image_cache()
+    if cache is not None:
+        cache.set(cache_key, {"url": image_url})
+    if IMAGE_CACHE_STORE_BYTES:
+        _store_image_bytes(cache_key, image_url)
+
+def _request_dalle_image(openai_api_key: str, clean_prompt: str, timeout: Optional[float] = None,
+                         retries: int = 3, priority: str = "interactive",
+                         span: Optional[Span] = None) -> Optional[str]:
+    """Call DALL-E for one cleaned prompt, returning the image URL or None on failure"""
+    try:
+        import openai
+        
+        # Shared, pooled client; retries are left to the rate-limit scheduler
+        client = get_openai_client(openai_api_key)
+        
         print(f"🎨 Generating DALL-E image for: {clean_prompt}")
         
-        response = client.images.generate(
-            model="dall-e-3",
+        response = get_scheduler().call("images", lambda: client.images.generate(
+            model=DALLE_MODEL,
             prompt=clean_prompt,
             n=1,
             size="1024x1024",
             quality="standard",
-            style="vivid"
-        )
+            style="vivid",
+            timeout=timeout
+        ), retries=retries, priority=priority, deadline=timeout)
         
         if response.data and len(response.data) > 0:
             image_url = response.data[0].url
@@ -60,17 +1159,90 @@ def generate_product_image(prompt: str, retries: int = 3) -> str:
             return image_url
         else:
             print("❌ No image data returned from DALL-E")
-            return get_smart_fallback_image(prompt)
+            _set_fallback_reason(span, "empty_response")
+            return None
             
-    except openai.RateLimitError as e:
+    except (openai.RateLimitError, TimeoutError) as e:
         print(f"⚠️ OpenAI quota exceeded - using smart fallback images")
-        return get_smart_fallback_image(prompt)
+        _set_fallback_reason(span, "rate_limited")
+        return None
     except openai.BadRequestError as e:
         print(f"⚠️ DALL-E request error (may be content policy) - using smart fallback")
-        return get_smart_fallback_image(prompt)
+        _set_fallback_reason(span, "bad_request")
+        return None
     except Exception as e:
         print(f"❌ DALL-E generation failed: {e}")
-        return get_smart_fallback_image(prompt)
+        _set_fallback_reason(span, "openai_error")
+        return None
+
+def record_token_usage(span: Optional[Span], usage: Any, prompt: str, answer: Any) -> None:
+    """Add a chat call's token counts to span, estimating (~4 characters a token) without usage data"""
+    if span is None:
+        return
+    if usage is not None and getattr(usage, "prompt_tokens", None) is not None:
+        span.add_tokens(usage.prompt_tokens, usage.completion_tokens or 0)
+        return
+    answer_chars = answer if isinstance(answer, int) else len(answer)
+    span.add_tokens(len(prompt) // 4, answer_chars // 4)
+    span.set(tokens_estimated=True)
+
+def _set_fallback_reason(span: Optional[Span], reason: str) -> None:
+    if span is not None:
+        span.set(fallback_reason=reason)
+
+def iter_product_images(prompts: List[str], max_workers: int = IMAGE_CONCURRENCY,
+                        deadline: float = IMAGE_DEADLINE_SECONDS,
+                        priority: str = "interactive") -> Iterator[Tuple[int, str]]:
+    """Generate several product images concurrently, yielding (index, url) as each one is ready
+
+    Images that miss the deadline or fail are yielded last, as smart fallbacks.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+    
+    if not prompts:
+        return
+    
+    if not openai_key_configured():
+        # Every image is an instant smart fallback; a thread pool would only add overhead
+        for index, prompt in enumerate(prompts):
+            yield index, generate_product_image(prompt, timeout=deadline, priority=priority)
+        return
+    
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(prompts))),
+                                  thread_name_prefix="image")
+    # Each image runs in a copy of the caller's context so its span lands in the caller's trace
+    futures = {executor.submit(contextvars.copy_context().run, generate_product_image, prompt,
+                               timeout=deadline, priority=priority): index
+               for index, prompt in enumerate(prompts)}
+    pending = set(range(len(prompts)))
+    try:
+        for future in as_completed(futures, timeout=deadline):
+            index = futures[future]
+            pending.discard(index)
+            try:
+                yield index, future.result()
+            except Exception as e:
+                print(f"❌ Image generation failed: {e}")
+                yield index, get_smart_fallback_image(prompts[index])
+    except FuturesTimeoutError:
+        pass
+    finally:
+        # Don't block the page on stragglers; they finish (or time out) in the background
+        executor.shutdown(wait=False, cancel_futures=True)
+    
+    for index in sorted(pending):
+        print(f"⏱️ Image deadline exceeded - using smart fallback for: {prompts[index]}")
+        start_span("image", prompt=prompts[index], fallback_reason="deadline").finish()
+        yield index, get_smart_fallback_image(prompts[index])
+
+def generate_product_images(prompts: List[str], max_workers: int = IMAGE_CONCURRENCY,
+                            deadline: float = IMAGE_DEADLINE_SECONDS,
+                            priority: str = "interactive") -> List[str]:
+    """Generate several product images concurrently, falling back for any that miss the deadline"""
+    images = [""] * len(prompts)
+    for index, url in iter_product_images(prompts, max_workers, deadline, priority):
+        images[index] = url
+    return images
 
 def clean_dalle_prompt(prompt: str) -> str:
     """Clean and optimize prompt for DALL-E API"""
@@ -103,52 +1275,293 @@ def extract_key_product_words(prompt: str) -> str:
     key_words = [w for w in words.split() if len(w) > 2 and w not in ['and', 'the', 'for', 'with', 'from']]
     return ' '.join(key_words[:3])  # Take first 3 meaningful words
 
+class KeywordIndex:
+    """Precompiled token -> category weights; scores every category in one pass over the text
+    
+    Keywords match whole words (with a plural "s"/"es" stripped), so "table" no longer
+    hits "tablet" and "ai" no longer hits "chair". A keyword is either a word or a
+    (word, weight) pair; categories earlier in the table win ties.
+    """
+    
+    TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+    
+    def __init__(self, table: Dict[str, List[Any]]):
+        self.categories = list(table)
+        self.index: Dict[str, List[Tuple[str, float]]] = {}
+        for category, keywords in table.items():
+            for keyword in keywords:
+                word, weight = keyword if isinstance(keyword, tuple) else (keyword, 1.0)
+                self.index.setdefault(word, []).append((category, weight))
+    
+    def _lookup(self, token: str) -> List[Tuple[str, float]]:
+        if token in self.index:
+            return self.index[token]
+        if token.endswith("es") and token[:-2] in self.index:
+            return self.index[token[:-2]]
+        if token.endswith("s"):
+            return self.index.get(token[:-1], [])
+        return []
+    
+    def scores(self, text: str) -> Dict[str, float]:
+        """Summed keyword weight per category, in table order"""
+        totals = dict.fromkeys(self.categories, 0.0)
+        for token in self.TOKEN_PATTERN.findall(text.lower()):
+            for category, weight in self._lookup(token):
+                totals[category] += weight
+        return totals
+    
+    def classify(self, text: str, default: str) -> Tuple[str, float]:
+        """Best category and its share of all keyword weight (0 when nothing matched)"""
+        totals = self.scores(text)
+        total = sum(totals.values())
+        if not total:
+            return default, 0.0
+        category = max(totals, key=totals.get)
+        return category, totals[category] / total
+
+# Keywords that pick a fallback stock photo set, keyed like the product categories
+FALLBACK_IMAGE_KEYWORDS = {
+    "technology": ['laptop', 'computer', 'gaming', 'mouse', 'keyboard', 'phone', 'smartphone', 'tablet', 'headphones', 'tech', 'electronic', 'device', 'gadget'],
+    "fashion": ['fashion', 'clothing', 'accessory', 'accessories', 'bag', 'handbag', 'watch', 'jewelry', 'shoes', 'apparel'],
+    "food_beverage": ['coffee', 'food', 'beverage', 'drink', 'kitchen', 'cooking', 'restaurant', 'culinary'],
+    "health_wellness": ['health', 'fitness', 'wellness', 'medical', 'yoga', 'exercise', 'supplement', 'beauty'],
+}
+
+FALLBACK_IMAGES = {
+    "technology": [
+        "https://images.unsplash.com/photo-1593642632823-8f785ba67e45?w=800&h=600&fit=crop&q=80",  # Laptop
+        "https://images.unsplash.com/photo-1542751371-adc38448a05e?w=800&h=600&fit=crop&q=80",  # Gaming setup
+        "https://images.unsplash.com/photo-1583394838336-acd977736f90?w=800&h=600&fit=crop&q=80",  # Headphones
+        "https://images.unsplash.com/photo-1511707171634-5f897ff02aa9?w=800&h=600&fit=crop&q=80",  # Phone
+    ],
+    "fashion": [
+        "https://images.unsplash.com/photo-1553062407-98eeb64c6a62?w=800&h=600&fit=crop&q=80",  # Handbag
+        "https://images.unsplash.com/photo-1594223274512-ad4803739b7c?w=800&h=600&fit=crop&q=80",  # Watch
+        "https://images.unsplash.com/photo-1549298916-b41d501d3772?w=800&h=600&fit=crop&q=80",  # Shoes
+        "https://images.unsplash.com/photo-1492707892479-7bc8d5a4ee93?w=800&h=600&fit=crop&q=80",  # Fashion
+    ],
+    "food_beverage": [
+        "https://images.unsplash.com/photo-1447933601403-0c6688de566e?w=800&h=600&fit=crop&q=80",  # Coffee
+        "https://images.unsplash.com/photo-1556909114-f6e7ad7d3136?w=800&h=600&fit=crop&q=80",  # Kitchen
+        "https://images.unsplash.com/photo-1498837167922-ddd27525d352?w=800&h=600&fit=crop&q=80",  # Food
+        "https://images.unsplash.com/photo-1555126634-323283e090fa?w=800&h=600&fit=crop&q=80",  # Beverage
+    ],
+    "health_wellness": [
+        "https://images.unsplash.com/photo-1571019613454-1cb2f99b2d8b?w=800&h=600&fit=crop&q=80",  # Yoga
+        "https://images.unsplash.com/photo-1544367567-0f2fcb009e0b?w=800&h=600&fit=crop&q=80",  # Fitness
+        "https://images.unsplash.com/photo-1505751172876-fa1923c5c528?w=800&h=600&fit=crop&q=80",  # Wellness
+        "https://images.unsplash.com/photo-1559056199-641a0ac8b55e?w=800&h=600&fit=crop&q=80",  # Health
+    ],
+}
+
+# Default to a professional product display
+DEFAULT_FALLBACK_IMAGE = "https://images.unsplash.com/photo-1560472354-b33ff0c44a43?w=800&h=600&fit=crop&q=80"
+
+FALLBACK_IMAGE_INDEX = KeywordIndex(FALLBACK_IMAGE_KEYWORDS)
+
 def get_smart_fallback_image(prompt: str) -> str:
     """Get smart fallback images based on product type detection"""
-    prompt_lower = prompt.lower()
-    
-    # Technology products
-    if any(word in prompt_lower for word in ['laptop', 'computer', 'gaming', 'mouse', 'keyboard', 'phone', 'smartphone', 'tablet', 'headphones', 'tech', 'electronic', 'device', 'gadget']):
-        tech_images = [
-            "https://images.unsplash.com/photo-1593642632823-8f785ba67e45?w=800&h=600&fit=crop&q=80",  # Laptop
-            "https://images.unsplash.com/photo-1542751371-adc38448a05e?w=800&h=600&fit=crop&q=80",  # Gaming setup
-            "https://images.unsplash.com/photo-1583394838336-acd977736f90?w=800&h=600&fit=crop&q=80",  # Headphones
-            "https://images.unsplash.com/photo-1511707171634-5f897ff02aa9?w=800&h=600&fit=crop&q=80",  # Phone
-        ]
-        return tech_images[hash(prompt) % len(tech_images)]
-    
-    # Fashion and accessories
-    elif any(word in prompt_lower for word in ['fashion', 'clothing', 'accessory', 'bag', 'handbag', 'watch', 'jewelry', 'shoes', 'apparel']):
-        fashion_images = [
-            "https://images.unsplash.com/photo-1553062407-98eeb64c6a62?w=800&h=600&fit=crop&q=80",  # Handbag
-            "https://images.unsplash.com/photo-1594223274512-ad4803739b7c?w=800&h=600&fit=crop&q=80",  # Watch
-            "https://images.unsplash.com/photo-1549298916-b41d501d3772?w=800&h=600&fit=crop&q=80",  # Shoes
-            "https://images.unsplash.com/photo-1492707892479-7bc8d5a4ee93?w=800&h=600&fit=crop&q=80",  # Fashion
-        ]
-        return fashion_images[hash(prompt) % len(fashion_images)]
-    
-    # Food and beverage
-    elif any(word in prompt_lower for word in ['coffee', 'food', 'beverage', 'drink', 'kitchen', 'cooking', 'restaurant', 'culinary']):
-        food_images = [
-            "https://images.unsplash.com/photo-1447933601403-0c6688de566e?w=800&h=600&fit=crop&q=80",  # Coffee
-            "https://images.unsplash.com/photo-1556909114-f6e7ad7d3136?w=800&h=600&fit=crop&q=80",  # Kitchen
-            "https://images.unsplash.com/photo-1498837167922-ddd27525d352?w=800&h=600&fit=crop&q=80",  # Food
-            "https://images.unsplash.com/photo-1555126634-323283e090fa?w=800&h=600&fit=crop&q=80",  # Beverage
-        ]
-        return food_images[hash(prompt) % len(food_images)]
-    
-    # Health and wellness
-    elif any(word in prompt_lower for word in ['health', 'fitness', 'wellness', 'medical', 'yoga', 'exercise', 'supplement', 'beauty']):
-        health_images = [
-            "https://images.unsplash.com/photo-1571019613454-1cb2f99b2d8b?w=800&h=600&fit=crop&q=80",  # Yoga
-            "https://images.unsplash.com/photo-1544367567-0f2fcb009e0b?w=800&h=600&fit=crop&q=80",  # Fitness
-            "https://images.unsplash.com/photo-1505751172876-fa1923c5c528?w=800&h=600&fit=crop&q=80",  # Wellness
-            "https://images.unsplash.com/photo-1559056199-641a0ac8b55e?w=800&h=600&fit=crop&q=80",  # Health
-        ]
-        return health_images[hash(prompt) % len(health_images)]
+    category, confidence = FALLBACK_IMAGE_INDEX.classify(prompt, default="")
+    if not confidence:
+        return DEFAULT_FALLBACK_IMAGE
+    images = FALLBACK_IMAGES[category]
+    return images[stable_hash(prompt) % len(images)]
+
+class ImageAssets:
+    """Local, responsive copies of the images a page links to
+    
+    Each source image (URL or data URI) is fetched once, resized to every configured width up
+    to its own and encoded in every configured format under <hash of the source>-<width>.<ext>,
+    so files never change under a name and are shared by every page that uses the image.
+    localize() points a page's <img> tags (as <picture> with srcset) and hero background
+    (as image-set) at those files; images that can't be fetched or decoded keep their URL.
+    """
+    
+    IMG_PATTERN = re.compile(r'<img src="([^"]+)"([^>]*)>')
+    HERO_PATTERN = re.compile(r"(background(?:-image)?:\s*)([^;{}]*?)url\('([^']+)'\)")
+    MIME_TYPES = {"avif": "image/avif", "webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+    # Catalog cards fill a one-column grid on phones and a ~3-4 column grid elsewhere
+    CARD_SIZES = "(max-width: 768px) 100vw, 400px"
+    
+    def __init__(self, asset_dir: str = IMAGE_ASSET_DIR, base_url: str = IMAGE_ASSET_BASE_URL,
+                 widths: Tuple[int, ...] = IMAGE_ASSET_WIDTHS, formats: Tuple[str, ...] = IMAGE_ASSET_FORMATS,
+                 quality: int = IMAGE_ASSET_QUALITY):
+        self.asset_dir = asset_dir
+        self.base_url = base_url
+        self.widths = tuple(sorted(set(widths)))
+        self.requested_formats = formats
+        self.quality = quality
+        self.fetched = 0
+        self.failed = 0
+        self._formats = None
+        self._index = None
+        self._requests = InFlightRequests()
+        self._lock = threading.Lock()
+    
+    def _available_formats(self) -> Tuple[str, ...]:
+        """Requested formats this Pillow can write; empty when Pillow isn't installed"""
+        with self._lock:
+            if self._formats is None:
+                try:
+                    from PIL import features
+                except ImportError:
+                    print("⚠️ IMAGE_ASSETS needs Pillow (pip install Pillow) - keeping remote image URLs")
+                    self._formats = ()
+                    return self._formats
+                always = ("jpeg", "png")
+                self._formats = tuple(fmt for fmt in self.requested_formats if fmt in always or features.check(fmt))
+                skipped = set(self.requested_formats) - set(self._formats)
+                if skipped:
+                    print(f"⚠️ Pillow can't write {', '.join(sorted(skipped))} - skipping those image variants")
+            return self._formats
+    
+    def _get_index(self) -> Optional[SQLiteCache]:
+        """Source URL -> variants written for it, so each image is fetched once across processes"""
+        with self._lock:
+            if self._index is None:
+                try:
+                    self._index = SQLiteCache(os.path.join(CACHE_DIR, "image_assets.sqlite3"), table="image_assets")
+                except sqlite3.Error as e:
+                    print(f"⚠️ Image asset index unavailable: {e}")
+                    self._index = False
+            return self._index or None
+    
+    def _filename(self, digest: str, width: int, fmt: str) -> str:
+        return f"{digest}-{width}.{'jpg' if fmt == 'jpeg' else fmt}"
+    
+    def variants(self, url: str) -> Optional[Dict[str, Any]]:
+        """{"digest", "sizes": [[width, height], ...]} of the files written for url, or None on failure"""
+        formats = self._available_formats()
+        if not formats:
+            return None
+        settings = f"{self.asset_dir}|{self.widths}|{formats}|{self.quality}"
+        key = hashlib.sha256(f"{settings}|{url}".encode("utf-8")).hexdigest()
+        index = self._get_index()
+        record = index.get(key) if index is not None else None
+        # Asset directories get cleaned out; only trust the index while its files are still there
+        if record and os.path.exists(os.path.join(self.asset_dir, self._filename(
+                record["digest"], record["sizes"][-1][0], formats[-1]))):
+            return record
+        record = self._requests.run(key, lambda: self._write_variants(url, formats))
+        if record is not None and index is not None:
+            index.set(key, record)
+        return record
+    
+    def _fetch(self, url: str) -> bytes:
+        if url.startswith("data:"):
+            import base64
+            return base64.b64decode(url.split(",", 1)[1])
+        if url.startswith(IMAGE_STORE_BASE_URL):
+            with open(os.path.join(IMAGE_STORE_DIR, url[len(IMAGE_STORE_BASE_URL):]), 'rb') as f:
+                return f.read()
+        response = get_http_session().get(url, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+        response.raise_for_status()
+        return response.content
+    
+    def _write_variants(self, url: str, formats: Tuple[str, ...]) -> Optional[Dict[str, Any]]:
+        from io import BytesIO
+        from PIL import Image, ImageOps
+        
+        try:
+            data = self._fetch(url)
+            digest = hashlib.sha256(data + f"|{self.quality}".encode("ascii")).hexdigest()[:16]
+            os.makedirs(self.asset_dir, exist_ok=True)
+            with Image.open(BytesIO(data)) as source:
+                image = ImageOps.exif_transpose(source)
+                transparent = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+                image = image.convert("RGBA" if transparent else "RGB")
+            
+            # Never upscale: widths past the source collapse into one full-size variant
+            widths = sorted({min(width, image.width) for width in self.widths})
+            sizes = []
+            for width in widths:
+                height = max(1, round(image.height * width / image.width))
+                resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+                for fmt in formats:
+                    path = os.path.join(self.asset_dir, self._filename(digest, width, fmt))
+                    if os.path.exists(path):
+                        continue
+                    encoded = resized.convert("RGB") if fmt == "jpeg" else resized
+                    buffer = BytesIO()
+                    encoded.save(buffer, fmt.upper(), quality=self.quality)
+                    _write_bytes_atomic(path, buffer.getvalue())
+                sizes.append([width, height])
+        except Exception as e:
+            print(f"⚠️ Could not localize image {url[:80]}: {e}")
+            with self._lock:
+                self.failed += 1
+            return None
+        with self._lock:
+            self.fetched += 1
+        return {"digest": digest, "sizes": sizes}
+    
+    def _srcset(self, record: Dict[str, Any], fmt: str) -> str:
+        return ", ".join(f"{self.base_url}{self._filename(record['digest'], width, fmt)} {width}w"
+                         for width, _ in record["sizes"])
+    
+    def _picture(self, record: Dict[str, Any], attributes: str) -> str:
+        formats = self._available_formats()
+        sources = "".join(f'<source type="{self.MIME_TYPES[fmt]}" srcset="{self._srcset(record, fmt)}" '
+                          f'sizes="{self.CARD_SIZES}">' for fmt in formats[:-1])
+        # The img itself falls back to the middle width of the last (most widely supported) format
+        width, height = record["sizes"][len(record["sizes"]) // 2]
+        src = self.base_url + self._filename(record["digest"], width, formats[-1])
+        return (f'<picture>{sources}<img src="{src}" srcset="{self._srcset(record, formats[-1])}" '
+                f'sizes="{self.CARD_SIZES}" width="{width}" height="{height}"{attributes}></picture>')
+    
+    def _hero(self, record: Dict[str, Any], prop: str, layers: str) -> str:
+        formats = self._available_formats()
+        width = record["sizes"][-1][0]
+        fallback = f"{prop}{layers}url('{self.base_url}{self._filename(record['digest'], width, formats[-1])}')"
+        if len(formats) == 1:
+            return fallback
+        candidates = ",".join(f"url('{self.base_url}{self._filename(record['digest'], width, fmt)}') "
+                              f"type('{self.MIME_TYPES[fmt]}')" for fmt in formats)
+        # Browsers without image-set() drop the second declaration and keep the fallback
+        return f"{fallback};{prop}{layers}image-set({candidates})"
+    
+    def localize(self, html: str) -> str:
+        """Rewrite a page's <img> tags and hero background to local responsive variants"""
+        from concurrent.futures import ThreadPoolExecutor
+        
+        img_urls = [match.group(1) for match in self.IMG_PATTERN.finditer(html)]
+        hero_urls = [match.group(3) for match in self.HERO_PATTERN.finditer(html)]
+        urls = list(dict.fromkeys(img_urls + hero_urls))
+        if not urls or not self._available_formats():
+            return html
+        
+        with stage_span("assets", images=len(urls)) as span:
+            with ThreadPoolExecutor(max_workers=max(1, min(IMAGE_CONCURRENCY, len(urls))),
+                                    thread_name_prefix="asset") as executor:
+                records = dict(zip(urls, executor.map(self.variants, urls)))
+            span.set(localized=sum(1 for record in records.values() if record))
+            
+            def img(match):
+                record = records.get(match.group(1))
+                return self._picture(record, match.group(2)) if record else match.group(0)
+            
+            def hero(match):
+                record = records.get(match.group(3))
+                return self._hero(record, match.group(1), match.group(2)) if record else match.group(0)
+            
+            return self.HERO_PATTERN.sub(hero, self.IMG_PATTERN.sub(img, html))
     
-    # Default to a professional product display
-    return "https://images.unsplash.com/photo-1560472354-b33ff0c44a43?w=800&h=600&fit=crop&q=80"
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"fetched": self.fetched, "failed": self.failed, "formats": list(self._formats or ())}
+
+_image_assets = None
+_image_assets_lock = threading.Lock()
+
+def get_image_assets() -> Optional[ImageAssets]:
+    """Return the process-wide image asset pipeline, or None when IMAGE_ASSETS is off"""
+    global _image_assets
+    if not IMAGE_ASSETS_ENABLED:
+        return None
+    with _image_assets_lock:
+        if _image_assets is None:
+            _image_assets = ImageAssets()
+    return _image_assets
 
 def get_pexels_image(search_term, size="large2x"):
     """REMOVED: Pexels support removed as requested - using DALL-E only"""
@@ -156,578 +1569,111 @@ def get_pexels_image(search_term, size="large2x"):
     # to trigger DALL-E generation
     return None
 
-class EnhancedGPTSiteGenerator:
-    def __init__(self):
-        """Initialize Enhanced GPT Site Generator"""
-        self.api_key = os.getenv('OPENAI_API_KEY', '')
-        if not self.api_key:
-            print("⚠️ No OpenAI API key found. Using enhanced fallback mode.")
-        else:
-            # Initialize OpenAI client
-            import openai
-            self.client = openai.OpenAI(api_key=self.api_key)
-            print("✅ OpenAI client initialized successfully")
-        
-        # Use temporary directory for non-persistent storage
-        self.temp_dir = tempfile.mkdtemp(prefix="temp_sites_")
-        
-        # Enhanced theme system
-        self.themes = {
-            "modern_minimal": {
-                "name": "Modern Minimal",
-                "primary": "#1a1a1a",
-                "secondary": "#f8f9fa", 
-                "accent": "#007bff",
-                "gradient": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)",
-                "font_family": "'Inter', 'Segoe UI', sans-serif",
-                "border_radius": "12px",
-                "shadow": "0 8px 32px rgba(0,0,0,0.1)"
-            },
-            "vibrant_modern": {
-                "name": "Vibrant Modern",
-                "primary": "#6c5ce7",
-                "secondary": "#a29bfe",
-                "accent": "#fd79a8", 
-                "gradient": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)",
-                "font_family": "'Poppins', sans-serif",
-                "border_radius": "20px",
-                "shadow": "0 15px 35px rgba(108, 92, 231, 0.2)"
-            },
-            "luxury_elegant": {
-                "name": "Luxury Elegant",
-                "primary": "#2d3436",
-                "secondary": "#ddd6fe",
-                "accent": "#d4af37",
-                "gradient": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)",
-                "font_family": "'Playfair Display', serif",
-                "border_radius": "8px",
-                "shadow": "0 10px 40px rgba(212, 175, 55, 0.2)"
-            },
-            "tech_futuristic": {
-                "name": "Tech Futuristic", 
-                "primary": "#0984e3",
-                "secondary": "#74b9ff",
-                "accent": "#00cec9",
-                "gradient": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)",
-                "font_family": "'Roboto', sans-serif",
-                "border_radius": "4px",
-                "shadow": "0 8px 25px rgba(9, 132, 227, 0.3)"
-            },
-            "organic_natural": {
-                "name": "Organic Natural",
-                "primary": "#27ae60",
-                "secondary": "#55a3ff",
-                "accent": "#f39c12",
-                "gradient": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)",
-                "font_family": "'Nunito', sans-serif",
-                "border_radius": "25px",
-                "shadow": "0 12px 28px rgba(39, 174, 96, 0.2)"
-            },
-            "dark_premium": {
-                "name": "Dark Premium",
-                "primary": "#2c3e50",
-                "secondary": "#34495e",
-                "accent": "#e74c3c",
-                "gradient": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)",
-                "font_family": "'Montserrat', sans-serif",
-                "border_radius": "10px",
-                "shadow": "0 20px 40px rgba(0,0,0,0.3)"
-            }
-        }
+class PageTemplate:
+    """Template compiled once into static text segments and named ${slot} placeholders"""
     
-    def categorize_product(self, product_name: str) -> str:
-        """Enhanced product categorization with GPT"""
-        if not self.api_key:
-            return self._fallback_categorization(product_name)
-        
-        try:
-            prompt = f"""
-            Analyze this product and categorize it into ONE of these specific categories:
-            - technology (gadgets, electronics, software, AI, smart devices)
-            - fashion (clothing, accessories, jewelry, bags, shoes)
-            - food_beverage (food, drinks, restaurants, culinary)
-            - health_wellness (fitness, medical, beauty, supplements)
-            - home_lifestyle (furniture, decor, appliances, tools)
-            - automotive (cars, bikes, vehicle accessories)
-            - sports_recreation (sports equipment, outdoor gear, games)
-            - business_professional (B2B services, office supplies, consulting)
-            
-            Product: "{product_name}"
-            
-            Return ONLY the category name (one word with underscore).
-            """
-            
-            response = self._call_openai_api(prompt, max_tokens=20)
-            if response:
-                category = response.strip().lower()
-                valid_categories = [
-                    "technology", "fashion", "food_beverage", "health_wellness",
-                    "home_lifestyle", "automotive", "sports_recreation", "business_professional"
-                ]
-                return category if category in valid_categories else "technology"
-            
-        except Exception as e:
-            print(f"GPT categorization failed: {e}")
-        
-        return self._fallback_categorization(product_name)
+    _SLOT_PATTERN = re.compile(r'\$\{(\w+)\}')
     
-    def _fallback_categorization(self, product_name: str) -> str:
-        """Enhanced fallback categorization with better keyword matching"""
-        product_lower = product_name.lower()
-        
-        # Food & Beverage keywords (check this first for better accuracy)
-        if any(word in product_lower for word in [
-            'food', 'coffee', 'restaurant', 'bakery', 'pizza', 'organic', 
-            'drink', 'beverage', 'recipe', 'meal', 'gourmet', 'artisan',
-            'apple', 'fruit', 'vegetable', 'fresh', 'farm', 'beans', 'roast',
-            'brew', 'tea', 'wine', 'beer', 'dairy', 'meat', 'seafood', 'spice',
-            'sauce', 'soup', 'bread', 'dessert', 'cake', 'cookie', 'chocolate'
-        ]):
-            return "food_beverage"
-            
-        # Technology keywords
-        elif any(word in product_lower for word in [
-            'smart', 'ai', 'tech', 'digital', 'app', 'software', 'device', 
-            'phone', 'laptop', 'computer', 'drone', 'robot', 'electronic',
-            'gadget', 'virtual', 'augmented', 'machine', 'algorithm', 'data'
-        ]):
-            return "technology"
-        
-        # Fashion keywords  
-        elif any(word in product_lower for word in [
-            'fashion', 'clothing', 'dress', 'shirt', 'shoes', 'bag', 'handbag',
-            'jewelry', 'watch', 'style', 'designer', 'luxury', 'saree',
-            'pants', 'jacket', 'coat', 'suit', 'tie', 'belt', 'hat', 'scarf'
-        ]):
-            return "fashion"
-        
-        # Health & Wellness keywords
-        elif any(word in product_lower for word in [
-            'health', 'fitness', 'wellness', 'yoga', 'gym', 'medical', 
-            'beauty', 'cosmetic', 'care', 'supplement', 'vitamin', 'protein',
-            'therapy', 'treatment', 'skincare', 'massage', 'meditation'
-        ]):
-            return "health_wellness"
-        
-        # Automotive keywords
-        elif any(word in product_lower for word in [
-            'car', 'vehicle', 'automotive', 'bike', 'motorcycle', 'truck',
-            'engine', 'wheel', 'tire', 'brake', 'motor', 'racing'
-        ]):
-            return "automotive"
-        
-        # Sports & Recreation keywords
-        elif any(word in product_lower for word in [
-            'sport', 'game', 'tennis', 'football', 'outdoor', 'recreation',
-            'equipment', 'gear', 'basketball', 'soccer', 'golf', 'swimming'
-        ]):
-            return "sports_recreation"
-        
-        # Home & Lifestyle keywords (removed kitchen to avoid conflict)
-        elif any(word in product_lower for word in [
-            'home', 'furniture', 'decor', 'appliance', 'tool', 'garden',
-            'bedroom', 'living', 'chair', 'table', 'lamp', 'cleaning'
-        ]):
-            return "home_lifestyle"
-        
-        # Business & Professional keywords
-        elif any(word in product_lower for word in [
-            'business', 'professional', 'office', 'consulting', 'service',
-            'marketing', 'finance', 'legal', 'enterprise', 'corporate'
-        ]):
-            return "business_professional"
-        
-        else:
-            return "food_beverage"  # Changed default to food_beverage for better variety
-
-    def generate_enhanced_content(self, product_name: str, category: str) -> Dict[str, Any]:
-        """Generate completely dynamic content using OpenAI - no restrictions or predefined templates"""
-        
-        print(f"🤖 Generating completely dynamic content for: {product_name}")
-        
-        # Try OpenAI first - this should be the primary method
-        openai_content = self._generate_openai_content(product_name)
-        if openai_content:
-            return openai_content
-        
-        # Only use minimal fallback if OpenAI completely fails
-        print("🔄 OpenAI unavailable, generating minimal dynamic fallback")
-        return self._generate_minimal_dynamic_content(product_name)
-
-    def _generate_openai_content(self, product_name: str) -> Optional[Dict[str, Any]]:
-        """Generate content using OpenAI with no restrictions"""
-        if not self.api_key:
-            print("⚠️ No OpenAI API key - skipping AI generation")
-            return None
-        
-        try:
-            print(f"🤖 Calling OpenAI API for: {product_name}")
-            
-            # Ultra-dynamic prompt that handles ANY product
-            prompt = f"""
-            You are an expert e-commerce website creator. A user wants to create a website for "{product_name}".
-
-            No matter what "{product_name}" is - whether it's a physical product, service, digital product, food item, technology, clothing, book, course, app, or anything else - create a professional e-commerce website.
-
-            IMPORTANT: 
-            - Do NOT make assumptions about what "{product_name}" is
-            - Research and understand the product based on its name
-            - Create authentic, realistic content that makes sense for this specific product
-            - Generate appropriate related products that would genuinely complement "{product_name}"
-            - Use realistic pricing that makes sense for this type of product
-            - Make it feel like a real business selling a real product
-
-            Create a complete website structure with:
-
-            Return ONLY valid JSON (no markdown, no explanation) with this exact structure:
-            {{
-                "hero": {{
-                    "headline": "Compelling headline for {product_name}",
-                    "subheadline": "Engaging tagline that captures what this product does", 
-                    "description": "2-3 sentences explaining what {product_name} is and its main benefit",
-                    "cta_button": "Action-oriented button text"
-                }},
-                "features": {{
-                    "title": "Why Choose {product_name}",
-                    "items": [
-                        {{"icon": "🎯", "title": "Key benefit 1", "description": "Specific advantage of {product_name}"}},
-                        {{"icon": "⚡", "title": "Key benefit 2", "description": "Another important feature"}},
-                        {{"icon": "💎", "title": "Key benefit 3", "description": "What makes this special"}},
-                        {{"icon": "🚀", "title": "Key benefit 4", "description": "Additional value proposition"}},
-                        {{"icon": "⭐", "title": "Key benefit 5", "description": "Quality or service benefit"}},
-                        {{"icon": "🔥", "title": "Key benefit 6", "description": "Unique selling point"}}
-                    ]
-                }},
-                "how_it_works": {{
-                    "title": "How It Works",
-                    "steps": [
-                        {{"step": 1, "title": "Step 1", "description": "First thing customer does with {product_name}"}},
-                        {{"step": 2, "title": "Step 2", "description": "Next step in the process"}},
-                        {{"step": 3, "title": "Step 3", "description": "Final outcome or result"}}
-                    ]
-                }},
-                "testimonials": {{
-                    "title": "Customer Reviews",
-                    "reviews": [
-                        {{"name": "Customer name", "role": "Their role/title", "text": "Specific testimonial about {product_name}", "rating": 5}},
-                        {{"name": "Another customer", "role": "Their background", "text": "Different perspective on {product_name}", "rating": 5}}
-                    ]
-                }},
-                "catalog": {{
-                    "title": "You Might Also Like",
-                    "description": "Products that complement {product_name}",
-                    "products": [
-                        {{"name": "Related product 1", "price": "$XX", "image_prompt": "professional product photo of [describe related product] on white background"}},
-                        {{"name": "Related product 2", "price": "$XX", "image_prompt": "professional product photo of [describe related product] on white background"}},
-                        {{"name": "Related product 3", "price": "$XX", "image_prompt": "professional product photo of [describe related product] on white background"}},
-                        {{"name": "Related product 4", "price": "$XX", "image_prompt": "professional product photo of [describe related product] on white background"}}
-                    ]
-                }},
-                "pricing": {{
-                    "title": "Get {product_name} Today",
-                    "price": "$XX",
-                    "original_price": "$XX",
-                    "features": ["What customer gets 1", "What customer gets 2", "What customer gets 3", "Bonus or guarantee"],
-                    "cta": "Buy Now",
-                    "guarantee": "Money-back guarantee or return policy"
-                }},
-                "tagline": "Memorable slogan for {product_name}",
-                "meta_description": "SEO-friendly description of {product_name} and its benefits"
-            }}
-
-            Make this authentic and realistic. Think about what "{product_name}" actually is and create content that would genuinely help someone understand and want to buy it.
-            """
-            
-            response = self._call_openai_api(prompt, max_tokens=3500)
-            
-            if response:
-                try:
-                    # Clean and parse the response
-                    content = self._parse_openai_response(response, product_name)
-                    if content:
-                        print(f"✅ Generated dynamic OpenAI content for {product_name}")
-                        return content
-                except Exception as e:
-                    print(f"❌ Failed to parse OpenAI response: {e}")
-            
-        except Exception as e:
-            print(f"❌ OpenAI generation failed: {e}")
-        
-        return None
-
-    def _parse_openai_response(self, response: str, product_name: str) -> Optional[Dict[str, Any]]:
-        """Parse OpenAI response and extract JSON content"""
-        try:
-            # Clean the response
-            content_text = response.strip()
-            
-            # Remove markdown formatting if present
-            if "```json" in content_text:
-                start = content_text.find("```json") + 7
-                end = content_text.find("```", start)
-                content_text = content_text[start:end].strip()
-            elif "```" in content_text:
-                start = content_text.find("```") + 3
-                end = content_text.rfind("```")
-                content_text = content_text[start:end].strip()
-            
-            # Try to parse JSON
-            content = json.loads(content_text)
-            
-            # Validate that we have the required structure
-            required_keys = ['hero', 'features', 'how_it_works', 'testimonials', 'catalog', 'pricing']
-            if all(key in content for key in required_keys):
-                return content
+    def __init__(self, source: str):
+        parts = self._SLOT_PATTERN.split(source)
+        # split() alternates static text and slot names, always starting and ending with static text
+        self._compile(parts[0::2], parts[1::2])
+    
+    def _compile(self, static: List[str], slots: List[str]) -> None:
+        """Pair each slot with the static text before it; the trailing text has no slot"""
+        self.static = static
+        self.slots = slots
+        self._parts = tuple(zip(static, slots))
+        self._tail = static[-1]
+    
+    def render_into(self, out: List[str], values: Dict[str, Any]) -> None:
+        """Append the rendered pieces to out, so a whole page is joined exactly once"""
+        append = out.append
+        for text, slot in self._parts:
+            append(text)
+            append(str(values[slot]))
+        append(self._tail)
+    
+    def render(self, values: Dict[str, Any]) -> str:
+        out = []
+        self.render_into(out, values)
+        return ''.join(out)
+    
+    def bind(self, values: Dict[str, Any]) -> "PageTemplate":
+        """Return a new template with the given slots filled in and merged into the static text"""
+        static = [self.static[0]]
+        slots = []
+        for i, slot in enumerate(self.slots, 1):
+            if slot in values:
+                static[-1] += str(values[slot]) + self.static[i]
             else:
-                print(f"❌ Missing required keys in OpenAI response")
-                return None
-                
-        except json.JSONDecodeError as e:
-            print(f"❌ JSON parsing failed: {e}")
-            # Try to fix common JSON issues
-            try:
-                import re
-                # Try to extract JSON object
-                json_match = re.search(r'\{.*\}', response, re.DOTALL)
-                if json_match:
-                    content = json.loads(json_match.group())
-                    return content
-            except:
-                pass
-        
-        return None
-
-    def _generate_minimal_dynamic_content(self, product_name: str) -> Dict[str, Any]:
-        """Generate minimal dynamic content when OpenAI is unavailable"""
-        import random
-        
-        print(f"🎨 Creating minimal dynamic content for: {product_name}")
-        
-        # Extract meaningful words from product name
-        words = product_name.lower().split()
-        main_word = words[0] if words else "product"
-        
-        # Generate realistic pricing
-        base_price = random.randint(29, 899)
-        original_price = base_price + random.randint(20, 200)
-        
-        # Generate dynamic content that adapts to any product
-        content = {
-            "hero": {
-                "headline": f"Premium {product_name}",
-                "subheadline": f"Experience the difference quality makes",
-                "description": f"Discover why {product_name} is the smart choice for those who demand excellence. Quality, value, and satisfaction guaranteed.",
-                "cta_button": f"Get {product_name}"
-            },
-            "features": {
-                "title": f"Why Choose {product_name}",
-                "items": [
-                    {"icon": "⭐", "title": "Premium Quality", "description": f"Our {product_name} meets the highest standards of excellence"},
-                    {"icon": "🚀", "title": "Fast Results", "description": f"Experience the benefits of {product_name} right away"},
-                    {"icon": "💎", "title": "Great Value", "description": f"Get more for your money with our {product_name}"},
-                    {"icon": "🛡️", "title": "Reliable Choice", "description": f"Trust in the proven performance of {product_name}"},
-                    {"icon": "⚡", "title": "Easy to Use", "description": f"Simple and straightforward - {product_name} just works"},
-                    {"icon": "🎯", "title": "Perfect Fit", "description": f"Designed to meet your specific {main_word} needs"}
-                ]
-            },
-            "how_it_works": {
-                "title": f"Getting Started with {product_name}",
-                "steps": [
-                    {"step": 1, "title": "Order", "description": f"Choose your {product_name} and place your order"},
-                    {"step": 2, "title": "Receive", "description": f"Get your {product_name} delivered quickly and safely"},
-                    {"step": 3, "title": "Enjoy", "description": f"Start enjoying all the benefits of {product_name}"}
-                ]
-            },
-            "testimonials": {
-                "title": "Customer Reviews",
-                "reviews": [
-                    {"name": "Alex Johnson", "role": "Satisfied Customer", "text": f"This {product_name} exceeded my expectations. Highly recommended!", "rating": 5},
-                    {"name": "Sarah Chen", "role": "Verified Buyer", "text": f"Amazing quality and great value. My {product_name} is perfect!", "rating": 5}
-                ]
-            },
-            "catalog": {
-                "title": "Complete Your Purchase",
-                "description": f"Perfect additions to your {product_name}",
-                "products": self._generate_dynamic_related_products(product_name, main_word)
-            },
-            "pricing": {
-                "title": f"Get Your {product_name} Today",
-                "price": f"${base_price}",
-                "original_price": f"${original_price}",
-                "features": [
-                    f"Complete {product_name}",
-                    "Free shipping included",
-                    "Customer support",
-                    "Satisfaction guarantee"
-                ],
-                "cta": f"Order {product_name}",
-                "guarantee": "30-day satisfaction guarantee"
-            },
-            "tagline": f"The smart choice for {main_word}",
-            "meta_description": f"Get the best {product_name} with premium quality, great value, and guaranteed satisfaction."
-        }
-        
-        return content
+                slots.append(slot)
+                static.append(self.static[i])
+        bound = PageTemplate.__new__(PageTemplate)
+        bound._compile(static, slots)
+        return bound
 
-    def _generate_dynamic_related_products(self, product_name: str, main_word: str) -> List[Dict]:
-        """Generate related products dynamically based on the main product"""
-        import random
-        
-        # Generate generic but relevant accessories
-        accessories = [
-            f"{main_word.title()} Accessories",
-            f"Premium {main_word.title()} Kit",
-            f"{main_word.title()} Care Package",
-            f"Enhanced {main_word.title()} Bundle"
-        ]
-        
-        related_products = []
-        for i, accessory in enumerate(accessories):
-            price = random.randint(15, 199)
-            related_products.append({
-                "name": accessory,
-                "price": f"${price}",
-                "image_prompt": f"professional product photo of {accessory.lower()} on white background"
-            })
-        
-        return related_products
+# Google Fonts used by the themes, with the weights each one loads
+GOOGLE_FONT_WEIGHTS = {
+    "Inter": "300;400;500;600;700",
+    "Poppins": "300;400;500;600;700",
+    "Playfair Display": "400;500;600;700",
+    "Roboto": "300;400;500;700",
+    "Nunito": "300;400;500;600;700",
+    "Montserrat": "300;400;500;600;700"
+}
 
-    def _call_openai_api(self, prompt: str, max_tokens: int = 2000) -> Optional[str]:
-        """Make OpenAI API call with improved error handling"""
-        if not self.api_key:
-            print("⚠️ No OpenAI API key available")
-            return None
-        
-        if not hasattr(self, 'client'):
-            print("⚠️ OpenAI client not initialized")
-            return None
-        
-        try:
-            print("🔄 Calling OpenAI API...")
-            
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are an expert e-commerce copywriter and web designer. Create authentic, realistic content for any product the user describes."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=max_tokens,
-                temperature=0.8
-            )
-            
-            if response.choices and len(response.choices) > 0:
-                content = response.choices[0].message.content
-                if content:
-                    print("✅ OpenAI API call successful")
-                    return content.strip()
-            
-            print("❌ Empty response from OpenAI API")
-            return None
-            
-        except Exception as e:
-            error_str = str(e)
-            print(f"❌ OpenAI API error: {error_str}")
-            
-            if "quota" in error_str.lower() or "429" in error_str:
-                print("💡 API quota exceeded - using dynamic fallback")
-            elif "ssl" in error_str.lower() or "certificate" in error_str.lower():
-                print("🔒 SSL certificate issue - using dynamic fallback")
-            elif "connection" in error_str.lower():
-                print("🌐 Connection issue - using dynamic fallback")
-            else:
-                print("⚠️ Unexpected API error - using dynamic fallback")
-            
-            return None
+def google_fonts_url(families: List[str]) -> str:
+    """Google Fonts stylesheet URL loading the given families"""
+    query = "&".join(f"family={family.replace(' ', '+')}:wght@{GOOGLE_FONT_WEIGHTS[family]}" for family in families)
+    return f"https://fonts.googleapis.com/css2?{query}&display=swap"
 
-    def generate_website(self, product_name: str) -> str:
-        """Generate complete enhanced website"""
-        print(f"🔍 Analyzing product: {product_name}")
-        
-        # Step 1: Categorize product
-        category = self.categorize_product(product_name)
-        print(f"📂 Category detected: {category}")
-        
-        # Step 2: Select random theme for variety
-        theme_key = random.choice(list(self.themes.keys()))
-        theme = self.themes[theme_key]
-        print(f"🎨 Theme selected: {theme['name']}")
-        
-        # Step 3: Generate enhanced content
-        print(f"📝 Generating enhanced content...")
-        content = self.generate_enhanced_content(product_name, category)
-        
-        # Step 4: Generate HTML with selected theme
-        print(f"🌐 Building themed website...")
-        html = self.generate_themed_html(product_name, content, category, theme)
-        
-        # Step 5: Create temporary file (non-persistent)
-        import uuid
-        site_id = str(uuid.uuid4())[:8]
-        site_file = os.path.join(self.temp_dir, f"{site_id}.html")
-        
-        with open(site_file, 'w', encoding='utf-8') as f:
-            f.write(html)
-        
-        print(f"✅ Enhanced themed website generated successfully!")
-        return site_file
+def theme_font_family(theme: Dict[str, Any]) -> Optional[str]:
+    """The Google Font a theme's font stack starts with, if it is one we load"""
+    family = theme['font_family'].split(',')[0].strip().strip("'\"")
+    return family if family in GOOGLE_FONT_WEIGHTS else None
 
-    def generate_themed_html(self, product_name: str, content: Dict, category: str, theme: Dict) -> str:
-        """Generate HTML with dynamic themes and enhanced ecommerce features"""
-        
-        # Get high-quality hero background using DALL-E
-        hero_bg = generate_product_image(f"{product_name} hero background")
-        
-        # Generate product catalog images
-        catalog_html = ""
-        if 'catalog' in content:
-            for product in content['catalog']['products']:
-                img_url = generate_product_image(product['image_prompt'])
-                catalog_html += f'''
-                <div class="product-card">
-                    <img src="{img_url}" alt="{product['name']}" loading="lazy">
-                    <h3>{product['name']}</h3>
-                    <div class="price">{product['price']}</div>
-                    <button class="product-cta">Add to Cart</button>
-                </div>'''
-        
-        # Enhanced HTML with modern design and ecommerce features
-        html = f'''<!DOCTYPE html>
+# Document start up to the meta description
+PAGE_DOCUMENT_START = '''<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{product_name} - {content['tagline']}</title>
-    <meta name="description" content="{content['meta_description']}">
-    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&family=Poppins:wght@300;400;500;600;700&family=Playfair+Display:wght@400;500;600;700&family=Roboto:wght@300;400;500;700&family=Nunito:wght@300;400;500;600;700&family=Montserrat:wght@300;400;500;600;700&display=swap" rel="stylesheet">
-    <style>
-        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-        
-        :root {{
-            --primary-color: {theme['primary']};
-            --secondary-color: {theme['secondary']};
-            --accent-color: {theme['accent']};
+    <title>${product_name} - ${tagline}</title>
+    <meta name="description" content="${meta_description}">
+'''
+
+HERO_BACKGROUND_DECLARATION = "background: linear-gradient(135deg, rgba(0,0,0,0.7), rgba(0,0,0,0.4)), url('${hero_bg}');"
+
+# Theme CSS; ${hero_background} is the only per-page declaration
+THEME_CSS = '''        * { margin: 0; padding: 0; box-sizing: border-box; }
+        
+        :root {
+            --primary-color: ${primary};
+            --secondary-color: ${secondary};
+            --accent-color: ${accent};
             --text-color: #2c3e50;
-            --gradient: {theme['gradient']};
-            --font-family: {theme['font_family']};
-            --border-radius: {theme['border_radius']};
-            --shadow: {theme['shadow']};
-        }}
+            --gradient: ${gradient};
+            --font-family: ${font_family};
+            --border-radius: ${border_radius};
+            --shadow: ${shadow};
+        }
         
-        body {{ 
+        body { 
             font-family: var(--font-family); 
             line-height: 1.7; 
             color: var(--text-color);
             overflow-x: hidden;
-        }}
+        }
         
-        .container {{ 
+        .container { 
             max-width: 1200px; 
             margin: 0 auto; 
             padding: 0 20px; 
-        }}
+        }
         
         /* Header */
-        .header {{ 
+        .header { 
             background: var(--primary-color); 
             color: white; 
             padding: 1rem 0; 
@@ -737,15 +1683,15 @@ class EnhancedGPTSiteGenerator:
             z-index: 1000;
             backdrop-filter: blur(10px);
             box-shadow: var(--shadow);
-        }}
+        }
         
-        .nav {{ 
+        .nav { 
             display: flex; 
             justify-content: space-between; 
             align-items: center; 
-        }}
+        }
         
-        .logo {{ 
+        .logo { 
             font-size: 1.8rem; 
             font-weight: 700; 
             color: white; 
@@ -754,30 +1700,30 @@ class EnhancedGPTSiteGenerator:
             -webkit-background-clip: text;
             -webkit-text-fill-color: transparent;
             background-clip: text;
-        }}
+        }
         
-        .nav-links {{ 
+        .nav-links { 
             display: flex; 
             list-style: none; 
             gap: 2.5rem; 
-        }}
+        }
         
-        .nav-links a {{ 
+        .nav-links a { 
             color: white; 
             text-decoration: none;
             font-weight: 500;
             transition: all 0.3s ease;
             position: relative;
-        }}
+        }
         
-        .nav-links a:hover {{
+        .nav-links a:hover {
             color: var(--accent-color);
             transform: translateY(-2px);
-        }}
+        }
         
         /* Hero Section */
-        .hero {{
-            background: linear-gradient(135deg, rgba(0,0,0,0.7), rgba(0,0,0,0.4)), url('{hero_bg}');
+        .hero {
+            ${hero_background}
             background-size: cover; 
             background-position: center; 
             background-attachment: fixed;
@@ -787,9 +1733,9 @@ class EnhancedGPTSiteGenerator:
             color: white; 
             text-align: center;
             position: relative;
-        }}
+        }
         
-        .hero::before {{
+        .hero::before {
             content: '';
             position: absolute;
             top: 0;
@@ -798,22 +1744,22 @@ class EnhancedGPTSiteGenerator:
             bottom: 0;
             background: var(--gradient);
             opacity: 0.1;
-        }}
+        }
         
-        .hero-content {{
+        .hero-content {
             position: relative;
             z-index: 2;
-        }}
+        }
         
-        .hero h1 {{ 
+        .hero h1 { 
             font-size: 4rem; 
             margin-bottom: 1.5rem;
             font-weight: 700;
             text-shadow: 2px 2px 4px rgba(0,0,0,0.5);
             animation: fadeInUp 1s ease-out;
-        }}
+        }
         
-        .hero p {{ 
+        .hero p { 
             font-size: 1.4rem; 
             margin-bottom: 2.5rem; 
             max-width: 600px; 
@@ -821,9 +1767,9 @@ class EnhancedGPTSiteGenerator:
             margin-right: auto;
             opacity: 0.95;
             animation: fadeInUp 1s ease-out 0.3s both;
-        }}
+        }
         
-        .cta-button {{
+        .cta-button {
             background: var(--gradient);
             color: white; 
             padding: 18px 40px;
@@ -837,33 +1783,33 @@ class EnhancedGPTSiteGenerator:
             border: none;
             cursor: pointer;
             animation: fadeInUp 1s ease-out 0.6s both;
-        }}
+        }
         
-        .cta-button:hover {{ 
+        .cta-button:hover { 
             transform: translateY(-3px) scale(1.05);
             box-shadow: 0 15px 40px rgba(0,0,0,0.2);
-        }}
+        }
         
         /* Sections */
-        .section {{ 
+        .section { 
             padding: 100px 0; 
             position: relative;
-        }}
+        }
         
-        .section:nth-child(even) {{
+        .section:nth-child(even) {
             background: linear-gradient(135deg, var(--secondary-color), #ffffff);
-        }}
+        }
         
-        .section-title {{ 
+        .section-title { 
             text-align: center; 
             font-size: 3rem; 
             margin-bottom: 4rem; 
             color: var(--primary-color);
             font-weight: 600;
             position: relative;
-        }}
+        }
         
-        .section-title::after {{
+        .section-title::after {
             content: '';
             position: absolute;
             bottom: -10px;
@@ -873,16 +1819,16 @@ class EnhancedGPTSiteGenerator:
             height: 4px;
             background: var(--gradient);
             border-radius: 2px;
-        }}
+        }
         
         /* Features Grid */
-        .features-grid {{ 
+        .features-grid { 
             display: grid; 
             grid-template-columns: repeat(auto-fit, minmax(350px, 1fr)); 
             gap: 3rem; 
-        }}
+        }
         
-        .feature-card {{ 
+        .feature-card { 
             background: white; 
             padding: 3rem 2rem; 
             border-radius: var(--border-radius);
@@ -892,9 +1838,9 @@ class EnhancedGPTSiteGenerator:
             border: 1px solid rgba(0,0,0,0.05);
             position: relative;
             overflow: hidden;
-        }}
+        }
         
-        .feature-card::before {{
+        .feature-card::before {
             content: '';
             position: absolute;
             top: 0;
@@ -902,45 +1848,45 @@ class EnhancedGPTSiteGenerator:
             right: 0;
             height: 5px;
             background: var(--gradient);
-        }}
+        }
         
-        .feature-card:hover {{ 
+        .feature-card:hover { 
             transform: translateY(-10px) scale(1.02);
             box-shadow: 0 20px 60px rgba(0,0,0,0.15);
-        }}
+        }
         
-        .feature-icon {{ 
+        .feature-icon { 
             font-size: 4rem; 
             margin-bottom: 1.5rem;
             display: block;
-        }}
+        }
         
-        .feature-card h3 {{
+        .feature-card h3 {
             font-size: 1.5rem;
             margin-bottom: 1rem;
             color: var(--primary-color);
             font-weight: 600;
-        }}
+        }
         
-        .feature-card p {{
+        .feature-card p {
             color: #666;
             line-height: 1.6;
-        }}
+        }
         
         /* Steps */
-        .steps {{ 
+        .steps { 
             display: grid; 
             grid-template-columns: repeat(auto-fit, minmax(300px, 1fr)); 
             gap: 3rem; 
-        }}
+        }
         
-        .step {{ 
+        .step { 
             text-align: center; 
             padding: 2.5rem;
             position: relative;
-        }}
+        }
         
-        .step-number {{
+        .step-number {
             background: var(--gradient);
             color: white; 
             width: 80px; 
@@ -953,58 +1899,58 @@ class EnhancedGPTSiteGenerator:
             font-weight: 700; 
             margin: 0 auto 2rem;
             box-shadow: var(--shadow);
-        }}
+        }
         
-        .step h3 {{
+        .step h3 {
             font-size: 1.4rem;
             margin-bottom: 1rem;
             color: var(--primary-color);
             font-weight: 600;
-        }}
+        }
         
         /* Product Catalog */
-        .catalog-grid {{
+        .catalog-grid {
             display: grid;
             grid-template-columns: repeat(auto-fit, minmax(280px, 1fr));
             gap: 2.5rem;
             margin-top: 3rem;
-        }}
+        }
         
-        .product-card {{
+        .product-card {
             background: white;
             border-radius: var(--border-radius);
             overflow: hidden;
             box-shadow: var(--shadow);
             transition: all 0.4s ease;
             position: relative;
-        }}
+        }
         
-        .product-card:hover {{
+        .product-card:hover {
             transform: translateY(-8px);
             box-shadow: 0 20px 60px rgba(0,0,0,0.15);
-        }}
+        }
         
-        .product-card img {{
+        .product-card img {
             width: 100%;
             height: 250px;
             object-fit: cover;
-        }}
+        }
         
-        .product-card h3 {{
+        .product-card h3 {
             padding: 1.5rem 1.5rem 0.5rem;
             font-size: 1.3rem;
             color: var(--primary-color);
             font-weight: 600;
-        }}
+        }
         
-        .product-card .price {{
+        .product-card .price {
             padding: 0 1.5rem;
             font-size: 1.5rem;
             color: var(--accent-color);
             font-weight: 700;
-        }}
+        }
         
-        .product-cta {{
+        .product-cta {
             width: 100%;
             padding: 1rem;
             background: var(--gradient);
@@ -1013,33 +1959,33 @@ class EnhancedGPTSiteGenerator:
             font-weight: 600;
             cursor: pointer;
             transition: all 0.3s ease;
-        }}
+        }
         
-        .product-cta:hover {{
+        .product-cta:hover {
             background: var(--primary-color);
-        }}
+        }
         
         /* Testimonials */
-        .testimonials {{ 
+        .testimonials { 
             background: linear-gradient(135deg, var(--secondary-color), #f8f9fa);
-        }}
+        }
         
-        .testimonials-grid {{ 
+        .testimonials-grid { 
             display: grid; 
             grid-template-columns: repeat(auto-fit, minmax(400px, 1fr)); 
             gap: 3rem; 
-        }}
+        }
         
-        .testimonial {{ 
+        .testimonial { 
             background: white; 
             padding: 3rem; 
             border-radius: var(--border-radius);
             box-shadow: var(--shadow);
             position: relative;
             border-left: 5px solid var(--accent-color);
-        }}
+        }
         
-        .testimonial::before {{
+        .testimonial::before {
             content: '"';
             position: absolute;
             top: -10px;
@@ -1047,16 +1993,16 @@ class EnhancedGPTSiteGenerator:
             font-size: 4rem;
             color: var(--accent-color);
             font-family: serif;
-        }}
+        }
         
         /* Pricing */
-        .pricing {{ 
+        .pricing { 
             background: var(--gradient);
             color: white; 
             text-align: center; 
-        }}
+        }
         
-        .pricing-card {{
+        .pricing-card {
             background: rgba(255,255,255,0.1);
             backdrop-filter: blur(10px);
             border-radius: var(--border-radius);
@@ -1064,83 +2010,85 @@ class EnhancedGPTSiteGenerator:
             max-width: 500px;
             margin: 0 auto;
             border: 1px solid rgba(255,255,255,0.2);
-        }}
+        }
         
-        .price {{ 
+        .price { 
             font-size: 4rem; 
             font-weight: 700; 
             margin: 1.5rem 0;
             position: relative;
-        }}
+        }
         
-        .original-price {{
+        .original-price {
             font-size: 1.5rem;
             text-decoration: line-through;
             opacity: 0.7;
             margin-bottom: 0.5rem;
-        }}
+        }
         
-        .pricing-features {{ 
+        .pricing-features { 
             list-style: none; 
             margin: 3rem 0;
             text-align: left;
-        }}
+        }
         
-        .pricing-features li {{ 
+        .pricing-features li { 
             padding: 0.8rem 0;
             position: relative;
             padding-left: 2rem;
-        }}
+        }
         
-        .pricing-features li::before {{
+        .pricing-features li::before {
             content: '✓';
             position: absolute;
             left: 0;
             color: var(--accent-color);
             font-weight: bold;
-        }}
+        }
         
         /* Footer */
-        .footer {{ 
+        .footer { 
             background: var(--text-color);
             color: white; 
             text-align: center; 
             padding: 4rem 0;
-        }}
+        }
         
         /* Animations */
-        @keyframes fadeInUp {{
-            from {{
+        @keyframes fadeInUp {
+            from {
                 opacity: 0;
                 transform: translateY(30px);
-            }}
-            to {{
+            }
+            to {
                 opacity: 1;
                 transform: translateY(0);
-            }}
-        }}
+            }
+        }
         
         /* Responsive Design */
-        @media (max-width: 768px) {{
-            .hero h1 {{ font-size: 2.5rem; }}
-            .nav-links {{ display: none; }}
-            .section {{ padding: 60px 0; }}
-            .features-grid {{ grid-template-columns: 1fr; }}
-            .catalog-grid {{ grid-template-columns: 1fr; }}
-            .testimonials-grid {{ grid-template-columns: 1fr; }}
-        }}
+        @media (max-width: 768px) {
+            .hero h1 { font-size: 2.5rem; }
+            .nav-links { display: none; }
+            .section { padding: 60px 0; }
+            .features-grid { grid-template-columns: 1fr; }
+            .catalog-grid { grid-template-columns: 1fr; }
+            .testimonials-grid { grid-template-columns: 1fr; }
+        }
         
-        @media (max-width: 480px) {{
-            .hero h1 {{ font-size: 2rem; }}
-            .hero p {{ font-size: 1.1rem; }}
-            .section-title {{ font-size: 2rem; }}
-        }}
-    </style>
-</head>
+        @media (max-width: 480px) {
+            .hero h1 { font-size: 2rem; }
+            .hero p { font-size: 1.1rem; }
+            .section-title { font-size: 2rem; }
+        }
+'''
+
+# End of head, header and hero
+PAGE_BODY_START = '''</head>
 <body>
     <header class="header">
         <nav class="nav container">
-            <a href="#" class="logo">{product_name}</a>
+            <a href="#" class="logo">${product_name}</a>
             <ul class="nav-links">
                 <li><a href="#home">Home</a></li>
                 <li><a href="#features">Features</a></li>
@@ -1154,120 +2102,1403 @@ class EnhancedGPTSiteGenerator:
     <section id="home" class="hero">
         <div class="container">
             <div class="hero-content">
-                <h1>{content['hero']['headline']}</h1>
-                <p>{content['hero']['description']}</p>
-                <a href="#pricing" class="cta-button">{content['hero']['cta_button']}</a>
+                <h1>${headline}</h1>
+                <p>${hero_description}</p>
+                <a href="#pricing" class="cta-button">${cta_button}</a>
             </div>
         </div>
     </section>
+'''
 
+# Opening of the features section
+FEATURES_OPEN_TEMPLATE = PageTemplate('''
     <section id="features" class="section">
         <div class="container">
-            <h2 class="section-title">{content['features']['title']}</h2>
-            <div class="features-grid">'''
-        
-        # Add enhanced feature cards
-        for item in content['features']['items']:
-            html += f'''
+            <h2 class="section-title">${title}</h2>
+            <div class="features-grid">''')
+
+# Self-contained page head with all theme CSS inlined
+PAGE_HEAD_TEMPLATE = PageTemplate(
+    PAGE_DOCUMENT_START
+    + f'    <link href="{google_fonts_url(list(GOOGLE_FONT_WEIGHTS))}" rel="stylesheet">\n'
+    + '    <style>\n'
+    + THEME_CSS.replace("${hero_background}", HERO_BACKGROUND_DECLARATION)
+    + '    </style>\n'
+    + PAGE_BODY_START
+)
+
+# Page head linking a shared theme stylesheet; only the hero image stays inline
+EXTERNAL_CSS_HEAD_TEMPLATE = PageTemplate(
+    PAGE_DOCUMENT_START
+    + '${font_links}'
+    + '    <link href="${stylesheet_href}" rel="stylesheet">\n'
+    + "    <style>.hero{background-image:linear-gradient(135deg,rgba(0,0,0,0.7),rgba(0,0,0,0.4)),url('${hero_bg}')}</style>\n"
+    + PAGE_BODY_START
+)
+
+FEATURE_CARD_TEMPLATE = PageTemplate('''
                 <div class="feature-card">
-                    <div class="feature-icon">{item['icon']}</div>
-                    <h3>{item['title']}</h3>
-                    <p>{item['description']}</p>
-                </div>'''
-        
-        html += f'''
+                    <div class="feature-icon">${icon}</div>
+                    <h3>${title}</h3>
+                    <p>${description}</p>
+                </div>''')
+
+STEPS_OPEN_TEMPLATE = PageTemplate('''
             </div>
         </div>
     </section>
 
     <section class="section">
         <div class="container">
-            <h2 class="section-title">{content['how_it_works']['title']}</h2>
-            <div class="steps">'''
-        
-        for step in content['how_it_works']['steps']:
-            html += f'''
+            <h2 class="section-title">${title}</h2>
+            <div class="steps">''')
+
+STEP_TEMPLATE = PageTemplate('''
                 <div class="step">
-                    <div class="step-number">{step['step']}</div>
-                    <h3>{step['title']}</h3>
-                    <p>{step['description']}</p>
-                </div>'''
-        
-        # Add product catalog section if available
-        if 'catalog' in content:
-            html += f'''
+                    <div class="step-number">${step}</div>
+                    <h3>${title}</h3>
+                    <p>${description}</p>
+                </div>''')
+
+CATALOG_SECTION_TEMPLATE = PageTemplate('''
+            </div>
+        </div>
+    </section>
+
+    <section id="catalog" class="section">
+        <div class="container">
+            <h2 class="section-title">${title}</h2>
+            <p style="text-align: center; font-size: 1.2rem; margin-bottom: 3rem; color: #666;">${description}</p>
+            <div class="catalog-grid">
+                ${catalog_html}
+            </div>
+        </div>
+    </section>''')
+
+STEPS_CLOSE_HTML = '''
+            </div>
+        </div>
+    </section>'''
+
+PRODUCT_CARD_TEMPLATE = PageTemplate('''
+                <div class="product-card">
+                    <img src="${img_url}" alt="${name}" loading="lazy">
+                    <h3>${name}</h3>
+                    <div class="price">${price}</div>
+                    <button class="product-cta">Add to Cart</button>
+                </div>''')
+
+TESTIMONIALS_OPEN_TEMPLATE = PageTemplate('''
+    <section id="testimonials" class="section testimonials">
+        <div class="container">
+            <h2 class="section-title">${title}</h2>
+            <div class="testimonials-grid">''')
+
+TESTIMONIAL_TEMPLATE = PageTemplate('''
+                <div class="testimonial">
+                    <div style="font-style: italic; margin-bottom: 2rem; font-size: 1.1rem; line-height: 1.6;">"${text}"</div>
+                    <div style="font-weight: 600; color: var(--primary-color); margin-bottom: 0.5rem;">${name}, ${role}</div>
+                    <div>${stars}</div>
+                </div>''')
+
+PRICING_OPEN_TEMPLATE = PageTemplate('''
             </div>
         </div>
     </section>
 
-    <section id="catalog" class="section">
-        <div class="container">
-            <h2 class="section-title">{content['catalog']['title']}</h2>
-            <p style="text-align: center; font-size: 1.2rem; margin-bottom: 3rem; color: #666;">{content['catalog']['description']}</p>
-            <div class="catalog-grid">
-                {catalog_html}
-            </div>
-        </div>
-    </section>'''
+    <section id="pricing" class="section pricing">
+        <div class="container">
+            <h2 class="section-title">${title}</h2>
+            <div class="pricing-card">
+                ${original_price_html}
+                <div class="price">${price}</div>
+                <ul class="pricing-features">''')
+
+PRICING_FEATURE_TEMPLATE = PageTemplate('''                    <li>${feature}</li>
+''')
+
+PAGE_CLOSE_TEMPLATE = PageTemplate('''
+                </ul>
+                <a href="#" class="cta-button">${cta}</a>
+                ${guarantee_html}
+            </div>
+        </div>
+    </section>
+
+    <footer class="footer">
+        <div class="container">
+            <p>&copy; 2024 ${product_name}. All rights reserved.</p>
+            <p style="margin-top: 1rem; opacity: 0.7;">Powered by Enhanced AI Site Generator</p>
+        </div>
+    </footer>
+</body>
+</html>''')
+
+THEME_SLOTS = ("primary", "secondary", "accent", "gradient", "font_family", "border_radius", "shadow")
+
+# Page head templates with a theme's CSS variables already filled in, keyed by theme values
+_themed_head_templates: Dict[Tuple, PageTemplate] = {}
+
+def _themed_head_template(theme: Dict[str, Any]) -> PageTemplate:
+    key = tuple(theme[slot] for slot in THEME_SLOTS)
+    template = _themed_head_templates.get(key)
+    if template is None:
+        template = PAGE_HEAD_TEMPLATE.bind(dict(zip(THEME_SLOTS, key)))
+        _themed_head_templates[key] = template
+    return template
+
+# CSS_MODE=external makes pages link a shared, hashed theme-<name>.<hash>.css instead of
+# inlining the theme CSS; the generator writes the stylesheets to THEME_CSS_DIR before the
+# first page links one, and pages reference them through THEME_CSS_BASE_URL (batch runs use
+# <out>/_themes/ and ../_themes/ instead)
+CSS_MODE = os.getenv('CSS_MODE', 'inline')
+THEME_CSS_DIRNAME = "_themes"
+THEME_CSS_DIR = os.getenv('THEME_CSS_DIR') or os.path.join(GENERATED_SITES_DIR, THEME_CSS_DIRNAME)
+THEME_CSS_BASE_URL = os.getenv('THEME_CSS_BASE_URL', f"/generated/{THEME_CSS_DIRNAME}/")
+
+def minify_css(css: str) -> str:
+    """Strip comments and redundant whitespace from CSS"""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}').strip()
+
+def theme_slug(theme: Dict[str, Any]) -> str:
+    """Stable file-name friendly theme identifier, e.g. Modern Minimal -> modern_minimal"""
+    return theme['name'].lower().replace(' ', '_')
+
+# Compiled theme stylesheets, keyed by theme slug and values
+_theme_stylesheets: Dict[Tuple, Tuple[str, str]] = {}
+
+def compile_theme_stylesheet(theme: Dict[str, Any]) -> Tuple[str, str]:
+    """Compile a theme once into minified CSS and its content-hashed file name"""
+    values = tuple(theme[slot] for slot in THEME_SLOTS)
+    key = (theme_slug(theme),) + values
+    compiled = _theme_stylesheets.get(key)
+    if compiled is None:
+        css_template = PageTemplate(THEME_CSS.replace("${hero_background}", ""))
+        css = minify_css(css_template.render(dict(zip(THEME_SLOTS, values)))) + "\n"
+        digest = hashlib.sha256(css.encode("utf-8")).hexdigest()[:10]
+        compiled = (f"theme-{theme_slug(theme)}.{digest}.css", css)
+        _theme_stylesheets[key] = compiled
+    return compiled
+
+def write_theme_stylesheets(themes: Dict[str, Dict[str, Any]], asset_dir: str) -> Dict[str, str]:
+    """Write every theme's stylesheet into asset_dir (once per content hash) and return their file names"""
+    os.makedirs(asset_dir, exist_ok=True)
+    filenames = {}
+    for theme_key, theme in themes.items():
+        filename, css = compile_theme_stylesheet(theme)
+        path = os.path.join(asset_dir, filename)
+        if not os.path.exists(path):
+            _write_file_atomic(path, css)
+        filenames[theme_key] = filename
+    return filenames
+
+PAGE_SECTIONS = ("hero", "features", "how_it_works", "catalog", "testimonials", "pricing")
+
+# Content keys each page section reads, in PAGE_SECTIONS order
+SECTION_CONTENT_KEYS = (
+    ("hero", ("tagline", "meta_description", "hero")),
+    ("features", ("features",)),
+    ("how_it_works", ("how_it_works",)),
+    ("catalog", ("catalog",)),
+    ("testimonials", ("testimonials",)),
+    ("pricing", ("pricing",)),
+)
+
+def render_themed_sections(product_name: str, content: Dict, theme: Dict, images: List[str],
+                           stylesheet_href: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+    """Fill the precompiled page templates section by section; the chunks concatenate to the full page
+
+    images holds the hero background followed by one image per catalog product.
+    """
+    head_values = {
+        "product_name": product_name,
+        "tagline": content['tagline'],
+        "meta_description": content['meta_description'],
+        "hero_bg": images[0],
+        "headline": content['hero']['headline'],
+        "hero_description": content['hero']['description'],
+        "cta_button": content['hero']['cta_button']
+    }
+    out = []
+    if stylesheet_href:
+        # Only the one font family this theme uses
+        font_family = theme_font_family(theme)
+        head_values["font_links"] = (
+            f'    <link href="{google_fonts_url([font_family])}" rel="stylesheet">\n' if font_family else ''
+        )
+        head_values["stylesheet_href"] = stylesheet_href
+        EXTERNAL_CSS_HEAD_TEMPLATE.render_into(out, head_values)
+    else:
+        _themed_head_template(theme).render_into(out, head_values)
+    yield "hero", "".join(out)
+    
+    # Add enhanced feature cards
+    out = []
+    FEATURES_OPEN_TEMPLATE.render_into(out, content['features'])
+    for item in content['features']['items']:
+        FEATURE_CARD_TEMPLATE.render_into(out, item)
+    yield "features", "".join(out)
+    
+    out = []
+    STEPS_OPEN_TEMPLATE.render_into(out, content['how_it_works'])
+    for step in content['how_it_works']['steps']:
+        STEP_TEMPLATE.render_into(out, step)
+    yield "how_it_works", "".join(out)
+    
+    # Add product catalog section if available
+    out = []
+    if 'catalog' in content:
+        catalog_out = []
+        for product, img_url in zip(content['catalog']['products'], images[1:]):
+            PRODUCT_CARD_TEMPLATE.render_into(catalog_out, {
+                "img_url": img_url,
+                "name": product['name'],
+                "price": product['price']
+            })
+        CATALOG_SECTION_TEMPLATE.render_into(out, {
+            "title": content['catalog']['title'],
+            "description": content['catalog']['description'],
+            "catalog_html": "".join(catalog_out)
+        })
+    else:
+        out.append(STEPS_CLOSE_HTML)
+    yield "catalog", "".join(out)
+    
+    out = []
+    TESTIMONIALS_OPEN_TEMPLATE.render_into(out, content['testimonials'])
+    for review in content['testimonials']['reviews']:
+        TESTIMONIAL_TEMPLATE.render_into(out, {
+            "text": review['text'],
+            "name": review['name'],
+            "role": review['role'],
+            "stars": '⭐' * review['rating']
+        })
+    yield "testimonials", "".join(out)
+    
+    # Enhanced pricing section
+    original_price = content['pricing'].get('original_price', '')
+    guarantee = content['pricing'].get('guarantee', '')
+    
+    out = []
+    PRICING_OPEN_TEMPLATE.render_into(out, {
+        "title": content['pricing']['title'],
+        "original_price_html": f'<div class="original-price">{original_price}</div>' if original_price else '',
+        "price": content['pricing']['price']
+    })
+    for feature in content['pricing']['features']:
+        PRICING_FEATURE_TEMPLATE.render_into(out, {"feature": feature})
+    
+    PAGE_CLOSE_TEMPLATE.render_into(out, {
+        "cta": content['pricing']['cta'],
+        "guarantee_html": f'<p style="margin-top: 2rem; opacity: 0.9; font-size: 0.9rem;">{guarantee}</p>' if guarantee else '',
+        "product_name": product_name
+    })
+    yield "pricing", "".join(out)
+
+def render_themed_page(product_name: str, content: Dict, theme: Dict, images: List[str],
+                       stylesheet_href: Optional[str] = None) -> str:
+    """Render the whole page in one string"""
+    return "".join(html for _, html in render_themed_sections(product_name, content, theme, images, stylesheet_href))
+
+# Enhanced theme system
+THEMES = {
+    "modern_minimal": {
+        "name": "Modern Minimal",
+        "primary": "#1a1a1a",
+        "secondary": "#f8f9fa", 
+        "accent": "#007bff",
+        "gradient": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)",
+        "font_family": "'Inter', 'Segoe UI', sans-serif",
+        "border_radius": "12px",
+        "shadow": "0 8px 32px rgba(0,0,0,0.1)"
+    },
+    "vibrant_modern": {
+        "name": "Vibrant Modern",
+        "primary": "#6c5ce7",
+        "secondary": "#a29bfe",
+        "accent": "#fd79a8", 
+        "gradient": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)",
+        "font_family": "'Poppins', sans-serif",
+        "border_radius": "20px",
+        "shadow": "0 15px 35px rgba(108, 92, 231, 0.2)"
+    },
+    "luxury_elegant": {
+        "name": "Luxury Elegant",
+        "primary": "#2d3436",
+        "secondary": "#ddd6fe",
+        "accent": "#d4af37",
+        "gradient": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)",
+        "font_family": "'Playfair Display', serif",
+        "border_radius": "8px",
+        "shadow": "0 10px 40px rgba(212, 175, 55, 0.2)"
+    },
+    "tech_futuristic": {
+        "name": "Tech Futuristic", 
+        "primary": "#0984e3",
+        "secondary": "#74b9ff",
+        "accent": "#00cec9",
+        "gradient": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)",
+        "font_family": "'Roboto', sans-serif",
+        "border_radius": "4px",
+        "shadow": "0 8px 25px rgba(9, 132, 227, 0.3)"
+    },
+    "organic_natural": {
+        "name": "Organic Natural",
+        "primary": "#27ae60",
+        "secondary": "#55a3ff",
+        "accent": "#f39c12",
+        "gradient": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)",
+        "font_family": "'Nunito', sans-serif",
+        "border_radius": "25px",
+        "shadow": "0 12px 28px rgba(39, 174, 96, 0.2)"
+    },
+    "dark_premium": {
+        "name": "Dark Premium",
+        "primary": "#2c3e50",
+        "secondary": "#34495e",
+        "accent": "#e74c3c",
+        "gradient": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)",
+        "font_family": "'Montserrat', sans-serif",
+        "border_radius": "10px",
+        "shadow": "0 20px 40px rgba(0,0,0,0.3)"
+    }
+}
+
+# Category keywords in priority order: on a tie the earlier category wins.
+# Generic words that show up across categories carry half weight.
+CATEGORY_KEYWORDS = {
+    # Food & Beverage keywords (check this first for better accuracy)
+    "food_beverage": [
+        'food', 'coffee', 'restaurant', 'bakery', 'pizza', ('organic', 0.5), 
+        'drink', 'beverage', 'recipe', 'meal', 'gourmet', ('artisan', 0.5),
+        'apple', 'fruit', 'vegetable', ('fresh', 0.5), 'farm', 'beans', 'roast',
+        'brew', 'tea', 'wine', 'beer', 'dairy', 'meat', 'seafood', 'spice',
+        'sauce', 'soup', 'bread', 'dessert', 'cake', 'cookie', 'chocolate'
+    ],
+    "technology": [
+        ('smart', 0.5), 'ai', 'tech', 'digital', 'app', 'software', 'device', 
+        'phone', 'smartphone', 'tablet', 'laptop', 'computer', 'drone', 'robot', 'electronic',
+        'gadget', 'virtual', 'augmented', ('machine', 0.5), 'algorithm', ('data', 0.5)
+    ],
+    "fashion": [
+        'fashion', 'clothing', 'dress', 'shirt', 'shoes', 'bag', 'handbag',
+        'jewelry', 'watch', ('style', 0.5), 'designer', ('luxury', 0.5), 'saree',
+        'pants', 'jacket', 'coat', 'suit', 'tie', 'belt', 'hat', 'scarf'
+    ],
+    "health_wellness": [
+        'health', 'fitness', 'wellness', 'yoga', 'gym', 'medical', 
+        'beauty', 'cosmetic', ('care', 0.5), 'supplement', 'vitamin', 'protein',
+        'therapy', 'treatment', 'skincare', 'massage', 'meditation'
+    ],
+    "automotive": [
+        'car', 'vehicle', 'automotive', 'bike', 'motorcycle', 'truck',
+        'engine', 'wheel', 'tire', 'brake', 'motor', 'racing'
+    ],
+    "sports_recreation": [
+        'sport', 'game', 'tennis', 'football', 'outdoor', 'recreation',
+        ('equipment', 0.5), ('gear', 0.5), 'basketball', 'soccer', 'golf', 'swimming'
+    ],
+    # Home & Lifestyle keywords (removed kitchen to avoid conflict)
+    "home_lifestyle": [
+        'home', 'furniture', 'decor', 'appliance', ('tool', 0.5), 'garden',
+        'bedroom', ('living', 0.5), 'chair', 'table', 'lamp', 'cleaning'
+    ],
+    "business_professional": [
+        'business', ('professional', 0.5), 'office', 'consulting', ('service', 0.5),
+        'marketing', 'finance', 'legal', 'enterprise', 'corporate'
+    ],
+}
+
+VALID_CATEGORIES = (
+    "technology", "fashion", "food_beverage", "health_wellness",
+    "home_lifestyle", "automotive", "sports_recreation", "business_professional"
+)
+
+CATEGORY_INDEX = KeywordIndex(CATEGORY_KEYWORDS)
+
+def keyword_categorization(product_name: str) -> Tuple[str, float]:
+    """Pick a category from keyword hits and report how confident that pick is (0-1)
+    
+    Confidence is the winning category's share of all keyword weight, so a name whose
+    keywords point at several categories is not trusted over a model call.
+    """
+    # Changed default to food_beverage for better variety
+    return CATEGORY_INDEX.classify(product_name, default="food_beverage")
+
+class LocalCategorizer:
+    """Hashed character n-gram + word features into a softmax linear model, no network needed
+    
+    Weights live in a flat float32 array of (buckets + 1) rows by one column per category,
+    the last row being the bias. Saved models are memory-mapped rather than read in.
+    """
+    
+    MAGIC = b"GSGCAT1\n"
+    
+    def __init__(self, categories: List[str], buckets: int, weights):
+        self.categories = list(categories)
+        self.buckets = buckets
+        self.weights = weights
+    
+    @staticmethod
+    def features(text: str, buckets: int) -> Dict[int, float]:
+        """Hashed bucket -> value for the words and 3/4-character grams of text"""
+        grams = []
+        for word in KeywordIndex.TOKEN_PATTERN.findall(text.lower()):
+            grams.append("w:" + word)
+            padded = f" {word} "
+            for n in (3, 4):
+                grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        if not grams:
+            return {}
+        value = 1.0 / len(grams) ** 0.5
+        feats: Dict[int, float] = {}
+        for gram in grams:
+            bucket = zlib.crc32(gram.encode("utf-8")) % buckets
+            feats[bucket] = feats.get(bucket, 0.0) + value
+        return feats
+    
+    def _probabilities(self, feats: Dict[int, float]) -> List[float]:
+        width = len(self.categories)
+        weights = self.weights
+        bias = self.buckets * width
+        logits = [weights[bias + c] for c in range(width)]
+        for bucket, value in feats.items():
+            row = bucket * width
+            for c in range(width):
+                logits[c] += weights[row + c] * value
+        top = max(logits)
+        exps = [math.exp(logit - top) for logit in logits]
+        total = sum(exps)
+        return [e / total for e in exps]
+    
+    def predict(self, text: str) -> Tuple[str, float]:
+        """Most likely category and its probability"""
+        probs = self._probabilities(self.features(text, self.buckets))
+        best = max(range(len(probs)), key=probs.__getitem__)
+        return self.categories[best], probs[best]
+    
+    @classmethod
+    def train(cls, examples: List[Tuple[str, str]], categories=VALID_CATEGORIES, buckets: int = 1 << 12,
+              epochs: int = 30, learning_rate: float = 0.5) -> 'LocalCategorizer':
+        """Fit the model with plain SGD on (text, category) pairs"""
+        model = cls(categories, buckets, array('f', bytes(4 * (buckets + 1) * len(categories))))
+        index = {category: i for i, category in enumerate(model.categories)}
+        samples = [(cls.features(text, buckets), index[category]) for text, category in examples
+                   if category in index]
+        width = len(model.categories)
+        bias = buckets * width
+        rng = random.Random(0)
+        for _ in range(epochs):
+            rng.shuffle(samples)
+            for feats, label in samples:
+                probs = model._probabilities(feats)
+                for c in range(width):
+                    gradient = probs[c] - (c == label)
+                    if not gradient:
+                        continue
+                    step = learning_rate * gradient
+                    model.weights[bias + c] -= step
+                    for bucket, value in feats.items():
+                        model.weights[bucket * width + c] -= step * value
+        return model
+    
+    def save(self, path: str) -> None:
+        """Write the header and weights atomically"""
+        header = json.dumps({"categories": self.categories, "buckets": self.buckets,
+                             "byteorder": sys.byteorder}).encode("utf-8")
+        # Pad so the weights start 4-byte aligned for the memoryview cast
+        prefix = self.MAGIC + len(header).to_bytes(4, "little") + header
+        prefix += b" " * (-len(prefix) % 4)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(prefix)
+            f.write(array('f', self.weights).tobytes())
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path: str) -> 'LocalCategorizer':
+        """Memory-map a saved model; raises ValueError if the file is not a usable model"""
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapped[:len(cls.MAGIC)] != cls.MAGIC:
+            raise ValueError("not a categorizer model")
+        offset = len(cls.MAGIC)
+        header_len = int.from_bytes(mapped[offset:offset + 4], "little")
+        header = json.loads(mapped[offset + 4:offset + 4 + header_len])
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError("categorizer model was saved on a machine with another byte order")
+        start = offset + 4 + header_len
+        start += -start % 4
+        weights = memoryview(mapped)[start:].cast('f')
+        if len(weights) != (header["buckets"] + 1) * len(header["categories"]):
+            raise ValueError("truncated categorizer model")
+        return cls(header["categories"], header["buckets"], weights)
+
+def categorizer_training_examples(sites_dir: str = GENERATED_SITES_DIR,
+                                  extra_paths: Optional[List[str]] = None) -> List[Tuple[str, str]]:
+    """Labelled product names for the local categorizer
+    
+    Every category keyword is one example, generated sites contribute their stored
+    category, and names without a usable label (old "general" sites, product lists
+    in extra_paths) are weakly labelled by a confident keyword match or skipped.
+    """
+    examples = []
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        for keyword in keywords:
+            examples.append((keyword[0] if isinstance(keyword, tuple) else keyword, category))
+    
+    labelled = []
+    if os.path.isdir(sites_dir):
+        for slug in sorted(os.listdir(sites_dir)):
+            try:
+                with open(os.path.join(sites_dir, slug, 'metadata.json'), 'r', encoding='utf-8') as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError):
+                continue
+            name = metadata.get("name") or metadata.get("product_name")
+            if name:
+                labelled.append((str(name), metadata.get("category")))
+    for path in extra_paths or []:
+        labelled.extend((name, None) for name in read_batch_products(path))
+    
+    for name, category in labelled:
+        if category not in VALID_CATEGORIES:
+            category, confidence = keyword_categorization(name)
+            if confidence < CATEGORY_CONFIDENCE_THRESHOLD:
+                continue
+        examples.append((name, category))
+    return examples
+
+def train_local_categorizer(path: str = LOCAL_CATEGORIZER_PATH,
+                            extra_paths: Optional[List[str]] = None) -> LocalCategorizer:
+    """Train the local categorizer from generated sites (plus extra product lists) and save it"""
+    examples = categorizer_training_examples(extra_paths=extra_paths)
+    model = LocalCategorizer.train(examples)
+    model.save(path)
+    print(f"🧠 Trained local categorizer on {len(examples)} examples -> {path}")
+    return model
+
+_local_categorizer = None
+_local_categorizer_lock = threading.Lock()
+_local_categorizer_missing_logged = False
+
+def get_local_categorizer() -> Optional[LocalCategorizer]:
+    """Return the memory-mapped local categorizer, or None until --train-categorizer has built one
+    
+    Requests never train: without a model file, categorization falls through to the keyword index.
+    """
+    global _local_categorizer, _local_categorizer_missing_logged
+    if not LOCAL_CATEGORIZER_ENABLED:
+        return None
+    with _local_categorizer_lock:
+        if _local_categorizer is None:
+            if not os.path.exists(LOCAL_CATEGORIZER_PATH):
+                if not _local_categorizer_missing_logged:
+                    print("⚠️ No local categorizer model - run --train-categorizer to build one")
+                    _local_categorizer_missing_logged = True
+                return None
+            try:
+                _local_categorizer = LocalCategorizer.load(LOCAL_CATEGORIZER_PATH)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Local categorizer unavailable: {e}")
+                return None
+    return _local_categorizer
+
+class EnhancedGPTSiteGenerator:
+    def __init__(self):
+        """Initialize Enhanced GPT Site Generator"""
+        self.api_key = os.getenv('OPENAI_API_KEY', '')
+        if not self.api_key:
+            print("⚠️ No OpenAI API key found. Using enhanced fallback mode.")
+        else:
+            print("✅ OpenAI client initialized successfully")
+        
+        # "batch" callers leave part of every OpenAI budget to interactive ones
+        self.priority = "interactive"
+        
+        # Repeat product names are answered from disk without spending tokens
+        self.content_cache = None
+        if CONTENT_CACHE_ENABLED:
+            try:
+                self.content_cache = SQLiteCache(os.path.join(CACHE_DIR, "content.sqlite3"), table="content")
+            except sqlite3.Error as e:
+                print(f"⚠️ Content cache unavailable: {e}")
+        
+        # Enhanced theme system
+        self.themes = dict(THEMES)
+        self.css_mode = CSS_MODE
+        self.theme_css_dir = THEME_CSS_DIR
+        self.theme_css_base_url = THEME_CSS_BASE_URL
+        self._theme_css_written = False
+        
+        # Offline generations are served pre-rendered from the fallback corpus when it has them
+        self.use_fallback_corpus = FALLBACK_CORPUS_ENABLED
+        
+        # Page images rewritten to local, resized copies when IMAGE_ASSETS is on
+        self.image_assets = get_image_assets()
+    
+    @property
+    def client(self):
+        """OpenAI client shared with the image calls, created (and openai imported) on first use"""
+        if not self.api_key:
+            raise AttributeError("client")
+        return get_openai_client(self.api_key)
+    
+    def categorize_product(self, product_name: str) -> str:
+        """Enhanced product categorization with GPT"""
+        return self._categorize(product_name, allow_deferral=False)
+    
+    def _categorize(self, product_name: str, allow_deferral: bool = True) -> Optional[str]:
+        """Category ahead of content generation, as one "categorize" span
+        
+        With allow_deferral in single-call mode, None means the content call should pick it.
+        """
+        with stage_span("categorize") as span:
+            known = self._known_category(product_name, span)
+            if known:
+                return known
+            if allow_deferral and SINGLE_CALL_GENERATION:
+                span.set(source="content")
+                return None
+            
+            span.set(source="openai")
+            try:
+                response = self._call_openai_api(self._category_prompt(product_name), max_tokens=20, span=span)
+                if response:
+                    return self._accept_category(product_name, response, default="technology")
+                
+            except Exception as e:
+                print(f"GPT categorization failed: {e}")
+            
+            span.set(source="keywords", fallback_reason="openai_failed")
+            return self._fallback_categorization(product_name)
+    
+    def _category_prompt(self, product_name: str) -> str:
+        """Prompt for the standalone categorization call"""
+        return f"""
+            Analyze this product and categorize it into ONE of these specific categories:
+            - technology (gadgets, electronics, software, AI, smart devices)
+            - fashion (clothing, accessories, jewelry, bags, shoes)
+            - food_beverage (food, drinks, restaurants, culinary)
+            - health_wellness (fitness, medical, beauty, supplements)
+            - home_lifestyle (furniture, decor, appliances, tools)
+            - automotive (cars, bikes, vehicle accessories)
+            - sports_recreation (sports equipment, outdoor gear, games)
+            - business_professional (B2B services, office supplies, consulting)
+            
+            Product: "{product_name}"
+            
+            Return ONLY the category name (one word with underscore).
+            """
+    
+    def _accept_category(self, product_name: str, answer: Any, default: Optional[str] = None) -> str:
+        """Validate a model's category answer and cache it; invalid answers fall back to default or keywords"""
+        category = str(answer).strip().lower()
+        if category in VALID_CATEGORIES:
+            self._cache_set(content_cache_key("category", product_name), category)
+            return category
+        return default or self._fallback_categorization(product_name)
+    
+    def _known_category(self, product_name: str, span: Optional[Span] = None) -> Optional[str]:
+        """Category available without a model call: no API key, cached, or a confident local guess"""
+        span = span or Span("categorize", {}, None)
+        if not self.api_key:
+            span.set(source="keywords", fallback_reason="no_api_key")
+            return self._fallback_categorization(product_name)
+        
+        cached = self._cache_get(content_cache_key("category", product_name))
+        if self.content_cache is not None:
+            span.set(cache="hit" if cached else "miss")
+        if cached:
+            print(f"⚡ Category cache hit for: {product_name}")
+            span.set(source="cache")
+            return cached
+        
+        categorizer = get_local_categorizer()
+        if categorizer is not None:
+            category, confidence = categorizer.predict(product_name)
+            if confidence >= LOCAL_CATEGORIZER_THRESHOLD:
+                print(f"⚡ Local categorizer: {category} ({confidence:.2f} confidence)")
+                span.set(source="local", confidence=round(confidence, 3))
+                return category
+        
+        category, confidence = keyword_categorization(product_name)
+        if confidence >= CATEGORY_CONFIDENCE_THRESHOLD:
+            print(f"⚡ Keyword categorization: {category} ({confidence:.2f} confidence)")
+            span.set(source="keywords", confidence=round(confidence, 3))
+            return category
+        return None
+    
+    def _cache_get(self, key: str) -> Optional[Any]:
+        """Look up a content cache entry, treating cache errors as misses"""
+        if self.content_cache is None:
+            return None
+        try:
+            return self.content_cache.get(key)
+        except sqlite3.Error as e:
+            print(f"⚠️ Content cache read failed: {e}")
+            return None
+    
+    def _cache_set(self, key: str, value: Any) -> None:
+        """Store a content cache entry, ignoring cache errors"""
+        if self.content_cache is None:
+            return
+        try:
+            self.content_cache.set(key, value)
+        except sqlite3.Error as e:
+            print(f"⚠️ Content cache write failed: {e}")
+    
+    def _cached_category(self, product_name: str, cached: Dict[str, Any]) -> str:
+        """Take the category stored with cached content out of it, so a repeat request gets the same page
+        
+        Entries cached before the category was stored with them fall back to keywords.
+        """
+        return cached.pop("category", None) or self._fallback_categorization(product_name)
+    
+    def _fallback_categorization(self, product_name: str) -> str:
+        """Enhanced fallback categorization with better keyword matching"""
+        return keyword_categorization(product_name)[0]
+
+    def generate_enhanced_content(self, product_name: str, category: str) -> Dict[str, Any]:
+        """Generate completely dynamic content using OpenAI - no restrictions or predefined templates"""
+        content, _ = self._generate_content(product_name, category)
+        return content
+    
+    def _generate_content(self, product_name: str, category: str) -> Tuple[Dict[str, Any], str]:
+        """Generate site content and report where it came from ("openai", "partial" or "fallback")"""
+        content = {}
+        stream = self._iter_content(product_name, category)
+        while True:
+            try:
+                key, value = next(stream)
+            except StopIteration as stop:
+                return content, stop.value
+            content[key] = value
+
+    def _categorize_and_generate(self, product_name: str, seed: Optional[int] = None) -> Tuple[str, Dict[str, Any], str]:
+        """Category, content and generation method, spending at most one model call on both"""
+        category = self._categorize(product_name)
+        
+        content = {}
+        stream = self._iter_content(product_name, category, seed)
+        while True:
+            try:
+                key, value = next(stream)
+            except StopIteration as stop:
+                return category, content, stop.value
+            if key == "category":
+                category = value
+            else:
+                content[key] = value
+
+    def _iter_content(self, product_name: str, category: Optional[str],
+                      seed: Optional[int] = None) -> Iterator[Tuple[str, Any]]:
+        """Yield (key, value) content pairs as they become available and return the generation method
+        
+        Keys missing from the OpenAI answer are re-requested on their own, and only
+        what is still missing after that is filled from the dynamic fallback.
+        Without a category the same call is asked for one, and ("category", ...) is
+        yielded before any content key.
+        """
+        
+        print(f"🤖 Generating completely dynamic content for: {product_name}")
+        span = start_span("content")
+        try:
+            method = yield from self._iter_content_pairs(product_name, category, seed, span)
+            span.set(method=method)
+            return method
+        finally:
+            span.finish()
+    
+    def _iter_content_pairs(self, product_name: str, category: Optional[str], seed: Optional[int],
+                            span: Span) -> Iterator[Tuple[str, Any]]:
+        """_iter_content without the span bookkeeping"""
+        want_category = category is None
+        
+        cache_key = content_cache_key("content", product_name)
+        cached = self._cache_get(cache_key)
+        if self.content_cache is not None:
+            span.set(cache="hit" if cached else "miss")
+        if cached:
+            print(f"⚡ Content cache hit for: {product_name}")
+            cached_category = self._cached_category(product_name, cached)
+            if want_category:
+                yield "category", cached_category
+            yield from cached.items()
+            return "openai"
+        
+        # Try OpenAI first - this should be the primary method
+        content = {}
+        if self.api_key:
+            for key, value in self._generate_openai_content(product_name, category=category, span=span):
+                if key == "category":
+                    if want_category:
+                        want_category = False
+                        category = self._accept_category(product_name, value)
+                        yield "category", category
+                    continue
+                if want_category:
+                    # The model skipped the category; don't hold the page back waiting for it
+                    want_category = False
+                    category = self._fallback_categorization(product_name)
+                    yield "category", category
+                content[key] = value
+                yield key, value
+            
+            missing = [key for key in REQUIRED_CONTENT_KEYS if key not in content]
+            if content and missing:
+                print(f"🩹 Re-requesting only the missing keys: {', '.join(missing)}")
+                span.set(retried_keys=len(missing))
+                for key, value in self._generate_openai_content(product_name, keys=missing, category=category,
+                                                                span=span):
+                    if key in missing and key not in content:
+                        content[key] = value
+                        yield key, value
+            
+            if all(key in content for key in REQUIRED_CONTENT_KEYS):
+                print(f"✅ Generated dynamic OpenAI content for {product_name}")
+                self._cache_set(cache_key, dict(content, category=category))
+                return "openai"
+        else:
+            print("⚠️ No OpenAI API key - skipping AI generation")
+        span.set(fallback_reason="no_api_key" if not self.api_key else
+                 "openai_incomplete" if content else "openai_failed")
+        
+        # Only use minimal fallback for whatever OpenAI could not provide
+        print("🔄 OpenAI unavailable, generating minimal dynamic fallback")
+        if want_category:
+            yield "category", self._fallback_categorization(product_name)
+        fallback = self._generate_minimal_dynamic_content(product_name, seed)
+        for key, value in fallback.items():
+            if key not in content:
+                yield key, value
+        return "partial" if content else "fallback"
+
+    def _content_prompt(self, product_name: str, keys: Optional[List[str]] = None,
+                        category: Optional[str] = None) -> str:
+        """Build the content prompt, optionally asking for only some of the top-level keys
+        
+        A known category is passed along as context; without one the model is asked
+        to pick it, as the first key so it streams in before the page content.
+        """
+        if category:
+            category_context = f'It belongs to the "{category}" category.'
+            category_field = ""
+        else:
+            category_context = ""
+            category_field = f'"category": "ONE of: {", ".join(VALID_CATEGORIES)}",'
+        
+        if keys:
+            instructions = (f"Return ONLY valid JSON (no markdown, no explanation) containing ONLY these keys: "
+                            f"{', '.join(keys)}. Take their exact structure from this template:")
+        else:
+            instructions = "Return ONLY valid JSON (no markdown, no explanation) with this exact structure:"
+        
+        return f"""
+        You are an expert e-commerce website creator. A user wants to create a website for "{product_name}".
+
+        No matter what "{product_name}" is - whether it's a physical product, service, digital product, food item, technology, clothing, book, course, app, or anything else - create a professional e-commerce website. {category_context}
+
+        IMPORTANT: 
+        - Do NOT make assumptions about what "{product_name}" is
+        - Research and understand the product based on its name
+        - Create authentic, realistic content that makes sense for this specific product
+        - Generate appropriate related products that would genuinely complement "{product_name}"
+        - Use realistic pricing that makes sense for this type of product
+        - Make it feel like a real business selling a real product
+
+        Create a complete website structure with:
+
+        {instructions}
+        {{
+            {category_field}
+            "tagline": "Memorable slogan for {product_name}",
+            "meta_description": "SEO-friendly description of {product_name} and its benefits",
+            "hero": {{
+                "headline": "Compelling headline for {product_name}",
+                "subheadline": "Engaging tagline that captures what this product does", 
+                "description": "2-3 sentences explaining what {product_name} is and its main benefit",
+                "cta_button": "Action-oriented button text"
+            }},
+            "features": {{
+                "title": "Why Choose {product_name}",
+                "items": [
+                    {{"icon": "🎯", "title": "Key benefit 1", "description": "Specific advantage of {product_name}"}},
+                    {{"icon": "⚡", "title": "Key benefit 2", "description": "Another important feature"}},
+                    {{"icon": "💎", "title": "Key benefit 3", "description": "What makes this special"}},
+                    {{"icon": "🚀", "title": "Key benefit 4", "description": "Additional value proposition"}},
+                    {{"icon": "⭐", "title": "Key benefit 5", "description": "Quality or service benefit"}},
+                    {{"icon": "🔥", "title": "Key benefit 6", "description": "Unique selling point"}}
+                ]
+            }},
+            "how_it_works": {{
+                "title": "How It Works",
+                "steps": [
+                    {{"step": 1, "title": "Step 1", "description": "First thing customer does with {product_name}"}},
+                    {{"step": 2, "title": "Step 2", "description": "Next step in the process"}},
+                    {{"step": 3, "title": "Step 3", "description": "Final outcome or result"}}
+                ]
+            }},
+            "catalog": {{
+                "title": "You Might Also Like",
+                "description": "Products that complement {product_name}",
+                "products": [
+                    {{"name": "Related product 1", "price": "$XX", "image_prompt": "professional product photo of [describe related product] on white background"}},
+                    {{"name": "Related product 2", "price": "$XX", "image_prompt": "professional product photo of [describe related product] on white background"}},
+                    {{"name": "Related product 3", "price": "$XX", "image_prompt": "professional product photo of [describe related product] on white background"}},
+                    {{"name": "Related product 4", "price": "$XX", "image_prompt": "professional product photo of [describe related product] on white background"}}
+                ]
+            }},
+            "testimonials": {{
+                "title": "Customer Reviews",
+                "reviews": [
+                    {{"name": "Customer name", "role": "Their role/title", "text": "Specific testimonial about {product_name}", "rating": 5}},
+                    {{"name": "Another customer", "role": "Their background", "text": "Different perspective on {product_name}", "rating": 5}}
+                ]
+            }},
+            "pricing": {{
+                "title": "Get {product_name} Today",
+                "price": "$XX",
+                "original_price": "$XX",
+                "features": ["What customer gets 1", "What customer gets 2", "What customer gets 3", "Bonus or guarantee"],
+                "cta": "Buy Now",
+                "guarantee": "Money-back guarantee or return policy"
+            }}
+        }}
+
+        Make this authentic and realistic. Think about what "{product_name}" actually is and create content that would genuinely help someone understand and want to buy it.
+        """
+
+    def _generate_openai_content(self, product_name: str, keys: Optional[List[str]] = None,
+                                 category: Optional[str] = None,
+                                 span: Optional[Span] = None) -> Iterator[Tuple[str, Any]]:
+        """Generate content using OpenAI with no restrictions, yielding top-level keys as they close"""
+        try:
+            print(f"🤖 Calling OpenAI API for: {product_name}")
+            
+            # Ultra-dynamic prompt that handles ANY product
+            prompt = self._content_prompt(product_name, keys, category)
+            max_tokens = 3500 if not keys else min(3500, 600 * len(keys))
+            
+            parser = IncrementalJSONParser()
+            if OPENAI_STREAM:
+                chunks = self._stream_openai_api(prompt, max_tokens=max_tokens, span=span)
+            else:
+                response = self._call_openai_api(prompt, max_tokens=max_tokens, span=span)
+                chunks = [response] if response else []
+            
+            for chunk in chunks:
+                yield from parser.feed(chunk)
+            
+            if parser.failed_members:
+                print(f"❌ Dropped {parser.failed_members} unparseable key(s) from OpenAI response")
+            if not parser.done:
+                print("❌ OpenAI response ended before the JSON object closed")
+            
+        except Exception as e:
+            print(f"❌ OpenAI generation failed: {e}")
+
+    def _generate_minimal_dynamic_content(self, product_name: str, seed: Optional[int] = None) -> Dict[str, Any]:
+        """Generate minimal dynamic content when OpenAI is unavailable"""
+        print(f"🎨 Creating minimal dynamic content for: {product_name}")
+        if seed is None:
+            seed = site_seed(product_name)
+        rng = seeded_random(seed, "minimal_content")
+        
+        # Extract meaningful words from product name
+        words = product_name.lower().split()
+        main_word = words[0] if words else "product"
+        
+        # Generate realistic pricing
+        base_price = rng.randint(29, 899)
+        original_price = base_price + rng.randint(20, 200)
+        
+        # Generate dynamic content that adapts to any product
+        content = {
+            "hero": {
+                "headline": f"Premium {product_name}",
+                "subheadline": f"Experience the difference quality makes",
+                "description": f"Discover why {product_name} is the smart choice for those who demand excellence. Quality, value, and satisfaction guaranteed.",
+                "cta_button": f"Get {product_name}"
+            },
+            "features": {
+                "title": f"Why Choose {product_name}",
+                "items": [
+                    {"icon": "⭐", "title": "Premium Quality", "description": f"Our {product_name} meets the highest standards of excellence"},
+                    {"icon": "🚀", "title": "Fast Results", "description": f"Experience the benefits of {product_name} right away"},
+                    {"icon": "💎", "title": "Great Value", "description": f"Get more for your money with our {product_name}"},
+                    {"icon": "🛡️", "title": "Reliable Choice", "description": f"Trust in the proven performance of {product_name}"},
+                    {"icon": "⚡", "title": "Easy to Use", "description": f"Simple and straightforward - {product_name} just works"},
+                    {"icon": "🎯", "title": "Perfect Fit", "description": f"Designed to meet your specific {main_word} needs"}
+                ]
+            },
+            "how_it_works": {
+                "title": f"Getting Started with {product_name}",
+                "steps": [
+                    {"step": 1, "title": "Order", "description": f"Choose your {product_name} and place your order"},
+                    {"step": 2, "title": "Receive", "description": f"Get your {product_name} delivered quickly and safely"},
+                    {"step": 3, "title": "Enjoy", "description": f"Start enjoying all the benefits of {product_name}"}
+                ]
+            },
+            "testimonials": {
+                "title": "Customer Reviews",
+                "reviews": [
+                    {"name": "Alex Johnson", "role": "Satisfied Customer", "text": f"This {product_name} exceeded my expectations. Highly recommended!", "rating": 5},
+                    {"name": "Sarah Chen", "role": "Verified Buyer", "text": f"Amazing quality and great value. My {product_name} is perfect!", "rating": 5}
+                ]
+            },
+            "catalog": {
+                "title": "Complete Your Purchase",
+                "description": f"Perfect additions to your {product_name}",
+                "products": self._generate_dynamic_related_products(product_name, main_word, seed)
+            },
+            "pricing": {
+                "title": f"Get Your {product_name} Today",
+                "price": f"${base_price}",
+                "original_price": f"${original_price}",
+                "features": [
+                    f"Complete {product_name}",
+                    "Free shipping included",
+                    "Customer support",
+                    "Satisfaction guarantee"
+                ],
+                "cta": f"Order {product_name}",
+                "guarantee": "30-day satisfaction guarantee"
+            },
+            "tagline": f"The smart choice for {main_word}",
+            "meta_description": f"Get the best {product_name} with premium quality, great value, and guaranteed satisfaction."
+        }
+        
+        return content
+
+    def _generate_dynamic_related_products(self, product_name: str, main_word: str,
+                                           seed: Optional[int] = None) -> List[Dict]:
+        """Generate related products dynamically based on the main product"""
+        rng = seeded_random(site_seed(product_name) if seed is None else seed, "related_products")
+        
+        # Generate generic but relevant accessories
+        accessories = [
+            f"{main_word.title()} Accessories",
+            f"Premium {main_word.title()} Kit",
+            f"{main_word.title()} Care Package",
+            f"Enhanced {main_word.title()} Bundle"
+        ]
+        
+        related_products = []
+        for i, accessory in enumerate(accessories):
+            price = rng.randint(15, 199)
+            related_products.append({
+                "name": accessory,
+                "price": f"${price}",
+                "image_prompt": f"professional product photo of {accessory.lower()} on white background"
+            })
+        
+        return related_products
+
+    def _call_openai_api(self, prompt: str, max_tokens: int = 2000, span: Optional[Span] = None) -> Optional[str]:
+        """Make OpenAI API call with improved error handling"""
+        if not self.api_key:
+            print("⚠️ No OpenAI API key available")
+            return None
+        
+        if not hasattr(self, 'client'):
+            print("⚠️ OpenAI client not initialized")
+            return None
+        
+        try:
+            print("🔄 Calling OpenAI API...")
+            
+            estimated_tokens = estimate_chat_tokens(prompt, max_tokens)
+            response = get_scheduler().call("chat", lambda: self.client.chat.completions.create(
+                model=OPENAI_CHAT_MODEL,
+                messages=self._chat_messages(prompt),
+                max_tokens=max_tokens,
+                temperature=0.8
+            ), tokens=estimated_tokens, priority=self.priority)
+            usage = getattr(response, "usage", None)
+            get_scheduler().settle("chat", estimated_tokens, getattr(usage, "total_tokens", None))
+            
+            if response.choices and len(response.choices) > 0:
+                content = response.choices[0].message.content
+                record_token_usage(span, usage, prompt, content or "")
+                if content:
+                    print("✅ OpenAI API call successful")
+                    return content.strip()
+            
+            print("❌ Empty response from OpenAI API")
+            return None
+            
+        except Exception as e:
+            self._report_openai_error(e)
+            return None
+
+    def _stream_openai_api(self, prompt: str, max_tokens: int = 2000, span: Optional[Span] = None) -> Iterator[str]:
+        """Stream an OpenAI completion, yielding text deltas as they arrive"""
+        if not self.api_key or not hasattr(self, 'client'):
+            print("⚠️ OpenAI client not initialized")
+            return
+        
+        try:
+            print("🔄 Streaming OpenAI API response...")
+            
+            estimated_tokens = estimate_chat_tokens(prompt, max_tokens)
+            stream = get_scheduler().call("chat", lambda: self.client.chat.completions.create(
+                model=OPENAI_CHAT_MODEL,
+                messages=self._chat_messages(prompt),
+                max_tokens=max_tokens,
+                temperature=0.8,
+                stream=True,
+                stream_options={"include_usage": True}
+            ), tokens=estimated_tokens, priority=self.priority)
+            
+            # The usage chunk comes last, with no choices
+            usage = None
+            streamed_chars = 0
+            for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage
+                if chunk.choices:
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        streamed_chars += len(delta)
+                        yield delta
+            get_scheduler().settle("chat", estimated_tokens, getattr(usage, "total_tokens", None))
+            record_token_usage(span, usage, prompt, streamed_chars)
+            
+        except Exception as e:
+            self._report_openai_error(e)
+
+    def _chat_messages(self, prompt: str) -> List[Dict[str, str]]:
+        """System and user messages for a content or categorization prompt"""
+        return [
+            {"role": "system", "content": "You are an expert e-commerce copywriter and web designer. Create authentic, realistic content for any product the user describes."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _report_openai_error(self, e: Exception) -> None:
+        """Log an OpenAI API error with a hint about its likely cause"""
+        error_str = str(e)
+        print(f"❌ OpenAI API error: {error_str}")
+        
+        if "quota" in error_str.lower() or "429" in error_str:
+            print("💡 API quota exceeded - using dynamic fallback")
+        elif "ssl" in error_str.lower() or "certificate" in error_str.lower():
+            print("🔒 SSL certificate issue - using dynamic fallback")
+        elif "connection" in error_str.lower():
+            print("🌐 Connection issue - using dynamic fallback")
         else:
-            html += '''
-            </div>
-        </div>
-    </section>'''
+            print("⚠️ Unexpected API error - using dynamic fallback")
 
-        html += f'''
-    <section id="testimonials" class="section testimonials">
-        <div class="container">
-            <h2 class="section-title">{content['testimonials']['title']}</h2>
-            <div class="testimonials-grid">'''
+    def render_site(self, product_name: str, seed: Optional[int] = None) -> Dict[str, Any]:
+        """Categorize, write content for and render one site without touching the disk
         
-        for review in content['testimonials']['reviews']:
-            stars = '⭐' * review['rating']
-            html += f'''
-                <div class="testimonial">
-                    <div style="font-style: italic; margin-bottom: 2rem; font-size: 1.1rem; line-height: 1.6;">"{review['text']}"</div>
-                    <div style="font-weight: 600; color: var(--primary-color); margin-bottom: 0.5rem;">{review['name']}, {review['role']}</div>
-                    <div>{stars}</div>
-                </div>'''
+        All randomness is drawn from seed (by default derived from the product name),
+        so the same inputs render byte-identical HTML.
+        """
+        print(f"🔍 Analyzing product: {product_name}")
+        if seed is None:
+            seed = site_seed(product_name)
         
-        # Enhanced pricing section
-        original_price = content['pricing'].get('original_price', '')
-        guarantee = content['pricing'].get('guarantee', '')
+        if not self.api_key:
+            site = self._corpus_site(product_name, seed)
+            if site is not None:
+                return self._with_local_images(site)
         
-        html += f'''
-            </div>
-        </div>
-    </section>
+        # Step 1: Select a theme for variety, stable per product
+        theme_key = self._choose_theme(seed)
+        theme = self.themes[theme_key]
+        print(f"🎨 Theme selected: {theme['name']}")
+        
+        # Step 2: Categorize product and generate enhanced content in one round-trip
+        print(f"📝 Generating enhanced content...")
+        category, content, generation_method = self._categorize_and_generate(product_name, seed)
+        print(f"📂 Category detected: {category}")
+        
+        # Step 4: Generate HTML with selected theme
+        print(f"🌐 Building themed website...")
+        html = self.generate_themed_html(product_name, content, category, theme)
+        
+        return self._with_local_images({
+            "html": html,
+            "metadata": self._site_metadata(product_name, category, theme_key, generation_method, content)
+        })
+    
+    def _with_local_images(self, site: Dict[str, Any]) -> Dict[str, Any]:
+        """Point a rendered site's images at local asset copies when the asset pipeline is on"""
+        if self.image_assets is not None:
+            site["html"] = self.image_assets.localize(site["html"])
+        return site
+    
+    def _corpus_site(self, product_name: str, seed: int) -> Optional[Dict[str, Any]]:
+        """Pre-rendered offline page for this product and seed, unless cached OpenAI content exists"""
+        corpus = get_fallback_corpus() if self.use_fallback_corpus else None
+        if corpus is None:
+            return None
+        
+        with stage_span("corpus") as span:
+            site = corpus.get(FallbackCorpus.key(product_name, seed, self._page_variant()))
+            # Content cached from an earlier OpenAI answer beats the fallback copy
+            if site is not None and self._cache_get(content_cache_key("content", product_name)):
+                site = None
+            span.set(cache="hit" if site else "miss")
+        if site is None:
+            return None
+        
+        print(f"⚡ Serving pre-rendered fallback page for: {product_name}")
+        if self.css_mode == "external":
+            # The page links a theme stylesheet this process may not have written yet
+            self._publish_theme_stylesheets()
+        site["metadata"]["generated_at"] = datetime.now().isoformat()
+        return site
+    
+    def _page_variant(self) -> str:
+        """Settings besides the product and seed that change the rendered HTML"""
+        return f"external:{self.theme_css_base_url}" if self.css_mode == "external" else "inline"
+    
+    def _choose_theme(self, seed: int) -> str:
+        """Theme key for a generation seed"""
+        return seeded_random(seed, "theme").choice(list(self.themes.keys()))
+    
+    def _site_metadata(self, product_name: str, category: str, theme_key: str, generation_method: str,
+                       content: Dict[str, Any]) -> Dict[str, Any]:
+        """Metadata stored and returned alongside a rendered site"""
+        return {
+            "name": product_name,
+            "category": category,
+            "generated_at": datetime.now().isoformat(),
+            "theme": theme_key,
+            "generation_method": generation_method,
+            "features": [item.get("title", "") for item in content.get("features", {}).get("items", [])],
+            "tagline": content.get("tagline", ""),
+            "description": content.get("meta_description", "")
+        }
+    
+    def generate_website(self, product_name: str, seed: Optional[int] = None) -> str:
+        """Generate complete enhanced website"""
+        html = self.render_site(product_name, seed)["html"]
+        
+        # Step 5: Store the page under its content hash
+        site_file = self._store_site(html)
+        
+        print(f"✅ Enhanced themed website generated successfully!")
+        return site_file
+    
+    def _store_site(self, html: str) -> str:
+        """Put a generated page in the site store and return its path; the file name is the site ID"""
+        with stage_span("write") as span:
+            site_id, site_file = get_site_store().put(html)
+            span.set(site_id=site_id)
+        return site_file
 
-    <section id="pricing" class="section pricing">
-        <div class="container">
-            <h2 class="section-title">{content['pricing']['title']}</h2>
-            <div class="pricing-card">
-                {f'<div class="original-price">{original_price}</div>' if original_price else ''}
-                <div class="price">{content['pricing']['price']}</div>
-                <ul class="pricing-features">'''
+    def generate_website_stream(self, product_name: str, seed: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Generate a website progressively, yielding events as soon as each part is ready
+
+        Events, in order: one "meta", one "section" per entry of PAGE_SECTIONS (rendered with
+        placeholder images as soon as the content keys it needs have streamed in), one "image"
+        per hero/catalog image as it arrives, and a final "done" carrying the finished page.
+        Image slots are "hero" and "catalog:<index>". A page served from the fallback corpus is
+        already finished, so "meta" is followed directly by "done".
+        """
+        print(f"🔍 Analyzing product: {product_name}")
+        if seed is None:
+            seed = site_seed(product_name)
+        if not self.api_key:
+            site = self._corpus_site(product_name, seed)
+            if site is not None:
+                site = self._with_local_images(site)
+                metadata = site["metadata"]
+                yield {"event": "meta", "product_name": product_name, "category": metadata["category"],
+                       "theme": metadata["theme"]}
+                site_file = self._store_site(site["html"])
+                yield {"event": "done", "site_file": site_file, "generation_method": metadata["generation_method"],
+                       "site_id": os.path.splitext(os.path.basename(site_file))[0]}
+                return
+        theme_key = self._choose_theme(seed)
+        theme = self.themes[theme_key]
+        category = self._categorize(product_name)
+        content_stream = self._iter_content(product_name, category, seed)
+        if category is None:
+            # Single-call mode: the category is the first thing the content call streams back
+            _, category = next(content_stream)
+        yield {"event": "meta", "product_name": product_name, "category": category, "theme": theme_key}
         
-        for feature in content['pricing']['features']:
-            html += f'                    <li>{feature}</li>\n'
+        # Sections render lazily from content and images, which fill in while the
+        # content streams; each section is pulled once the keys it needs are present
+        content = {}
+        images = [get_smart_fallback_image(f"{product_name} hero background")]
+        stylesheet_href = self._stylesheet_href(theme)
+        sections = render_themed_sections(product_name, content, theme, images, stylesheet_href)
+        pending = list(SECTION_CONTENT_KEYS)
+        generation_method = None
+        while pending:
+            if generation_method is None:
+                try:
+                    key, value = next(content_stream)
+                    content[key] = value
+                    if key == 'catalog':
+                        images[1:] = [get_smart_fallback_image(product['image_prompt'])
+                                      for product in value['products']]
+                except StopIteration as stop:
+                    generation_method = stop.value
+            while pending and (generation_method is not None or all(key in content for key in pending[0][1])):
+                name, html = next(sections)
+                pending.pop(0)
+                yield {"event": "section", "name": name, "html": html}
         
-        html += f'''
-                </ul>
-                <a href="#" class="cta-button">{content['pricing']['cta']}</a>
-                {f'<p style="margin-top: 2rem; opacity: 0.9; font-size: 0.9rem;">{guarantee}</p>' if guarantee else ''}
-            </div>
-        </div>
-    </section>
+        # Finish the content stream even when every section already had its keys, so the
+        # answer gets cached and its generation method (and token counts) are known
+        while generation_method is None:
+            try:
+                key, value = next(content_stream)
+                content[key] = value
+            except StopIteration as stop:
+                generation_method = stop.value
+        
+        # Then the real images, patched in as they arrive
+        prompts = self._image_prompts(product_name, content)
+        for index, url in iter_product_images(prompts, priority=self.priority):
+            images[index] = url
+            yield {"event": "image", "slot": "hero" if index == 0 else f"catalog:{index - 1}", "url": url}
+        
+        with stage_span("render", theme=theme["name"]):
+            html = render_themed_page(product_name, content, theme, images, stylesheet_href)
+        if self.image_assets is not None:
+            html = self.image_assets.localize(html)
+        site_file = self._store_site(html)
+        yield {"event": "done", "site_file": site_file, "generation_method": generation_method,
+               "site_id": os.path.splitext(os.path.basename(site_file))[0]}
 
-    <footer class="footer">
-        <div class="container">
-            <p>&copy; 2024 {product_name}. All rights reserved.</p>
-            <p style="margin-top: 1rem; opacity: 0.7;">Powered by Enhanced AI Site Generator</p>
-        </div>
-    </footer>
-</body>
-</html>'''
+    def generate_themed_html(self, product_name: str, content: Dict, category: str, theme: Dict) -> str:
+        """Generate HTML with dynamic themes and enhanced ecommerce features"""
+        
+        # Generate the hero background and all catalog images concurrently using DALL-E
+        images = generate_product_images(self._image_prompts(product_name, content), priority=self.priority)
         
-        return html
+        # Enhanced HTML with modern design and ecommerce features
+        with stage_span("render", theme=theme["name"]):
+            return render_themed_page(product_name, content, theme, images, self._stylesheet_href(theme))
+    
+    def _image_prompts(self, product_name: str, content: Dict) -> List[str]:
+        """Image prompts for a page: the hero background first, then each catalog product"""
+        catalog_products = content['catalog']['products'] if 'catalog' in content else []
+        return [f"{product_name} hero background"] + [product['image_prompt'] for product in catalog_products]
+    
+    def _stylesheet_href(self, theme: Dict) -> Optional[str]:
+        """Shared, cacheable theme stylesheet instead of inlined CSS when enabled"""
+        if self.css_mode != "external":
+            return None
+        self._publish_theme_stylesheets()
+        return self.theme_css_base_url + compile_theme_stylesheet(theme)[0]
+    
+    def _publish_theme_stylesheets(self) -> None:
+        """Write every theme stylesheet to theme_css_dir once, before the first page links one"""
+        if not self._theme_css_written:
+            write_theme_stylesheets(self.themes, self.theme_css_dir)
+            self._theme_css_written = True
 
     def _generate_relevant_catalog_products(self, product_name: str, category: str, main_word: str) -> List[Dict]:
         """Generate truly relevant catalog products with specific image prompts"""
@@ -1400,13 +3631,12 @@ class EnhancedGPTSiteGenerator:
                 {"name": f"{main_word.title()} Upgrade Pack", "price": "$59", "image_prompt": f"professional product photo of {product_name} premium upgrade pack on white background"}
             ]
 
-    def _enhanced_fallback_content(self, product_name: str, category: str) -> Dict[str, Any]:
+    def _enhanced_fallback_content(self, product_name: str, category: str, seed: Optional[int] = None) -> Dict[str, Any]:
         """Ultra-dynamic fallback content with sophisticated content generation"""
         print(f"🎨 Creating ultra-dynamic content for {product_name} ({category})")
         
-        # Import for content generation
-        import random
-        from datetime import datetime
+        # Every choice below comes from the seed, so a product always gets the same copy
+        rng = seeded_random(site_seed(product_name) if seed is None else seed, "enhanced_content")
         
         # Extract key words from product name for content customization
         product_words = product_name.lower().split()
@@ -1434,10 +3664,10 @@ class EnhancedGPTSiteGenerator:
                     {"name": "Sarah Martinez", "role": "Tech Lead", "text": f"I've tried many {main_word} solutions, but {product_name} is in a league of its own."}
                 ],
                 "related_products": [
-                    {"name": f"Pro {main_word.title()} Extension", "price": random.choice(["$29", "$39", "$49"])},
-                    {"name": f"{main_word.title()} Analytics Dashboard", "price": random.choice(["$59", "$79", "$99"])},
-                    {"name": f"Enterprise {main_word.title()} Suite", "price": random.choice(["$149", "$199", "$249"])},
-                    {"name": f"{main_word.title()} Security Pack", "price": random.choice(["$39", "$59", "$79"])}
+                    {"name": f"Pro {main_word.title()} Extension", "price": rng.choice(["$29", "$39", "$49"])},
+                    {"name": f"{main_word.title()} Analytics Dashboard", "price": rng.choice(["$59", "$79", "$99"])},
+                    {"name": f"Enterprise {main_word.title()} Suite", "price": rng.choice(["$149", "$199", "$249"])},
+                    {"name": f"{main_word.title()} Security Pack", "price": rng.choice(["$39", "$59", "$79"])}
                 ]
             },
                          "food_beverage": {
@@ -1460,10 +3690,10 @@ class EnhancedGPTSiteGenerator:
                     {"name": "Chef Robert Wilson", "role": "Executive Chef", "text": f"I use this {product_name} in my restaurant. My customers always ask about the secret ingredient."}
                 ],
                 "related_products": [
-                    {"name": f"Premium {main_word.title()} Sampler", "price": random.choice(["$25", "$35", "$45"])},
-                    {"name": f"{main_word.title()} Storage Container", "price": random.choice(["$19", "$29", "$39"])},
-                    {"name": f"Artisan {main_word.title()} Collection", "price": random.choice(["$75", "$99", "$125"])},
-                    {"name": f"{main_word.title()} Recipe Book", "price": random.choice(["$15", "$25", "$35"])},
+                    {"name": f"Premium {main_word.title()} Sampler", "price": rng.choice(["$25", "$35", "$45"])},
+                    {"name": f"{main_word.title()} Storage Container", "price": rng.choice(["$19", "$29", "$39"])},
+                    {"name": f"Artisan {main_word.title()} Collection", "price": rng.choice(["$75", "$99", "$125"])},
+                    {"name": f"{main_word.title()} Recipe Book", "price": rng.choice(["$15", "$25", "$35"])},
                 ]
             },
                          "health_wellness": {
@@ -1486,10 +3716,10 @@ class EnhancedGPTSiteGenerator:
                     {"name": "Michael Thompson", "role": "Fitness Coach", "text": f"The {product_name} transformed my clients' {main_word} performance dramatically."}
                 ],
                 "related_products": [
-                    {"name": f"{main_word.title()} Monitoring Kit", "price": random.choice(["$79", "$99", "$129"])},
-                    {"name": f"Advanced {main_word.title()} Support", "price": random.choice(["$39", "$59", "$79"])},
-                    {"name": f"{main_word.title()} Recovery Bundle", "price": random.choice(["$149", "$199", "$249"])},
-                    {"name": f"Professional {main_word.title()} Guide", "price": random.choice(["$29", "$39", "$49"])},
+                    {"name": f"{main_word.title()} Monitoring Kit", "price": rng.choice(["$79", "$99", "$129"])},
+                    {"name": f"Advanced {main_word.title()} Support", "price": rng.choice(["$39", "$59", "$79"])},
+                    {"name": f"{main_word.title()} Recovery Bundle", "price": rng.choice(["$149", "$199", "$249"])},
+                    {"name": f"Professional {main_word.title()} Guide", "price": rng.choice(["$29", "$39", "$49"])},
                 ]
             },
                          "fashion": {
@@ -1512,10 +3742,10 @@ class EnhancedGPTSiteGenerator:
                     {"name": "Amanda Style", "role": "Fashion Blogger", "text": f"The quality and design of this {product_name} is unmatched. Pure perfection!"}
                 ],
                 "related_products": [
-                    {"name": f"{main_word.title()} Care Kit", "price": random.choice(["$25", "$35", "$45"])},
-                    {"name": f"Matching {main_word.title()} Accessories", "price": random.choice(["$59", "$79", "$99"])},
-                    {"name": f"Designer {main_word.title()} Collection", "price": random.choice(["$149", "$199", "$299"])},
-                    {"name": f"Limited Edition {main_word.title()}", "price": random.choice(["$199", "$299", "$399"])},
+                    {"name": f"{main_word.title()} Care Kit", "price": rng.choice(["$25", "$35", "$45"])},
+                    {"name": f"Matching {main_word.title()} Accessories", "price": rng.choice(["$59", "$79", "$99"])},
+                    {"name": f"Designer {main_word.title()} Collection", "price": rng.choice(["$149", "$199", "$299"])},
+                    {"name": f"Limited Edition {main_word.title()}", "price": rng.choice(["$199", "$299", "$399"])},
                 ]
             }
         }
@@ -1524,15 +3754,15 @@ class EnhancedGPTSiteGenerator:
         template_data = category_templates.get(category, category_templates["technology"])
         
         # Generate dynamic content
-        adjective = random.choice(template_data["adjectives"])
-        benefits = random.sample(template_data["benefits"], 6)  # Random selection of 6 benefits
+        adjective = rng.choice(template_data["adjectives"])
+        benefits = rng.sample(template_data["benefits"], 6)  # Random selection of 6 benefits
         steps = template_data["steps"]
-        testimonials = random.sample(template_data["testimonials"], 2)
+        testimonials = rng.sample(template_data["testimonials"], 2)
         related_products = template_data["related_products"]
         
         # Generate realistic pricing
-        base_price = random.randint(99, 899)
-        original_price = base_price + random.randint(50, 200)
+        base_price = rng.randint(99, 899)
+        original_price = base_price + rng.randint(50, 200)
         
         # Generate dynamic headlines and descriptions
         headlines = [
@@ -1565,10 +3795,10 @@ class EnhancedGPTSiteGenerator:
         # Create the comprehensive content structure
         content = {
             "hero": {
-                "headline": random.choice(headlines),
-                "subheadline": random.choice(taglines),
-                "description": random.choice(descriptions),
-                "cta_button": random.choice(cta_buttons)
+                "headline": rng.choice(headlines),
+                "subheadline": rng.choice(taglines),
+                "description": rng.choice(descriptions),
+                "cta_button": rng.choice(cta_buttons)
             },
             "features": {
                 "title": f"Why {product_name} is Different",
@@ -1598,8 +3828,8 @@ class EnhancedGPTSiteGenerator:
                     "Setup assistance included",
                     "Premium warranty coverage"
                 ],
-                "cta": "Buy {product_name}",
-                "guarantee": random.choice(["30-day performance guarantee", "60-day satisfaction guarantee", "90-day money-back guarantee"])
+                "cta": f"Buy {product_name}",
+                "guarantee": rng.choice(["30-day performance guarantee", "60-day satisfaction guarantee", "90-day money-back guarantee"])
             },
             "tagline": f"Experience the {adjective.lower()} difference",
             "meta_description": f"Get the best {product_name} - {adjective.lower()} solution with premium features, expert support, and guaranteed satisfaction."
@@ -1608,12 +3838,1000 @@ class EnhancedGPTSiteGenerator:
         print(f"✅ Generated ultra-dynamic content with {len(benefits)} unique features")
         return content
 
+class AsyncInFlightRequests:
+    """asyncio counterpart of InFlightRequests: identical concurrent calls share one task
+    
+    The shared task is shielded, so a caller that times out or is cancelled does not
+    cancel the call for the others still waiting on it.
+    """
+    
+    def __init__(self):
+        self._pending: Dict[str, Any] = {}
+    
+    async def run(self, key: str, make_coroutine):
+        """Await make_coroutine() for key, or the identical call that is already in flight"""
+        import asyncio
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(make_coroutine())
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(task)
+
+class AsyncSiteGenerator:
+    """asyncio-native generator for embedding behind an async web tier
+    
+    Network calls go through AsyncOpenAI, and every page image runs as its own task: the
+    hero image starts right away, concurrently with the content call, and catalog images
+    follow as soon as the content names them. Categorization, caching, prompts, parsing,
+    fallbacks and rendering are shared with EnhancedGPTSiteGenerator, so both produce the
+    same sites. Each image is bounded by IMAGE_DEADLINE_SECONDS and a whole generation by
+    GENERATION_TIMEOUT_SECONDS; cancelling a generation cancels its outstanding tasks.
+    """
+    
+    def __init__(self, generator: Optional[EnhancedGPTSiteGenerator] = None):
+        self.generator = generator or EnhancedGPTSiteGenerator()
+        self.client = None
+        if self.generator.api_key:
+            self.client = new_async_openai_client(self.generator.api_key)
+        self._image_requests = AsyncInFlightRequests()
+    
+    async def aclose(self) -> None:
+        """Close the underlying HTTP client"""
+        if self.client is not None:
+            await self.client.close()
+    
+    async def agenerate_website(self, product_name: str, timeout: Optional[float] = GENERATION_TIMEOUT_SECONDS,
+                                seed: Optional[int] = None) -> str:
+        """Generate a website and return the path of its HTML file in the site store"""
+        import asyncio
+        site = await self.arender_site(product_name, timeout=timeout, seed=seed)
+        return await asyncio.to_thread(self.generator._store_site, site["html"])
+    
+    async def arender_site(self, product_name: str, timeout: Optional[float] = GENERATION_TIMEOUT_SECONDS,
+                           seed: Optional[int] = None) -> Dict[str, Any]:
+        """Categorize, write content for and render one site; same result shape and seeding as render_site"""
+        import asyncio
+        return await asyncio.wait_for(self._arender_site(product_name, seed), timeout)
+    
+    async def _arender_site(self, product_name: str, seed: Optional[int]) -> Dict[str, Any]:
+        import asyncio
+        generator = self.generator
+        print(f"🔍 Analyzing product: {product_name}")
+        if seed is None:
+            seed = site_seed(product_name)
+        if self.client is None:
+            site = await asyncio.to_thread(generator._corpus_site, product_name, seed)
+            if site is not None:
+                return await asyncio.to_thread(generator._with_local_images, site)
+        theme_key = generator._choose_theme(seed)
+        theme = generator.themes[theme_key]
+        
+        hero_task = asyncio.ensure_future(self._aimage(f"{product_name} hero background"))
+        try:
+            span = start_span("categorize")
+            # Cache and local model lookups hit SQLite and the disk, so they run off the event loop
+            category = await asyncio.to_thread(generator._known_category, product_name, span)
+            if category is None and not SINGLE_CALL_GENERATION:
+                # The standalone call answers first, so the content call is not asked for the category again
+                category = await self._amodel_category(product_name, span)
+            else:
+                if category is None:
+                    span.set(source="content")
+                span.finish()
+            category, content, generation_method = await self._acontent(product_name, category, seed)
+            
+            catalog_prompts = generator._image_prompts(product_name, content)[1:]
+            images = await asyncio.gather(hero_task, *(self._aimage(prompt) for prompt in catalog_prompts))
+        finally:
+            hero_task.cancel()
+        
+        with stage_span("render", theme=theme["name"]):
+            html = render_themed_page(product_name, content, theme, list(images), generator._stylesheet_href(theme))
+        return await asyncio.to_thread(generator._with_local_images, {
+            "html": html,
+            "metadata": generator._site_metadata(product_name, category, theme_key, generation_method, content)
+        })
+    
+    async def acategorize_product(self, product_name: str) -> str:
+        """Standalone categorization call, for when single-call generation is turned off"""
+        import asyncio
+        span = start_span("categorize")
+        known = await asyncio.to_thread(self.generator._known_category, product_name, span)
+        if known:
+            span.finish()
+            return known
+        return await self._amodel_category(product_name, span)
+    
+    async def _amodel_category(self, product_name: str, span: Span) -> str:
+        """Ask the model for the category, then finish the categorize span"""
+        import asyncio
+        generator = self.generator
+        span.set(source="openai")
+        try:
+            answer = await self._acall_openai_api(generator._category_prompt(product_name), max_tokens=20, span=span)
+            if answer:
+                return await asyncio.to_thread(generator._accept_category, product_name, answer, "technology")
+            span.set(source="keywords", fallback_reason="openai_failed")
+            return generator._fallback_categorization(product_name)
+        finally:
+            span.finish()
+    
+    async def _acontent(self, product_name: str, category: Optional[str],
+                        seed: Optional[int] = None) -> Tuple[str, Dict[str, Any], str]:
+        """Category, content and generation method; mirrors EnhancedGPTSiteGenerator._iter_content"""
+        with stage_span("content") as span:
+            category, content, method = await self._acontent_in_span(product_name, category, seed, span)
+            span.set(method=method)
+            return category, content, method
+    
+    async def _acontent_in_span(self, product_name: str, category: Optional[str], seed: Optional[int],
+                                span: Span) -> Tuple[str, Dict[str, Any], str]:
+        import asyncio
+        generator = self.generator
+        cache_key = content_cache_key("content", product_name)
+        cached = await asyncio.to_thread(generator._cache_get, cache_key)
+        if generator.content_cache is not None:
+            span.set(cache="hit" if cached else "miss")
+        if cached:
+            print(f"⚡ Content cache hit for: {product_name}")
+            cached_category = generator._cached_category(product_name, cached)
+            return category or cached_category, cached, "openai"
+        
+        content = {}
+        if self.client is not None:
+            for key, value in await self._acontent_pairs(product_name, category=category, span=span):
+                if key == "category":
+                    if category is None:
+                        category = await asyncio.to_thread(generator._accept_category, product_name, value)
+                    continue
+                content[key] = value
+            if category is None:
+                category = generator._fallback_categorization(product_name)
+            
+            missing = [key for key in REQUIRED_CONTENT_KEYS if key not in content]
+            if content and missing:
+                print(f"🩹 Re-requesting only the missing keys: {', '.join(missing)}")
+                span.set(retried_keys=len(missing))
+                for key, value in await self._acontent_pairs(product_name, keys=missing, category=category, span=span):
+                    if key in missing:
+                        content.setdefault(key, value)
+            
+            if all(key in content for key in REQUIRED_CONTENT_KEYS):
+                print(f"✅ Generated dynamic OpenAI content for {product_name}")
+                await asyncio.to_thread(generator._cache_set, cache_key, dict(content, category=category))
+                return category, content, "openai"
+        
+        print("🔄 OpenAI unavailable, generating minimal dynamic fallback")
+        span.set(fallback_reason="no_api_key" if self.client is None else
+                 "openai_incomplete" if content else "openai_failed")
+        generation_method = "partial" if content else "fallback"
+        for key, value in generator._generate_minimal_dynamic_content(product_name, seed).items():
+            content.setdefault(key, value)
+        return category or generator._fallback_categorization(product_name), content, generation_method
+    
+    async def _acontent_pairs(self, product_name: str, keys: Optional[List[str]] = None,
+                              category: Optional[str] = None, span: Optional[Span] = None) -> List[Tuple[str, Any]]:
+        """Top-level (key, value) pairs salvaged from one content completion"""
+        prompt = self.generator._content_prompt(product_name, keys, category)
+        max_tokens = 3500 if not keys else min(3500, 600 * len(keys))
+        answer = await self._acall_openai_api(prompt, max_tokens=max_tokens, span=span)
+        parser = IncrementalJSONParser()
+        pairs = parser.feed(answer or "")
+        if parser.failed_members:
+            print(f"❌ Dropped {parser.failed_members} unparseable key(s) from OpenAI response")
+        return pairs
+    
+    async def _acall_openai_api(self, prompt: str, max_tokens: int = 2000,
+                                span: Optional[Span] = None) -> Optional[str]:
+        """Async OpenAI chat call; errors are logged and answered with None"""
+        if self.client is None:
+            return None
+        try:
+            estimated_tokens = estimate_chat_tokens(prompt, max_tokens)
+            response = await get_scheduler().call_async("chat", lambda: self.client.chat.completions.create(
+                model=OPENAI_CHAT_MODEL,
+                messages=self.generator._chat_messages(prompt),
+                max_tokens=max_tokens,
+                temperature=0.8
+            ), tokens=estimated_tokens, priority=self.generator.priority)
+            usage = getattr(response, "usage", None)
+            get_scheduler().settle("chat", estimated_tokens, getattr(usage, "total_tokens", None))
+            if response.choices:
+                record_token_usage(span, usage, prompt, response.choices[0].message.content or "")
+            if response.choices and response.choices[0].message.content:
+                return response.choices[0].message.content.strip()
+            print("❌ Empty response from OpenAI API")
+        except Exception as e:
+            self.generator._report_openai_error(e)
+        return None
+    
+    async def _aimage(self, prompt: str) -> str:
+        """One page image within IMAGE_DEADLINE_SECONDS, or a smart fallback"""
+        import asyncio
+        with stage_span("image", prompt=prompt) as span:
+            try:
+                return await asyncio.wait_for(self.agenerate_product_image(prompt, span), IMAGE_DEADLINE_SECONDS)
+            except asyncio.TimeoutError:
+                print(f"⏱️ Image deadline exceeded - using smart fallback for: {prompt}")
+                span.set(fallback_reason="deadline")
+            except Exception as e:
+                print(f"❌ Image generation failed: {e}")
+                span.set(fallback_reason="error")
+            return get_smart_fallback_image(prompt)
+    
+    async def agenerate_product_image(self, prompt: str, span: Optional[Span] = None) -> str:
+        """Async generate_product_image: cached, coalesced DALL-E call with the same fallbacks"""
+        import asyncio
+        if self.client is None:
+            _set_fallback_reason(span, "no_api_key")
+            return get_smart_fallback_image(prompt)
+        
+        clean_prompt = clean_dalle_prompt(prompt)
+        cache_key = image_cache_key(clean_prompt)
+        cached = await asyncio.to_thread(_cached_image, cache_key, clean_prompt)
+        if span is not None:
+            span.set(cache="hit" if cached else "miss")
+        if cached:
+            return cached
+        
+        image_url = await self._image_requests.run(cache_key, lambda: self._arequest_dalle_image(clean_prompt, span))
+        if not image_url:
+            if span is not None:
+                span.attributes.setdefault("fallback_reason", "openai_failed")
+            return get_smart_fallback_image(prompt)
+        
+        # Storing image bytes downloads the image, so keep it off the event loop
+        await asyncio.to_thread(_remember_image, cache_key, image_url)
+        return image_url
+    
+    async def _arequest_dalle_image(self, clean_prompt: str, span: Optional[Span] = None) -> Optional[str]:
+        """Call DALL-E for one cleaned prompt, returning the image URL or None on failure"""
+        import openai
+        
+        try:
+            print(f"🎨 Generating DALL-E image for: {clean_prompt}")
+            response = await get_scheduler().call_async("images", lambda: self.client.images.generate(
+                model=DALLE_MODEL,
+                prompt=clean_prompt,
+                n=1,
+                size="1024x1024",
+                quality="standard",
+                style="vivid"
+            ), priority=self.generator.priority, deadline=IMAGE_DEADLINE_SECONDS)
+            if response.data:
+                print(f"✅ DALL-E image generated successfully")
+                return response.data[0].url
+            print("❌ No image data returned from DALL-E")
+            _set_fallback_reason(span, "empty_response")
+        except (openai.RateLimitError, TimeoutError):
+            print(f"⚠️ OpenAI quota exceeded - using smart fallback images")
+            _set_fallback_reason(span, "rate_limited")
+        except openai.BadRequestError:
+            print(f"⚠️ DALL-E request error (may be content policy) - using smart fallback")
+            _set_fallback_reason(span, "bad_request")
+        except Exception as e:
+            print(f"❌ DALL-E generation failed: {e}")
+            _set_fallback_reason(span, "openai_error")
+        return None
+
+def request_seed(request: Dict[str, Any]) -> Optional[int]:
+    """Optional integer "seed" of a worker request; None means derive it from the product name"""
+    seed = request.get("seed")
+    return None if seed is None else int(seed)
+
+def handle_worker_request(generator: EnhancedGPTSiteGenerator, request: Dict[str, Any],
+                          inline: bool = False) -> Dict[str, Any]:
+    """Run one worker request against a warm generator and build the response
+    
+    With inline (or "inline": true in the request) a generate response also carries the page
+    HTML and its metadata, so the caller does not have to read the stored file back.
+    """
+    request_id = request.get("id")
+    op = request.get("op", "generate")
+    
+    if op == "ping":
+        return {"id": request_id, "success": True, "pid": os.getpid()}
+    
+    if op == "stats":
+        cache = generator.content_cache
+        corpus = get_fallback_corpus()
+        assets = generator.image_assets
+        return {"id": request_id, "success": True, "content_cache": cache.stats() if cache else None,
+                "rate_limits": get_scheduler().stats(), "site_store": get_site_store().usage(),
+                "fallback_corpus": corpus.stats() if corpus else None,
+                "image_assets": assets.stats() if assets else None}
+    
+    if op == "metrics":
+        return {"id": request_id, "success": True, "metrics": get_stage_metrics().render()}
+    
+    if op != "generate":
+        return {"id": request_id, "success": False, "error": f"Unknown op: {op}"}
+    
+    product_name = str(request.get("product_name", "")).strip()
+    if not product_name:
+        return {"id": request_id, "success": False, "error": "product_name is required"}
+    
+    try:
+        with collect_trace() as trace:
+            site = generator.render_site(product_name, request_seed(request))
+            site_file = generator._store_site(site["html"])
+    except Exception as e:
+        return {"id": request_id, "success": False, "error": str(e), "trace": trace.to_dict()}
+    
+    response = {
+        "id": request_id,
+        "success": True,
+        "product_name": product_name,
+        "site_file": site_file,
+        "site_id": os.path.splitext(os.path.basename(site_file))[0],
+        "trace": trace.to_dict()
+    }
+    if inline or request.get("inline"):
+        response.update(html=site["html"], metadata=site["metadata"])
+    return response
+
+def stream_worker_request(generator: EnhancedGPTSiteGenerator, request: Dict[str, Any], write_line) -> None:
+    """Answer a "stream" request with one line per generation event; the last line carries success"""
+    request_id = request.get("id")
+    product_name = str(request.get("product_name", "")).strip()
+    if not product_name:
+        write_line({"id": request_id, "event": "error", "success": False, "error": "product_name is required"})
+        return
+    
+    try:
+        done = None
+        with collect_trace() as trace:
+            for event in generator.generate_website_stream(product_name, request_seed(request)):
+                if event["event"] == "done":
+                    # Sent once the trace is complete
+                    done = event
+                    continue
+                write_line(dict(event, id=request_id))
+        write_line(dict(done, id=request_id, success=True, trace=trace.to_dict()))
+    except Exception as e:
+        write_line({"id": request_id, "event": "error", "success": False, "error": str(e)})
+
+# Result frames for --result-fd: a 4-byte big-endian payload length, then the JSON payload
+RESULT_FRAME_HEADER = struct.Struct(">I")
+
+def write_result_frame(stream, payload: Dict[str, Any]) -> None:
+    """Write one length-prefixed result frame: a 4-byte big-endian length, then that many bytes of JSON"""
+    data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    stream.write(RESULT_FRAME_HEADER.pack(len(data)) + data)
+    stream.flush()
+
+def read_result_frame(stream) -> Optional[Dict[str, Any]]:
+    """Read one frame written by write_result_frame; None at end of stream"""
+    header = stream.read(RESULT_FRAME_HEADER.size)
+    if len(header) < RESULT_FRAME_HEADER.size:
+        return None
+    (length,) = RESULT_FRAME_HEADER.unpack(header)
+    data = stream.read(length)
+    if len(data) < length:
+        raise EOFError(f"Truncated result frame: expected {length} bytes, got {len(data)}")
+    return json.loads(data)
+
+def _pool_generate(request: Dict[str, Any], inline: bool = False) -> Dict[str, Any]:
+    """Answer a generate request in a pool process; the page comes back only when asked for inline"""
+    return handle_worker_request(_process_generator, request, inline)
+
+class GenerationPool:
+    """Generate requests on a pool of processes, each with one warm generator pinned to a CPU
+    
+    Idle processes take the next request from one shared queue, so a slow site never holds up
+    the ones behind it: the balancing work stealing would give, without per-process queues.
+    Only the request and the response cross the process boundary; the page HTML and metadata
+    come back with it only for inline requests. submit() blocks while max_pending requests
+    are in flight, so the server stops reading and the backpressure reaches the client.
+    """
+    
+    def __init__(self, processes: int, max_pending: Optional[int] = None, css_mode: str = CSS_MODE):
+        import multiprocessing
+        self.processes = processes
+        self.max_pending = max_pending or processes * 2
+        self.css_mode = css_mode
+        self.in_flight = 0
+        self.restarts = 0
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        # Spawned rather than forked so pool processes don't inherit the protocol pipes
+        self._context = multiprocessing.get_context("spawn")
+        self._executor = self._start()
+    
+    def _start(self):
+        from concurrent.futures import ProcessPoolExecutor
+        return ProcessPoolExecutor(
+            max_workers=self.processes, mp_context=self._context, initializer=_init_generator_process,
+            initargs=(self.css_mode, self.processes, "interactive", cpu_slot_counter(self.processes, self._context)))
+    
+    def submit(self, request: Dict[str, Any], on_done, inline: bool = False):
+        """Generate in the pool and call on_done(response) from a pool thread; returns a future
+        that completes once on_done has returned"""
+        from concurrent.futures import Future
+        from concurrent.futures.process import BrokenProcessPool
+        
+        self._slots.acquire()
+        answered = Future()
+        try:
+            executor = self._executor
+            try:
+                future = executor.submit(_pool_generate, request, inline)
+            except BrokenProcessPool:
+                with self._lock:
+                    # Another connection's thread may have restarted it already
+                    if self._executor is executor:
+                        print("⚠️ A generation process died - restarting the pool")
+                        self.restarts += 1
+                        self._executor = self._start()
+                    executor = self._executor
+                future = executor.submit(_pool_generate, request, inline)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_flight += 1
+        future.add_done_callback(lambda done: self._answer(done, request, on_done, answered))
+        return answered
+    
+    def _answer(self, future, request: Dict[str, Any], on_done, answered) -> None:
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+        try:
+            response = future.result()
+        except Exception as e:
+            response = {"id": request.get("id"), "success": False, "error": f"Generation process failed: {e}"}
+        else:
+            # Pool processes keep their own metrics; fold their spans into this process's
+            for span in response.get("trace", {}).get("spans", []):
+                get_stage_metrics().observe_dict(span)
+        try:
+            on_done(response)
+        finally:
+            answered.set_result(None)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"processes": self.processes, "max_pending": self.max_pending,
+                    "in_flight": self.in_flight, "restarts": self.restarts}
+    
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+def _serve_lines(generator: EnhancedGPTSiteGenerator, lines, write_line, inline: bool = False,
+                 pool: Optional[GenerationPool] = None) -> None:
+    """Answer newline-delimited JSON requests until the input is exhausted
+    
+    Generate and stream requests run on the pool or on WORKER_THREADS threads and are answered
+    as they finish, possibly out of order, so one slow site never holds up the requests behind
+    it; write_line must be safe to call from several threads. Like the pool, the threads take at
+    most twice their number of requests before reading stops.
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait
+    
+    threads = None
+    if WORKER_THREADS > 0:
+        threads = ThreadPoolExecutor(max_workers=WORKER_THREADS, thread_name_prefix="answer")
+        slots = threading.BoundedSemaphore(WORKER_THREADS * 2)
+    
+    def in_thread(target, *args):
+        slots.acquire()
+        future = threads.submit(target, *args)
+        future.add_done_callback(lambda done: slots.release())
+        return future
+    
+    def generate(request: Dict[str, Any]) -> None:
+        write_line(handle_worker_request(generator, request, inline))
+    
+    answering = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+        except ValueError as e:
+            write_line({"id": None, "success": False, "error": f"Invalid request: {e}"})
+            continue
+        
+        op = request.get("op", "generate")
+        if op == "generate" and pool is not None:
+            answering = [future for future in answering if not future.done()]
+            answering.append(pool.submit(request, write_line, inline))
+        elif op in ("stream", "generate") and threads is not None:
+            answering = [future for future in answering if not future.done()]
+            if op == "stream":
+                answering.append(in_thread(stream_worker_request, generator, request, write_line))
+            else:
+                answering.append(in_thread(generate, request))
+        elif op == "stream":
+            stream_worker_request(generator, request, write_line)
+        else:
+            response = handle_worker_request(generator, request, inline)
+            if op == "stats" and pool is not None:
+                response["pool"] = pool.stats()
+            write_line(response)
+    
+    wait(answering)
+    if threads is not None:
+        threads.shutdown()
+
+def start_metrics_server(port: int) -> None:
+    """Serve the stage metrics for Prometheus at http://127.0.0.1:<port>/metrics from a daemon thread"""
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = get_stage_metrics().render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            pass
+    
+    server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"📈 Metrics on http://127.0.0.1:{server.server_address[1]}/metrics")
+
+def serve(socket_path: Optional[str] = None, metrics_port: int = WORKER_METRICS_PORT,
+          result_fd: Optional[int] = None, processes: int = WORKER_PROCESSES) -> None:
+    """Keep one warm generator alive and serve generations over stdio or a Unix socket
+    
+    With result_fd, responses go out as length-prefixed frames on that file descriptor, with the
+    page HTML and metadata inline, instead of as JSON lines on stdout. With processes, generate
+    requests run concurrently on a GenerationPool of that size.
+    """
+    # stdout carries the protocol, so every log line goes to stderr instead
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+    
+    generator = EnhancedGPTSiteGenerator()
+    if metrics_port:
+        start_metrics_server(metrics_port)
+    pool = GenerationPool(processes) if processes > 0 else None
+    if pool is not None:
+        print(f"🧵 Generating on {processes} processes")
+    try:
+        _serve(generator, protocol_out, socket_path, result_fd, pool)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+def _serve(generator: EnhancedGPTSiteGenerator, protocol_out, socket_path: Optional[str],
+           result_fd: Optional[int], pool: Optional[GenerationPool]) -> None:
+    """serve() once the generator (and pool) are ready"""
+    # Answers arrive on pool and answer threads, so writes are serialized
+    write_lock = threading.Lock()
+    
+    if socket_path:
+        import socketserver
+        
+        class WorkerRequestHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                def write_line(response: Dict[str, Any]) -> None:
+                    data = (json.dumps(response) + "\n").encode("utf-8")
+                    with write_lock:
+                        self.wfile.write(data)
+                        self.wfile.flush()
+                
+                lines = (raw.decode("utf-8", errors="replace") for raw in self.rfile)
+                _serve_lines(generator, lines, write_line, pool=pool)
+        
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        
+        server = socketserver.ThreadingUnixStreamServer(socket_path, WorkerRequestHandler)
+        server.daemon_threads = True
+        print(f"🚀 Generator worker listening on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+        return
+    
+    if result_fd is not None:
+        results = os.fdopen(result_fd, 'wb')
+        
+        def write_frame(response: Dict[str, Any]) -> None:
+            with write_lock:
+                write_result_frame(results, response)
+        
+        print(f"🚀 Generator worker ready on stdin, results on fd {result_fd}")
+        _serve_lines(generator, sys.stdin, write_frame, inline=True, pool=pool)
+        return
+    
+    def write_line(response: Dict[str, Any]) -> None:
+        with write_lock:
+            protocol_out.write(json.dumps(response) + "\n")
+            protocol_out.flush()
+    
+    print("🚀 Generator worker ready on stdin/stdout")
+    _serve_lines(generator, sys.stdin, write_line, pool=pool)
+
+def site_slug(product_name: str) -> str:
+    """Directory name for a product, matching the generated_sites/ layout"""
+    slug = re.sub(r'[^a-z0-9_\-]', '', normalize_product_name(product_name).replace(' ', '_'))
+    return slug or "_"
+
+def read_batch_products(path: str):
+    """Yield product names from a JSONL file of objects, JSON strings or plain lines"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                item = line
+            if isinstance(item, dict):
+                item = item.get("product_name") or item.get("name") or ""
+            name = str(item).strip()
+            if name:
+                yield name
+
+BATCH_STATUS_FILE = "batch_status.jsonl"
+
+# Append-only index of the sites in a generated_sites/ directory, one JSON line per write;
+# the latest line for a name wins. The Go backend lists sites from it instead of scanning
+SITE_MANIFEST_FILE = "manifest.jsonl"
+
+def site_manifest_entry(slug: str, metadata: Dict[str, Any], size: int) -> Dict[str, Any]:
+    """Manifest line for a site written to <dir>/<slug>/"""
+    return {
+        "name": slug,
+        "product_name": metadata.get("name", ""),
+        "category": metadata.get("category"),
+        "generated_at": metadata.get("generated_at"),
+        "theme": metadata.get("theme"),
+        "size": size,
+        "generation_method": metadata.get("generation_method")
+    }
+
+def append_site_manifest(sites_dir: str, entries: List[Dict[str, Any]]) -> None:
+    """Append entries to the directory's manifest in one write"""
+    if not entries:
+        return
+    data = "".join(json.dumps(entry) + "\n" for entry in entries)
+    with open(os.path.join(sites_dir, SITE_MANIFEST_FILE), 'a', encoding='utf-8') as f:
+        f.write(data)
+
+def rebuild_site_manifest(sites_dir: str = GENERATED_SITES_DIR) -> int:
+    """Rewrite the manifest from every <slug>/metadata.json, dropping superseded lines"""
+    entries = []
+    for slug in sorted(os.listdir(sites_dir)):
+        site_dir = os.path.join(sites_dir, slug)
+        try:
+            size = os.path.getsize(os.path.join(site_dir, "index.html"))
+        except OSError:
+            continue
+        try:
+            with open(os.path.join(site_dir, "metadata.json"), 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            metadata = {}
+        entries.append(site_manifest_entry(slug, metadata, size))
+    _write_file_atomic(os.path.join(sites_dir, SITE_MANIFEST_FILE),
+                       "".join(json.dumps(entry) + "\n" for entry in entries))
+    return len(entries)
+
+def build_fallback_corpus(product_paths: Optional[List[str]] = None, path: str = FALLBACK_CORPUS_PATH,
+                          css_mode: str = CSS_MODE) -> int:
+    """Pre-render the offline page of every listed product into a fresh corpus; returns the page count
+    
+    Products come from the JSONL files in product_paths (default: the generated_sites/ manifest).
+    The corpus at path is replaced atomically, so running workers keep their open copy.
+    """
+    # Corpus pages must be exactly what offline generation renders, DALL-E images included
+    os.environ.pop('OPENAI_API_KEY', None)
+    generator = EnhancedGPTSiteGenerator()
+    generator.content_cache = None
+    generator.use_fallback_corpus = False
+    # Image assets are applied when a corpus page is served, not baked into it
+    generator.image_assets = None
+    generator.css_mode = css_mode
+    variant = generator._page_variant()
+    
+    if not product_paths:
+        product_paths = [os.path.join(GENERATED_SITES_DIR, SITE_MANIFEST_FILE)]
+    
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.unlink(tmp_path)
+    corpus = FallbackCorpus(tmp_path, writable=True)
+    keys = set()
+    try:
+        for product_path in product_paths:
+            for product_name in read_batch_products(product_path):
+                seed = site_seed(product_name)
+                key = FallbackCorpus.key(product_name, seed, variant)
+                if key in keys:
+                    continue
+                keys.add(key)
+                site = generator.render_site(product_name, seed)
+                corpus.put(key, site["html"], site["metadata"])
+        corpus.commit()
+    finally:
+        corpus.close()
+    os.replace(tmp_path, path)
+    return len(keys)
+
+_process_generator = None
+
+def cpu_slot_counter(workers: int, context: Any = None) -> Any:
+    """Shared counter handing each pool process its own CPU; None if pinning is off or would oversubscribe"""
+    if not PIN_WORKER_CPUS or not hasattr(os, "sched_setaffinity") or workers > len(os.sched_getaffinity(0)):
+        return None
+    if context is None:
+        import multiprocessing as context
+    return context.Value('i', 0)
+
+def _pin_to_cpu(cpu_slots: Any) -> None:
+    """Pin this process to the next CPU, round-robin over the CPUs it may run on"""
+    if cpu_slots is None:
+        return
+    cpus = sorted(os.sched_getaffinity(0))
+    with cpu_slots.get_lock():
+        slot = cpu_slots.value
+        cpu_slots.value += 1
+    os.sched_setaffinity(0, {cpus[slot % len(cpus)]})
+
+def _exit_with_parent() -> None:
+    """Exit as soon as the parent process dies, even when it is killed without shutting the pool down"""
+    import multiprocessing
+    from multiprocessing.connection import wait
+    
+    parent = multiprocessing.parent_process()
+    if parent is None or parent.sentinel is None:
+        return
+    
+    def watch():
+        wait([parent.sentinel])
+        os._exit(1)
+    
+    threading.Thread(target=watch, name="parent-watch", daemon=True).start()
+
+def _init_generator_process(css_mode: str = CSS_MODE, workers: int = 1, priority: str = "batch",
+                            cpu_slots: Any = None, asset_dir: Optional[str] = None,
+                            theme_css_dir: Optional[str] = None) -> None:
+    """Build one warm generator per pool process, writing image assets to asset_dir and theme
+    stylesheets to theme_css_dir if given"""
+    global _process_generator
+    # Worker logs would interleave with the per-item status lines on stdout
+    sys.stdout = sys.stderr
+    _pin_to_cpu(cpu_slots)
+    _exit_with_parent()
+    _process_generator = EnhancedGPTSiteGenerator()
+    _process_generator.css_mode = css_mode
+    _process_generator.priority = priority
+    if asset_dir:
+        # Sites live next to asset_dir, in <out>/<slug>/
+        _process_generator.image_assets = ImageAssets(asset_dir, f"../{IMAGE_ASSET_DIRNAME}/")
+    if theme_css_dir:
+        # Same layout as the image assets
+        _process_generator.theme_css_dir = theme_css_dir
+        _process_generator.theme_css_base_url = f"../{THEME_CSS_DIRNAME}/"
+    # Every worker process draws on the same API key, so each gets its share of the budgets
+    get_scheduler().scale(1.0 / max(1, workers))
+
+def _generate_batch_item(product_name: str, out_dir: str) -> Dict[str, Any]:
+    """Generate one batch site into out_dir/<slug>/ and return its status record"""
+    started = time.time()
+    slug = site_slug(product_name)
+    record = {"product_name": product_name, "slug": slug}
+    try:
+        with collect_trace() as trace:
+            site = _process_generator.render_site(product_name)
+            site_dir = os.path.join(out_dir, slug)
+            with stage_span("write"):
+                os.makedirs(site_dir, exist_ok=True)
+                _write_file_atomic(os.path.join(site_dir, "metadata.json"), json.dumps(site["metadata"], indent=2))
+                _write_file_atomic(os.path.join(site_dir, "index.html"), site["html"])
+        record.update(status="ok", path=os.path.join(site_dir, "index.html"), timings=trace.stage_totals())
+        # Handed back to the parent, the manifest's only writer
+        record["manifest"] = site_manifest_entry(slug, site["metadata"], len(site["html"].encode("utf-8")))
+    except Exception as e:
+        record.update(status="error", error=str(e))
+    record["elapsed_ms"] = round((time.time() - started) * 1000, 1)
+    return record
+
+def _completed_batch_items(status_path: str) -> set:
+    """Normalized names already generated successfully by an earlier run"""
+    done = set()
+    if not os.path.exists(status_path):
+        return done
+    with open(status_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("status") == "ok":
+                done.add(normalize_product_name(record.get("product_name", "")))
+    return done
+
+def run_batch(input_path: str, out_dir: str, workers: int = 4, css_mode: str = CSS_MODE,
+              image_assets: bool = IMAGE_ASSETS_ENABLED) -> Dict[str, int]:
+    """Generate sites for every product in input_path across worker processes, resuming earlier runs
+    
+    With image_assets, page images are written as local variants to <out>/_assets/.
+    """
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    
+    os.makedirs(out_dir, exist_ok=True)
+    asset_dir = os.path.join(out_dir, IMAGE_ASSET_DIRNAME) if image_assets else None
+    theme_css_dir = os.path.join(out_dir, THEME_CSS_DIRNAME)
+    status_path = os.path.join(out_dir, BATCH_STATUS_FILE)
+    completed = _completed_batch_items(status_path)
+    totals = {"ok": 0, "error": 0, "skipped": 0}
+    
+    # Only keep a small window of work queued so huge catalogs stream through in constant memory
+    max_pending = max(1, workers) * 2
+    pending = set()
+    
+    with open(status_path, 'a', encoding='utf-8') as status_file, \
+            ProcessPoolExecutor(max_workers=max(1, workers), initializer=_init_generator_process,
+                                initargs=(css_mode, workers, "batch", cpu_slot_counter(workers), asset_dir,
+                                          theme_css_dir)) as executor:
+        
+        def drain(return_when) -> None:
+            nonlocal pending
+            done, pending = wait(pending, return_when=return_when)
+            entries = []
+            for future in done:
+                record = future.result()
+                if "manifest" in record:
+                    entries.append(record.pop("manifest"))
+                totals[record["status"]] += 1
+                line = json.dumps(record)
+                status_file.write(line + "\n")
+                status_file.flush()
+                print(line, flush=True)
+            append_site_manifest(out_dir, entries)
+        
+        for product_name in read_batch_products(input_path):
+            key = normalize_product_name(product_name)
+            if key in completed:
+                totals["skipped"] += 1
+                continue
+            completed.add(key)
+            
+            pending.add(executor.submit(_generate_batch_item, product_name, out_dir))
+            if len(pending) >= max_pending:
+                drain(FIRST_COMPLETED)
+        
+        while pending:
+            drain(FIRST_COMPLETED)
+    
+    return totals
+
+def profile_startup(top: int = 15) -> Dict[str, float]:
+    """Time a fresh interpreter importing this module and building a generator, -X importtime style"""
+    import subprocess
+    
+    script = (
+        "import time, json; started = time.perf_counter()\n"
+        "import gpt_site_generator\n"
+        "imported = time.perf_counter()\n"
+        "gpt_site_generator.EnhancedGPTSiteGenerator()\n"
+        "print('STARTUP:' + json.dumps({'import_ms': (imported - started) * 1000,"
+        " 'init_ms': (time.perf_counter() - imported) * 1000}))\n"
+    )
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", script],
+                            capture_output=True, text=True, env=env)
+    
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((int(cumulative_us), int(self_us), name.rstrip()))
+    timings = json.loads(result.stdout.rsplit("STARTUP:", 1)[1]) if "STARTUP:" in result.stdout else {}
+    
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative_us, self_us, name in sorted(modules, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+    if timings:
+        print(f"\nimport gpt_site_generator: {timings['import_ms']:.1f} ms, "
+              f"EnhancedGPTSiteGenerator(): {timings['init_ms']:.1f} ms")
+    return timings
+
 def main():
-    if len(sys.argv) < 2:
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Enhanced GPT-Powered Dynamic Site Generator")
+    parser.add_argument("product_name", nargs="?", help="Product name to generate a website for")
+    parser.add_argument("--serve", action="store_true",
+                        help="Run as a long-lived worker speaking newline-delimited JSON on stdin/stdout")
+    parser.add_argument("--socket", metavar="PATH",
+                        help="With --serve, listen on a Unix socket instead of stdin/stdout")
+    parser.add_argument("--metrics-port", type=int, default=WORKER_METRICS_PORT, metavar="PORT",
+                        help="With --serve, expose Prometheus stage metrics on 127.0.0.1:PORT/metrics")
+    parser.add_argument("--result-fd", type=int, metavar="FD",
+                        help="Write results as length-prefixed JSON frames (HTML inline) to file descriptor FD; "
+                             "logs go to stderr")
+    parser.add_argument("--processes", type=int, default=WORKER_PROCESSES, metavar="N",
+                        help="With --serve, generate on N worker processes (one warm generator per CPU)")
+    parser.add_argument("--batch", metavar="PRODUCTS_JSONL",
+                        help="Generate a site for every product name in a JSONL file")
+    parser.add_argument("--out", metavar="DIR", default="generated_sites",
+                        help="With --batch, directory that receives <slug>/index.html and metadata.json")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4,
+                        help="With --batch, number of worker processes")
+    parser.add_argument("--css-mode", choices=["inline", "external"], default=CSS_MODE,
+                        help="With --batch or --build-fallback-corpus, inline theme CSS in every page or link "
+                             "shared theme stylesheets")
+    parser.add_argument("--image-assets", action="store_true", default=IMAGE_ASSETS_ENABLED,
+                        help="With --batch, write resized WebP/AVIF copies of every page image to <out>/_assets/ "
+                             "and link those instead of the remote URLs (needs Pillow)")
+    parser.add_argument("--train-categorizer", metavar="PRODUCTS_JSONL", nargs="*",
+                        help="Train the local categorizer from generated_sites/ plus optional product lists")
+    parser.add_argument("--reindex", metavar="DIR", nargs="?", const=GENERATED_SITES_DIR,
+                        help="Rebuild DIR/manifest.jsonl (default generated_sites/) from each site's metadata.json")
+    parser.add_argument("--build-fallback-corpus", metavar="PRODUCTS_JSONL", nargs="*",
+                        help="Pre-render offline pages for these products (default: generated_sites/manifest.jsonl) "
+                             "into FALLBACK_CORPUS_PATH")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Report per-module import times and time-to-ready for a fresh process")
+    args = parser.parse_args()
+    
+    if args.profile_startup:
+        profile_startup()
+        return
+    
+    if args.reindex:
+        count = rebuild_site_manifest(args.reindex)
+        print(f"✅ Indexed {count} sites in {os.path.join(args.reindex, SITE_MANIFEST_FILE)}")
+        return
+    
+    if args.build_fallback_corpus is not None:
+        count = build_fallback_corpus(args.build_fallback_corpus, css_mode=args.css_mode)
+        print(f"✅ Pre-rendered {count} fallback pages into {FALLBACK_CORPUS_PATH}")
+        return
+    
+    if args.train_categorizer is not None:
+        train_local_categorizer(extra_paths=args.train_categorizer)
+        return
+    
+    if args.serve:
+        serve(args.socket, args.metrics_port, args.result_fd, args.processes)
+        return
+    
+    if args.batch:
+        totals = run_batch(args.batch, args.out, args.workers, args.css_mode, args.image_assets)
+        print(f"✅ Batch finished: {totals['ok']} generated, {totals['error']} failed, "
+              f"{totals['skipped']} already done", file=sys.stderr)
+        sys.exit(1 if totals["error"] else 0)
+    
+    if not args.product_name:
         print("Usage: python3 gpt_site_generator.py 'Product Name'")
         sys.exit(1)
     
-    product_name = sys.argv[1]
+    product_name = args.product_name
+    
+    if args.result_fd is not None:
+        sys.stdout = sys.stderr
+        response = handle_worker_request(EnhancedGPTSiteGenerator(), {"product_name": product_name}, inline=True)
+        with os.fdopen(args.result_fd, 'wb') as results:
+            write_result_frame(results, response)
+        sys.exit(0 if response["success"] else 1)
+    
     generator = EnhancedGPTSiteGenerator()
     
     try:
@@ -0,0 +1,303 @@
+package handlers
+
+import (
+	"bufio"
+	"encoding/binary"
+	"encoding/json"
+	"fmt"
+	"io"
+	"os"
+	"os/exec"
+	"strconv"
+	"sync"
+	"time"
+)
+
+const (
+	generatorPythonPath = "/home/abhisheksoni/shiprocket-ai-hackathon-1/langchain_env/bin/python3"
+	generatorScriptPath = "/home/abhisheksoni/shiprocket-ai-hackathon-1/gpt_site_generator.py"
+	generatorWorkDir    = "/home/abhisheksoni/shiprocket-ai-hackathon-1"
+	generatorPythonLib  = "/home/abhisheksoni/shiprocket-ai-hackathon-1/langchain_env/lib/python3.11/site-packages"
+
+	// generatorTimeout bounds how long a single call waits for its answer
+	generatorTimeout = 3 * time.Minute
+
+	// maxResultFrame bounds one result frame from the worker; larger frames mean a corrupt stream
+	maxResultFrame = 64 << 20
+)
+
+// workerRequest is one newline-delimited JSON request sent to the Python worker
+type workerRequest struct {
+	ID          string `json:"id"`
+	Op          string `json:"op"`
+	ProductName string `json:"product_name,omitempty"`
+}
+
+// workerResponse is one newline-delimited JSON response read from the Python worker
+type workerResponse struct {
+	ID          string `json:"id"`
+	Success     bool   `json:"success"`
+	ProductName string `json:"product_name"`
+	SiteFile    string `json:"site_file"`
+	SiteID      string `json:"site_id"`
+	Error       string `json:"error"`
+	// HTML and Metadata come inline with every generation, so the page is never read back from disk
+	HTML     string          `json:"html"`
+	Metadata json.RawMessage `json:"metadata,omitempty"`
+	// Trace holds per-stage timings (categorize, content, image, render, write)
+	Trace json.RawMessage `json:"trace,omitempty"`
+	// Metrics is the worker's Prometheus text exposition, for the "metrics" op
+	Metrics string `json:"metrics,omitempty"`
+}
+
+// GeneratorWorker keeps one long-lived `gpt_site_generator.py --serve` process
+// warm so requests don't pay for interpreter start-up and imports every time.
+// Calls are multiplexed by request ID: the worker answers each request on its
+// own thread (or pool process with WORKER_PROCESSES) as soon as it is done, so
+// several sites generate at once and a slow one never holds up the rest.
+type GeneratorWorker struct {
+	mu sync.Mutex
+	// writeMu serializes requests written to stdin
+	writeMu sync.Mutex
+	cmd     *exec.Cmd
+	stdin   io.WriteCloser
+	results *os.File
+	pending map[string]*pendingCall
+	nextID  int
+}
+
+// pendingCall routes the frames answering one request to the call waiting for them
+type pendingCall struct {
+	frames chan []byte
+	// done is closed when the caller stops listening
+	done chan struct{}
+}
+
+// defaultWorker is shared by all site generation handlers
+var defaultWorker = &GeneratorWorker{}
+
+// start launches the Python worker process; the caller must hold w.mu.
+// Results come back as length-prefixed JSON frames on a dedicated pipe (fd 3
+// in the worker), so log lines on the worker's stdout and stderr can never be
+// mistaken for results.
+func (w *GeneratorWorker) start() error {
+	results, resultsWriter, err := os.Pipe()
+	if err != nil {
+		return err
+	}
+	cmd := exec.Command(generatorPythonPath, generatorScriptPath, "--serve", "--result-fd", "3")
+	cmd.Dir = generatorWorkDir
+	cmd.Env = append(os.Environ(), "PYTHONPATH="+generatorPythonLib)
+	cmd.ExtraFiles = []*os.File{resultsWriter}
+	// Worker logs go to stderr
+	cmd.Stdout = os.Stderr
+	cmd.Stderr = os.Stderr
+
+	stdin, err := cmd.StdinPipe()
+	if err != nil {
+		results.Close()
+		resultsWriter.Close()
+		return err
+	}
+	err = cmd.Start()
+	// The worker holds its own copy; closing ours lets reads see EOF when it exits
+	resultsWriter.Close()
+	if err != nil {
+		results.Close()
+		return err
+	}
+
+	w.cmd = cmd
+	w.stdin = stdin
+	w.results = results
+	w.pending = map[string]*pendingCall{}
+	go w.readFrames(bufio.NewReaderSize(results, 64<<10), cmd, w.pending)
+	fmt.Printf("Started generator worker (pid %d)\n", cmd.Process.Pid)
+	return nil
+}
+
+// stop kills the Python worker process; the caller must hold w.mu
+func (w *GeneratorWorker) stop() {
+	if w.cmd == nil {
+		return
+	}
+	w.stdin.Close()
+	w.cmd.Process.Kill()
+	w.cmd.Wait()
+	w.results.Close()
+	w.cmd = nil
+	w.stdin = nil
+	w.results = nil
+	w.pending = nil
+}
+
+// readFrames hands every result frame to the call waiting for its ID until
+// the worker's result pipe closes, then ends the calls still waiting and stops
+// the process, so the next call starts a new one. cmd and pending are the
+// worker process this reader belongs to and its calls.
+func (w *GeneratorWorker) readFrames(frames io.Reader, cmd *exec.Cmd, pending map[string]*pendingCall) {
+	for {
+		frame, err := readFrame(frames)
+		if err != nil {
+			break
+		}
+		var envelope struct {
+			ID string `json:"id"`
+		}
+		if err := json.Unmarshal(frame, &envelope); err != nil {
+			continue
+		}
+		w.mu.Lock()
+		call, ok := pending[envelope.ID]
+		w.mu.Unlock()
+		// Answers to calls that timed out are dropped
+		if !ok {
+			continue
+		}
+		select {
+		case call.frames <- frame:
+		case <-call.done:
+		}
+	}
+
+	w.mu.Lock()
+	for id, call := range pending {
+		close(call.frames)
+		delete(pending, id)
+	}
+	if w.cmd == cmd {
+		w.stop()
+	}
+	w.mu.Unlock()
+}
+
+// readFrame reads one result frame: a 4-byte big-endian length, then that many bytes of JSON
+func readFrame(r io.Reader) ([]byte, error) {
+	var header [4]byte
+	if _, err := io.ReadFull(r, header[:]); err != nil {
+		return nil, err
+	}
+	length := binary.BigEndian.Uint32(header[:])
+	if length > maxResultFrame {
+		return nil, fmt.Errorf("result frame of %d bytes exceeds %d", length, maxResultFrame)
+	}
+	frame := make([]byte, length)
+	if _, err := io.ReadFull(r, frame); err != nil {
+		return nil, err
+	}
+	return frame, nil
+}
+
+// call sends one request to the worker and passes every response frame for it
+// to onFrame until onFrame reports the exchange is complete. A failure or a
+// timeout only gives up on this request: its late answers are dropped and the
+// worker keeps serving the others. The worker is only replaced once it has
+// died, which readFrames notices.
+func (w *GeneratorWorker) call(req workerRequest, onFrame func(frame []byte) (bool, error)) error {
+	w.mu.Lock()
+	if w.cmd == nil {
+		if err := w.start(); err != nil {
+			w.mu.Unlock()
+			return fmt.Errorf("failed to start generator worker: %v", err)
+		}
+	}
+
+	w.nextID++
+	req.ID = strconv.Itoa(w.nextID)
+	payload, err := json.Marshal(req)
+	if err != nil {
+		w.mu.Unlock()
+		return err
+	}
+	stdin, pending := w.stdin, w.pending
+	call := &pendingCall{frames: make(chan []byte, 64), done: make(chan struct{})}
+	pending[req.ID] = call
+	w.mu.Unlock()
+
+	defer func() {
+		close(call.done)
+		w.mu.Lock()
+		delete(pending, req.ID)
+		w.mu.Unlock()
+	}()
+
+	// A busy worker stops reading requests (backpressure), so the write may
+	// block; w.mu stays free meanwhile so results keep being delivered
+	w.writeMu.Lock()
+	_, err = stdin.Write(append(payload, '\n'))
+	w.writeMu.Unlock()
+	if err != nil {
+		return fmt.Errorf("generator worker unavailable: %v", err)
+	}
+
+	timeout := time.NewTimer(generatorTimeout)
+	defer timeout.Stop()
+	for {
+		select {
+		case frame, ok := <-call.frames:
+			if !ok {
+				return fmt.Errorf("generator worker exited")
+			}
+			finished, err := onFrame(frame)
+			if err != nil {
+				return err
+			}
+			if finished {
+				return nil
+			}
+		case <-timeout.C:
+			return fmt.Errorf("generator worker timed out after %s", generatorTimeout)
+		}
+	}
+}
+
+// Generate asks the worker to build a site for productName
+func (w *GeneratorWorker) Generate(productName string) (*workerResponse, error) {
+	var resp workerResponse
+	err := w.call(workerRequest{Op: "generate", ProductName: productName}, func(frame []byte) (bool, error) {
+		return true, json.Unmarshal(frame, &resp)
+	})
+	if err != nil {
+		return nil, err
+	}
+	return &resp, nil
+}
+
+// Metrics returns the worker's per-stage metrics in Prometheus text format
+func (w *GeneratorWorker) Metrics() (string, error) {
+	var resp workerResponse
+	err := w.call(workerRequest{Op: "metrics"}, func(frame []byte) (bool, error) {
+		return true, json.Unmarshal(frame, &resp)
+	})
+	if err != nil {
+		return "", err
+	}
+	if !resp.Success {
+		return "", fmt.Errorf("metrics failed: %s", resp.Error)
+	}
+	return resp.Metrics, nil
+}
+
+// GenerateStream asks the worker to build a site for productName and calls
+// onEvent for every progress event (meta, section, image) up to and including
+// the final "done" or "error" event.
+// If onEvent fails (for example the client went away) the remaining events
+// are drained so the worker stays usable, and that error is returned.
+func (w *GeneratorWorker) GenerateStream(productName string, onEvent func(event map[string]interface{}) error) error {
+	var eventErr error
+	err := w.call(workerRequest{Op: "stream", ProductName: productName}, func(frame []byte) (bool, error) {
+		var event map[string]interface{}
+		if err := json.Unmarshal(frame, &event); err != nil {
+			return false, nil
+		}
+		_, final := event["success"]
+		if eventErr == nil {
+			eventErr = onEvent(event)
+		}
+		return final, nil
+	})
+	if err != nil {
+		return err
+	}
+	return eventErr
+}
@@ -3,13 +3,13 @@ package handlers
 import (
 	"encoding/json"
 	"fmt"
-	"io/ioutil"
 	"net/http"
 	"os"
-	"os/exec"
 	"path/filepath"
 	"regexp"
+	"strconv"
 	"strings"
+	"sync"
 	"time"
 
 	"github.com/gorilla/mux"
@@ -29,15 +29,27 @@ type GenerateSiteResponse struct {
 	Message     string `json:"message"`
 	GeneratedAt string `json:"generated_at"`
 	Theme       string `json:"theme"`
+	// Trace carries the worker's per-stage timings for this generation
+	Trace json.RawMessage `json:"trace,omitempty"`
 }
 
-// ListSitesResponse represents the response for listing generated sites
+// ListSitesResponse represents one page of the generated sites listing.
+// Sites keeps the plain site names; Items carries the indexed details.
 type ListSitesResponse struct {
-	Success bool     `json:"success"`
-	Sites   []string `json:"sites"`
-	Count   int      `json:"count"`
+	Success bool             `json:"success"`
+	Sites   []string         `json:"sites"`
+	Count   int              `json:"count"`
+	Items   []siteIndexEntry `json:"items"`
+	Total   int              `json:"total"`
+	Page    int              `json:"page"`
+	PerPage int              `json:"per_page"`
 }
 
+const (
+	defaultSitesPerPage = 100
+	maxSitesPerPage     = 1000
+)
+
 // Helper function to parse JSON from request
 func parseJSON(r *http.Request, target interface{}) error {
 	return json.NewDecoder(r.Body).Decode(target)
@@ -90,20 +102,10 @@ func GenerateSiteHandler(w http.ResponseWriter, r *http.Request) {
 		return
 	}
 
-	// Execute Enhanced GPT Python script
-	pythonPath := "/home/abhisheksoni/shiprocket-ai-hackathon-1/langchain_env/bin/python3"
-	scriptPath := "/home/abhisheksoni/shiprocket-ai-hackathon-1/gpt_site_generator.py"
-	cmd := exec.Command(pythonPath, scriptPath, cleanedProductName)
-
-	// Set working directory and environment
-	cmd.Dir = "/home/abhisheksoni/shiprocket-ai-hackathon-1"
-	cmd.Env = append(os.Environ(),
-		"PYTHONPATH=/home/abhisheksoni/shiprocket-ai-hackathon-1/langchain_env/lib/python3.11/site-packages",
-	)
-
-	output, err := cmd.CombinedOutput()
+	// Generate the site on the long-lived Python worker
+	result, err := defaultWorker.Generate(cleanedProductName)
 	if err != nil {
-		fmt.Printf("Error executing Python script: %v\nOutput: %s\n", err, string(output))
+		fmt.Printf("Error running generator worker: %v\n", err)
 		respondJSON(w, GenerateSiteResponse{
 			Success:     false,
 			ProductName: productName,
@@ -113,65 +115,22 @@ func GenerateSiteHandler(w http.ResponseWriter, r *http.Request) {
 		return
 	}
 
-	outputStr := strings.TrimSpace(string(output))
-	fmt.Printf("Enhanced generator output: %s\n", outputStr)
-
-	// Look for SUCCESS or ERROR in the output
-	lines := strings.Split(outputStr, "\n")
-	var resultLine string
-	for _, line := range lines {
-		if strings.HasPrefix(line, "SUCCESS:") || strings.HasPrefix(line, "ERROR:") {
-			resultLine = line
-			break
-		}
-	}
-
-	if resultLine == "" {
-		respondJSON(w, GenerateSiteResponse{
-			Success:     false,
-			ProductName: productName,
-			Message:     "No valid result found in generator output",
-			GeneratedAt: time.Now().Format(time.RFC3339),
-		})
-		return
-	}
-
-	if strings.HasPrefix(resultLine, "SUCCESS:") {
-		tempFilePath := strings.TrimPrefix(resultLine, "SUCCESS:")
-
-		// Read the temporary file content
-		content, err := ioutil.ReadFile(tempFilePath)
-		if err != nil {
-			respondJSON(w, GenerateSiteResponse{
-				Success:     false,
-				ProductName: productName,
-				Message:     fmt.Sprintf("Failed to read generated site: %v", err),
-				GeneratedAt: time.Now().Format(time.RFC3339),
-			})
-			return
-		}
-
-		// Extract site ID from file path
-		siteID := filepath.Base(tempFilePath)
-		siteID = strings.TrimSuffix(siteID, ".html")
-
-		// Clean up temporary file after reading
-		go func() {
-			time.Sleep(30 * time.Second) // Keep file for 30 seconds for any immediate requests
-			os.Remove(tempFilePath)
-		}()
+	if result.Success {
+		// Sites stay in the generator's site store, retrievable by ID via /api/sites/{siteId}
+		siteID := result.SiteID
 
 		respondJSON(w, GenerateSiteResponse{
 			Success:     true,
 			ProductName: productName,
-			SiteContent: string(content),
+			SiteContent: result.HTML,
 			SiteID:      siteID,
 			Message:     "Enhanced AI-powered website generated successfully with dynamic themes and product images",
 			GeneratedAt: time.Now().Format(time.RFC3339),
 			Theme:       "dynamic", // Indicates theme was randomly selected
+			Trace:       result.Trace,
 		})
-	} else if strings.HasPrefix(resultLine, "ERROR:") {
-		errorMsg := strings.TrimPrefix(resultLine, "ERROR:")
+	} else {
+		errorMsg := result.Error
 		respondJSON(w, GenerateSiteResponse{
 			Success:     false,
 			ProductName: productName,
@@ -181,6 +140,74 @@ func GenerateSiteHandler(w http.ResponseWriter, r *http.Request) {
 	}
 }
 
+// GenerateSiteStreamHandler streams a website generation as Server-Sent Events.
+// Sections are sent as soon as the content is ready (with placeholder images),
+// then one "image" event per hero/catalog image, then a final "done" event.
+func GenerateSiteStreamHandler(w http.ResponseWriter, r *http.Request) {
+	// Set CORS headers
+	w.Header().Set("Access-Control-Allow-Origin", "*")
+	w.Header().Set("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+	w.Header().Set("Access-Control-Allow-Headers", "Content-Type")
+
+	if r.Method == "OPTIONS" {
+		w.WriteHeader(http.StatusOK)
+		return
+	}
+
+	// EventSource can only GET, so accept the product name as a query parameter too
+	productName := r.FormValue("product_name")
+	if productName == "" && r.Method == "POST" {
+		var req GenerateSiteRequest
+		if err := parseJSON(r, &req); err == nil {
+			productName = req.ProductName
+		}
+	}
+
+	cleanedProductName := regexp.MustCompile(`[^a-zA-Z0-9\s\-_]`).ReplaceAllString(productName, "")
+	if strings.TrimSpace(cleanedProductName) == "" {
+		http.Error(w, "Product name is required", http.StatusBadRequest)
+		return
+	}
+
+	flusher, ok := w.(http.Flusher)
+	if !ok {
+		http.Error(w, "Streaming not supported", http.StatusInternalServerError)
+		return
+	}
+
+	w.Header().Set("Content-Type", "text/event-stream")
+	w.Header().Set("Cache-Control", "no-cache")
+	w.Header().Set("Connection", "keep-alive")
+	w.WriteHeader(http.StatusOK)
+	flusher.Flush()
+
+	writeEvent := func(name string, data interface{}) error {
+		payload, err := json.Marshal(data)
+		if err != nil {
+			return err
+		}
+		if _, err := fmt.Fprintf(w, "event: %s\ndata: %s\n\n", name, payload); err != nil {
+			return err
+		}
+		flusher.Flush()
+		return nil
+	}
+
+	err := defaultWorker.GenerateStream(cleanedProductName, func(event map[string]interface{}) error {
+		name, _ := event["event"].(string)
+		delete(event, "id")
+		// The page has been fully streamed already; only the site ID is useful to the client
+		delete(event, "site_file")
+		if err := r.Context().Err(); err != nil {
+			return err
+		}
+		return writeEvent(name, event)
+	})
+	if err != nil && r.Context().Err() == nil {
+		writeEvent("error", map[string]interface{}{"success": false, "error": err.Error()})
+	}
+}
+
 // ListSitesHandler lists all generated websites
 func ListSitesHandler(w http.ResponseWriter, r *http.Request) {
 	// Set CORS headers
@@ -198,9 +225,19 @@ func ListSitesHandler(w http.ResponseWriter, r *http.Request) {
 		return
 	}
 
-	sitesDir := "generated_sites"
+	params := r.URL.Query()
+	query := siteListQuery{
+		Category:         params.Get("category"),
+		Theme:            params.Get("theme"),
+		GenerationMethod: params.Get("generation_method"),
+		Search:           params.Get("q"),
+		Sort:             params.Get("sort"),
+		Descending:       params.Get("order") == "desc",
+		Page:             queryInt(params.Get("page"), 1, 1, 1<<30),
+		PerPage:          queryInt(params.Get("per_page"), defaultSitesPerPage, 1, maxSitesPerPage),
+	}
 
-	entries, err := os.ReadDir(sitesDir)
+	items, total, err := defaultSiteIndex.List(query)
 	if err != nil {
 		respondJSON(w, ListSitesResponse{
 			Success: false,
@@ -210,25 +247,39 @@ func ListSitesHandler(w http.ResponseWriter, r *http.Request) {
 		return
 	}
 
-	var sites []string
-	for _, entry := range entries {
-		if entry.IsDir() {
-			// Check if index.html exists
-			indexPath := filepath.Join(sitesDir, entry.Name(), "index.html")
-			if _, err := os.Stat(indexPath); err == nil {
-				sites = append(sites, entry.Name())
-			}
-		}
+	sites := make([]string, len(items))
+	for i, item := range items {
+		sites[i] = item.Name
 	}
 
 	respondJSON(w, ListSitesResponse{
 		Success: true,
 		Sites:   sites,
 		Count:   len(sites),
+		Items:   items,
+		Total:   total,
+		Page:    query.Page,
+		PerPage: query.PerPage,
 	})
 }
 
-// ViewSiteHandler serves site content directly from memory/temporary storage
+// queryInt parses an integer query parameter, clamped to [min, max]
+func queryInt(value string, fallback, min, max int) int {
+	n, err := strconv.Atoi(value)
+	if err != nil {
+		return fallback
+	}
+	if n < min {
+		return min
+	}
+	if n > max {
+		return max
+	}
+	return n
+}
+
+// ViewSiteHandler serves a generated site by its site ID from the site store,
+// or by name from generated_sites/ for batch-generated sites
 func ViewSiteHandler(w http.ResponseWriter, r *http.Request) {
 	// Set CORS headers
 	w.Header().Set("Access-Control-Allow-Origin", "*")
@@ -252,8 +303,24 @@ func ViewSiteHandler(w http.ResponseWriter, r *http.Request) {
 		return
 	}
 
-	// For temporary sites, we'll serve a message indicating the site was temporary
 	w.Header().Set("Content-Type", "text/html; charset=utf-8")
+	if path, ok := storedSitePath(siteID); ok {
+		// Stored sites are named by their content hash, so the ID is a strong ETag
+		w.Header().Set("ETag", `"`+siteID+`"`)
+		w.Header().Set("Cache-Control", "public, max-age=31536000, immutable")
+		http.ServeFile(w, r, path)
+		return
+	}
+	if siteID == filepath.Base(siteID) && !strings.HasPrefix(siteID, ".") {
+		indexPath := filepath.Join("generated_sites", siteID, "index.html")
+		if _, err := os.Stat(indexPath); err == nil {
+			http.ServeFile(w, r, indexPath)
+			return
+		}
+	}
+
+	// Swept from the store (or never existed)
+	w.WriteHeader(http.StatusNotFound)
 	html := `
 <!DOCTYPE html>
 <html>
@@ -303,29 +370,33 @@ func DemoGenerateHandler(w http.ResponseWriter, r *http.Request) {
 		"Wireless Noise-Canceling Headphones",
 	}
 
+	// Requests are in flight together so a worker with --processes generates them in parallel
+	generated := make([]*workerResponse, len(demoProducts))
+	var wg sync.WaitGroup
+	for i, product := range demoProducts {
+		wg.Add(1)
+		go func(i int, product string) {
+			defer wg.Done()
+			if result, err := defaultWorker.Generate(product); err == nil && result.Success {
+				generated[i] = result
+			}
+		}(i, product)
+	}
+	wg.Wait()
+
 	var results []GenerateSiteResponse
 	successCount := 0
 
-	for _, product := range demoProducts {
-		// Create a new request for each demo product
-		pythonPath := "/home/abhisheksoni/shiprocket-ai-hackathon-1/langchain_env/bin/python3"
-		scriptPath := "/home/abhisheksoni/shiprocket-ai-hackathon-1/gpt_site_generator.py"
-		cmd := exec.Command(pythonPath, scriptPath, product)
-		cmd.Dir = "/home/abhisheksoni/shiprocket-ai-hackathon-1"
-
-		output, err := cmd.CombinedOutput()
-
-		if err == nil {
-			outputStr := strings.TrimSpace(string(output))
-			if strings.Contains(outputStr, "SUCCESS:") {
-				successCount++
-				results = append(results, GenerateSiteResponse{
-					Success:     true,
-					ProductName: product,
-					Message:     "Demo site generated successfully",
-					GeneratedAt: time.Now().Format(time.RFC3339),
-				})
-			}
+	for i, result := range generated {
+		if result != nil {
+			successCount++
+			results = append(results, GenerateSiteResponse{
+				Success:     true,
+				ProductName: demoProducts[i],
+				SiteID:      result.SiteID,
+				Message:     "Demo site generated successfully",
+				GeneratedAt: time.Now().Format(time.RFC3339),
+			})
 		}
 	}
 
@@ -338,3 +409,26 @@ func DemoGenerateHandler(w http.ResponseWriter, r *http.Request) {
 
 	respondJSON(w, response)
 }
+
+// ImmutableFileServer serves a directory of content-hashed files (theme
+// stylesheets, image assets), whose names change whenever their content does,
+// so browsers and CDNs may cache them forever
+func ImmutableFileServer(dir string) http.Handler {
+	files := http.FileServer(http.Dir(dir))
+	return http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		w.Header().Set("Cache-Control", "public, max-age=31536000, immutable")
+		files.ServeHTTP(w, r)
+	})
+}
+
+// MetricsHandler exposes the generator worker's per-stage latency histograms,
+// cache hit/miss, token and fallback counters in Prometheus text format
+func MetricsHandler(w http.ResponseWriter, r *http.Request) {
+	metrics, err := defaultWorker.Metrics()
+	if err != nil {
+		http.Error(w, fmt.Sprintf("Failed to read generator metrics: %v", err), http.StatusServiceUnavailable)
+		return
+	}
+	w.Header().Set("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+	w.Write([]byte(metrics))
+}
@@ -0,0 +1,194 @@
+package handlers
+
+import (
+	"bytes"
+	"encoding/json"
+	"io"
+	"os"
+	"path/filepath"
+	"sort"
+	"strings"
+	"sync"
+)
+
+// siteManifestFile is the append-only index the Python generator writes next to the sites
+const siteManifestFile = "manifest.jsonl"
+
+// siteIndexEntry is one site in the catalog, as recorded by the generator
+type siteIndexEntry struct {
+	Name             string `json:"name"`
+	ProductName      string `json:"product_name"`
+	Category         string `json:"category"`
+	GeneratedAt      string `json:"generated_at"`
+	Theme            string `json:"theme"`
+	Size             int64  `json:"size"`
+	GenerationMethod string `json:"generation_method"`
+}
+
+// siteListQuery selects, orders and pages the catalog
+type siteListQuery struct {
+	Category         string
+	Theme            string
+	GenerationMethod string
+	Search           string
+	Sort             string
+	Descending       bool
+	Page             int
+	PerPage          int
+}
+
+// siteIndex keeps the manifest in memory and only reads lines appended since
+// the previous request, so listing never scans the sites directory.
+type siteIndex struct {
+	mu       sync.Mutex
+	dir      string
+	info     os.FileInfo
+	offset   int64
+	entries  []siteIndexEntry
+	position map[string]int
+}
+
+// defaultSiteIndex backs ListSitesHandler
+var defaultSiteIndex = &siteIndex{dir: "generated_sites"}
+
+// refresh catches up with the manifest; the caller must hold x.mu.
+// Returns false when there is no manifest to read.
+func (x *siteIndex) refresh() bool {
+	path := filepath.Join(x.dir, siteManifestFile)
+	info, err := os.Stat(path)
+	if err != nil {
+		return false
+	}
+	// Rebuilt (replaced) or truncated manifests are read again from the start
+	if x.info == nil || !os.SameFile(x.info, info) || info.Size() < x.offset {
+		x.offset = 0
+		x.entries = nil
+		x.position = map[string]int{}
+	}
+	x.info = info
+	if info.Size() == x.offset {
+		return true
+	}
+
+	f, err := os.Open(path)
+	if err != nil {
+		return x.entries != nil
+	}
+	defer f.Close()
+	data, err := io.ReadAll(io.NewSectionReader(f, x.offset, info.Size()-x.offset))
+	if err != nil {
+		return x.entries != nil
+	}
+	// Leave a partially written last line for the next refresh
+	end := bytes.LastIndexByte(data, '\n')
+	if end < 0 {
+		return true
+	}
+	for _, line := range bytes.Split(data[:end], []byte{'\n'}) {
+		var entry siteIndexEntry
+		if err := json.Unmarshal(line, &entry); err != nil || entry.Name == "" {
+			continue
+		}
+		// A newer line for the same site replaces the older one
+		if i, ok := x.position[entry.Name]; ok {
+			x.entries[i] = entry
+		} else {
+			x.position[entry.Name] = len(x.entries)
+			x.entries = append(x.entries, entry)
+		}
+	}
+	x.offset += int64(end + 1)
+	return true
+}
+
+// scanDir lists sites the slow way, for directories that have no manifest yet
+func (x *siteIndex) scanDir() ([]siteIndexEntry, error) {
+	dirEntries, err := os.ReadDir(x.dir)
+	if err != nil {
+		return nil, err
+	}
+	var entries []siteIndexEntry
+	for _, entry := range dirEntries {
+		if !entry.IsDir() {
+			continue
+		}
+		if info, err := os.Stat(filepath.Join(x.dir, entry.Name(), "index.html")); err == nil {
+			entries = append(entries, siteIndexEntry{Name: entry.Name(), Size: info.Size()})
+		}
+	}
+	return entries, nil
+}
+
+// List returns one page of matching sites and the total number of matches
+func (x *siteIndex) List(q siteListQuery) ([]siteIndexEntry, int, error) {
+	x.mu.Lock()
+	var matches []siteIndexEntry
+	if x.refresh() {
+		for _, entry := range x.entries {
+			if q.matches(entry) {
+				matches = append(matches, entry)
+			}
+		}
+		x.mu.Unlock()
+	} else {
+		x.mu.Unlock()
+		entries, err := x.scanDir()
+		if err != nil {
+			return nil, 0, err
+		}
+		for _, entry := range entries {
+			if q.matches(entry) {
+				matches = append(matches, entry)
+			}
+		}
+	}
+
+	sort.SliceStable(matches, func(i, j int) bool {
+		a, b := matches[i], matches[j]
+		if q.Descending {
+			a, b = b, a
+		}
+		switch q.Sort {
+		case "generated_at":
+			return a.GeneratedAt < b.GeneratedAt
+		case "size":
+			return a.Size < b.Size
+		case "category":
+			return a.Category < b.Category
+		default:
+			return a.Name < b.Name
+		}
+	})
+
+	total := len(matches)
+	start := (q.Page - 1) * q.PerPage
+	if start > total {
+		start = total
+	}
+	end := start + q.PerPage
+	if end > total {
+		end = total
+	}
+	return matches[start:end], total, nil
+}
+
+// matches reports whether entry passes the query's filters
+func (q siteListQuery) matches(entry siteIndexEntry) bool {
+	if q.Category != "" && entry.Category != q.Category {
+		return false
+	}
+	if q.Theme != "" && entry.Theme != q.Theme {
+		return false
+	}
+	if q.GenerationMethod != "" && entry.GenerationMethod != q.GenerationMethod {
+		return false
+	}
+	if q.Search != "" {
+		search := strings.ToLower(q.Search)
+		if !strings.Contains(strings.ToLower(entry.Name), search) &&
+			!strings.Contains(strings.ToLower(entry.ProductName), search) {
+			return false
+		}
+	}
+	return true
+}
@@ -0,0 +1,34 @@
+package handlers
+
+import (
+	"os"
+	"path/filepath"
+	"regexp"
+	"time"
+)
+
+// siteIDPattern matches the content-hash IDs handed out by the Python site store
+var siteIDPattern = regexp.MustCompile(`^[0-9a-f]{20}$`)
+
+// siteStoreDir is the Python generator's content-addressed site store
+// (SITE_STORE_DIR, by default .cache/sites in the generator's working directory)
+func siteStoreDir() string {
+	if dir := os.Getenv("SITE_STORE_DIR"); dir != "" {
+		return dir
+	}
+	return filepath.Join(generatorWorkDir, ".cache", "sites")
+}
+
+// storedSitePath returns the file of a stored site and marks it recently used,
+// so the store's LRU sweep keeps sites that are still being viewed
+func storedSitePath(siteID string) (string, bool) {
+	if !siteIDPattern.MatchString(siteID) {
+		return "", false
+	}
+	path := filepath.Join(siteStoreDir(), siteID[:2], siteID+".html")
+	now := time.Now()
+	if err := os.Chtimes(path, now, now); err != nil {
+		return "", false
+	}
+	return path, true
+}
@@ -33,9 +33,17 @@ func main() {
 
 	// Site Generator API routes
 	api.HandleFunc("/generate", handlers.GenerateSiteHandler).Methods("POST", "OPTIONS")
+	api.HandleFunc("/generate/stream", handlers.GenerateSiteStreamHandler).Methods("GET", "POST", "OPTIONS")
 	api.HandleFunc("/sites", handlers.ListSitesHandler).Methods("GET", "OPTIONS")
-	api.HandleFunc("/sites/{siteName}", handlers.ViewSiteHandler).Methods("GET", "OPTIONS")
+	api.HandleFunc("/sites/{siteId}", handlers.ViewSiteHandler).Methods("GET", "OPTIONS")
 	api.HandleFunc("/demo/generate", handlers.DemoGenerateHandler).Methods("POST", "OPTIONS")
+	api.HandleFunc("/metrics", handlers.MetricsHandler).Methods("GET")
+
+	// Content-hashed theme stylesheets and image assets shared by the generated sites
+	for _, dir := range []string{"_themes", "_assets"} {
+		prefix := "/generated/" + dir + "/"
+		r.PathPrefix(prefix).Handler(http.StripPrefix(prefix, handlers.ImmutableFileServer("./generated_sites/"+dir+"/")))
+	}
 
 	// Static file serving for generated sites
 	r.PathPrefix("/generated/").Handler(http.StripPrefix("/generated/", http.FileServer(http.Dir("./generated_sites/"))))
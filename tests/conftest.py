@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# Offline and isolated: no OpenAI key, no shipped corpus, caches and stores in a scratch directory
+_scratch = tempfile.mkdtemp(prefix="site-generator-tests-")
+os.environ.pop("OPENAI_API_KEY", None)
+os.environ["SITE_CACHE_DIR"] = _scratch
+os.environ["FALLBACK_CORPUS"] = "0"
+os.environ["IMAGE_ASSETS"] = "0"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,50 @@
+import asyncio
+
+import gpt_site_generator as gen
+
+
+def _generator(tmp_path, model_pairs):
+    generator = gen.EnhancedGPTSiteGenerator()
+    generator.api_key = "test-key"
+    generator.content_cache = gen.SQLiteCache(str(tmp_path / "content.sqlite3"))
+    generator._generate_openai_content = lambda product_name, keys=None, category=None, span=None: iter(model_pairs)
+    return generator
+
+
+def _model_pairs(product_name):
+    # The model disagrees with the keyword index ("yoga" -> health_wellness)
+    content = gen.EnhancedGPTSiteGenerator()._generate_minimal_dynamic_content(product_name, 1)
+    return [("category", "fashion")] + list(content.items())
+
+
+def test_content_cache_hit_keeps_the_model_category(tmp_path):
+    generator = _generator(tmp_path, _model_pairs("Yoga Mat"))
+    
+    def category_of_run():
+        pairs = dict(generator._iter_content_pairs("Yoga Mat", None, 1, gen.Span("content", {}, None)))
+        return pairs["category"]
+    
+    assert category_of_run() == "fashion"
+    assert generator.content_cache.hits == 0
+    assert category_of_run() == "fashion"
+    assert generator.content_cache.hits == 1
+
+
+def test_async_content_cache_hit_keeps_the_model_category(tmp_path):
+    generator = _generator(tmp_path, [])
+    async_generator = gen.AsyncSiteGenerator(generator)
+    async_generator.client = object()
+    pairs = _model_pairs("Yoga Mat")
+    
+    async def model_pairs(product_name, keys=None, category=None, span=None):
+        return pairs
+    async_generator._acontent_pairs = model_pairs
+    
+    async def run():
+        return await async_generator._acontent_in_span("Yoga Mat", None, 1, gen.Span("content", {}, None))
+    
+    miss_category, miss_content, _ = asyncio.run(run())
+    hit_category, hit_content, method = asyncio.run(run())
+    assert generator.content_cache.hits == 1 and method == "openai"
+    assert miss_category == hit_category == "fashion"
+    assert hit_content == miss_content
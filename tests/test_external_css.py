@@ -0,0 +1,18 @@
+import os
+import re
+
+import gpt_site_generator as gen
+
+
+def test_serve_path_writes_linked_theme_stylesheet(tmp_path):
+    generator = gen.EnhancedGPTSiteGenerator()
+    generator.css_mode = "external"
+    generator.theme_css_dir = str(tmp_path / "_themes")
+    
+    responses = []
+    gen._serve_lines(generator, ['{"id": "1", "product_name": "Yoga Mat"}'], responses.append, inline=True)
+    
+    assert responses[0]["success"], responses[0]
+    href = re.search(r'<link href="([^"]+\.css)" rel="stylesheet">', responses[0]["html"]).group(1)
+    assert href.startswith(gen.THEME_CSS_BASE_URL) and href.startswith("/")
+    assert os.path.isfile(os.path.join(generator.theme_css_dir, href[len(gen.THEME_CSS_BASE_URL):]))